@@ -0,0 +1,125 @@
+"""
+Compares category matching before and after the category index on a large item list.
+
+Items look like what the LLM returns: a category label and a description. The
+list mixes exact names in other spellings ("food", "Rent / Mortgage"), labels the
+LLM invents ("Dining", "Transportation"), typos ("Helth"), "Other" or missing
+labels with a telling description ("Uber to the airport"), the labelled message
+corpus, and items that really are "Other". "linear" is the previous
+case-insensitive scan over EXPENSE_CATEGORIES, "index" is CategoryIndex.resolve().
+Misfiled counts items whose expected category is not "Other" but which were filed
+elsewhere; "lost to Other" is the part of those that ended up in "Other". The
+"exact names" lines time only items labelled with a category name as configured,
+the case most LLM answers hit.
+
+A second run gives one user --learned mappings (as taught with /category) to show
+the cost of consulting them.
+
+Usage (from the project root):
+    python -m benchmarks.bench_categories --items 200000
+"""
+import argparse
+import logging
+import random
+import time
+
+from src.categories import CATEGORY_SYNONYMS, OTHER, CategoryIndex
+from src.config import EXPENSE_CATEGORIES
+
+from .expense_corpus import EXPENSE_CORPUS
+
+INVENTED_LABELS = {
+    "Dining": "Food", "Restaurants": "Food", "Food & Drinks": "Food", "Eating out": "Food", "Coffee": "Food",
+    "Transportation": "Transport", "Travel": "Transport", "Taxi": "Transport", "Fuel": "Transport",
+    "Bills": "Utilities", "Utility": "Utilities", "Phone & Internet": "Utilities",
+    "Leisure": "Entertainment", "Movies": "Entertainment", "Hobbies": "Entertainment",
+    "Clothing": "Shopping", "Electronics": "Shopping", "Gifts": "Shopping",
+    "Healthcare": "Health", "Medical": "Health", "Fitness": "Health", "Pharmacy": "Health",
+    "Grocery": "Groceries", "Supermarket": "Groceries", "Housing": "Rent/Mortgage", "Rent": "Rent/Mortgage",
+    "Streaming": "Subscriptions", "Membership": "Subscriptions",
+}
+TELLING_DESCRIPTIONS = [
+    ("Uber to the airport", "Transport"), ("parking downtown", "Transport"), ("Starbucks latte", "Food"),
+    ("Netflix monthly", "Subscriptions"), ("pharmacy run", "Health"), ("water bill", "Utilities"),
+    ("cinema tickets", "Entertainment"), ("new shoes", "Shopping"), ("milk and bread", "Groceries"),
+]
+UNKNOWN = [("Misc", "stuff"), ("General", "thing for Alex"), ("Expense", "payment 42"), ("", "misc"), (None, None)]
+
+
+def _linear(label) -> str:
+    """The matching _validate_expense_item did before the index."""
+    if not isinstance(label, str) or not label.strip():
+        return OTHER
+    matched = next((c for c in EXPENSE_CATEGORIES if c.lower() == label.lower().strip()), None)
+    return matched if matched else OTHER
+
+
+def _typo(word: str, rng: random.Random) -> str:
+    position = rng.randrange(1, len(word))
+    if rng.random() < 0.5:
+        return word[:position] + word[position + 1:]  # Dropped letter
+    return word[:position - 1] + word[position] + word[position - 1] + word[position + 1:]  # Swapped letters
+
+
+def _items(count: int, seed: int) -> list[tuple]:
+    """(label, description, expected category) triples."""
+    rng = random.Random(seed)
+    named = [category for category in EXPENSE_CATEGORIES if category != OTHER]
+    corpus = [(text, expected[0][1]) for text, expected in EXPENSE_CORPUS if len(expected) == 1]
+    generators = [
+        lambda: (rng.choice(named), "", None),
+        lambda: (lambda c: (rng.choice([c.lower(), c.upper(), f" {c} ", c.replace("/", " / ")]), "", c))(rng.choice(named)),
+        lambda: (lambda pair: (pair[0], "", pair[1]))(rng.choice(list(INVENTED_LABELS.items()))),
+        lambda: (lambda c: (_typo(c.split("/")[0], rng), "", c))(rng.choice(named)),
+        lambda: (lambda pair: (rng.choice([OTHER, None]), pair[0], pair[1]))(rng.choice(TELLING_DESCRIPTIONS)),
+        lambda: (lambda pair: (None, pair[0], pair[1]))(rng.choice(corpus)),
+        lambda: (lambda pair: (pair[0], pair[1], OTHER))(rng.choice(UNKNOWN)),
+    ]
+    items = []
+    for _ in range(count):
+        label, description, expected = rng.choice(generators)()
+        items.append((label, description, expected or label))
+    return items
+
+
+def _measure(name: str, classify, items: list[tuple]) -> None:
+    started = time.perf_counter()
+    results = [classify(label, description) for label, description, _ in items]
+    elapsed = time.perf_counter() - started
+    relevant = [(got, expected) for got, (_, _, expected) in zip(results, items) if expected != OTHER]
+    misfiled = sum(1 for got, expected in relevant if got != expected)
+    lost = sum(1 for got, expected in relevant if got == OTHER)
+    false_matches = sum(1 for got, (_, _, expected) in zip(results, items) if expected == OTHER and got != OTHER)
+    print(f"  {name:>8}: {elapsed / len(items) * 1e9:6.0f} ns/item, misfiled {misfiled / len(relevant):6.2%} "
+          f"(lost to Other {lost / len(relevant):6.2%}), unknown items given a category: {false_matches}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=200_000)
+    parser.add_argument("--learned", type=int, default=20, help="Mappings of the user in the learned run")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    items = _items(args.items, args.seed)
+    print(f"{len(items)} items, {len(CATEGORY_SYNONYMS)} categories with synonyms")
+    _measure("linear", lambda label, description: _linear(label), items)
+
+    index = CategoryIndex()
+    _measure("index", lambda label, description: index.resolve(label, None, description), items)
+    _measure("warm", lambda label, description: index.resolve(label, None, description), items)
+
+    # Half single words, half two-word phrases
+    index._store(1, {(f"shop{n}" if n % 2 else f"corner shop{n}"): "Shopping" for n in range(args.learned)})
+    _measure("learned", lambda label, description: index.resolve(label, 1, description), items)
+    print(f"  index stats: {index.stats()}")
+
+    exact = [item for item in items if item[0] in EXPENSE_CATEGORIES and item[0] != OTHER]
+    print(f"{len(exact)} items labelled with exact names:")
+    _measure("linear", lambda label, description: _linear(label), exact)
+    _measure("index", lambda label, description: index.resolve(label, None, description), exact)
+
+
+if __name__ == "__main__":
+    main()
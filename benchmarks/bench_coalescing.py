@@ -0,0 +1,100 @@
+"""
+Measures how per-user debouncing in the expense syncer merges bursts of messages.
+
+Each user sends bursts of --burst expense messages, --gap seconds apart. With
+debounce 0 every message is synced on its own; with the configured window a burst
+becomes one append. Confirmation latency is the time from storing a message's
+expense until its sheet write lands (when the bot edits its confirmation).
+
+Usage (from the project root):
+    python -m benchmarks.bench_coalescing --users 20 --bursts 2 --gap 0.3 --debounce 1.0
+"""
+import argparse
+import asyncio
+import datetime
+import logging
+import os
+import statistics
+import tempfile
+import time
+from unittest import mock
+
+_DB_DIR = tempfile.mkdtemp(prefix="bench-coalescing-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_DB_DIR, 'bench.db')}")
+
+from src import expense_sync, ledger  # noqa: E402
+from src.database import User, init_db, get_db_session, dispose_async_engine  # noqa: E402
+from src.sheet_queue import SheetWriteQueue  # noqa: E402
+
+from .fake_gspread import FakeBackend, use_backend  # noqa: E402
+
+
+def _create_users(user_ids: range) -> None:
+    session = get_db_session()
+    try:
+        for user_id in user_ids:
+            session.add(User(id=user_id, first_name=f"user{user_id}", spreadsheet_id=f"sheet-{user_id}"))
+        session.commit()
+    finally:
+        session.close()
+
+
+async def _run(user_ids: range, burst: int, args, debounce: float) -> list[float]:
+    queue = SheetWriteQueue(max_workers=16)
+    syncer = expense_sync.ExpenseSyncer(debounce=debounce, max_delay=debounce * 5, interval=3600)
+    latencies = []
+
+    async def confirm(started: float, synced: asyncio.Future):
+        await synced
+        latencies.append(time.perf_counter() - started)
+
+    async def user_session(user_id: int):
+        confirmations = []
+        for _ in range(args.bursts):
+            for _ in range(burst):
+                expense = {"user_id": user_id, "amount": 9.5, "category": "Food",
+                           "description": "benchmark", "timestamp": datetime.datetime.utcnow()}
+                started = time.perf_counter()
+                await ledger.add_expenses(user_id, [expense])
+                synced = syncer.notify(user_id, f"sheet-{user_id}")
+                confirmations.append(asyncio.create_task(confirm(started, synced)))
+                await asyncio.sleep(args.gap)
+            await asyncio.sleep(debounce * 5 + 1)  # Quiet period between bursts
+        await asyncio.gather(*confirmations)
+
+    with mock.patch.object(expense_sync, "sheet_write_queue", queue):
+        await asyncio.gather(*(user_session(user_id) for user_id in user_ids))
+        await syncer.stop()
+    queue.shutdown()
+    await dispose_async_engine()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--bursts", type=int, default=2, help="Bursts per user")
+    parser.add_argument("--gap", type=float, default=0.3, help="Seconds between messages in a burst")
+    parser.add_argument("--debounce", type=float, default=1.0, help="Debounce window to compare against 0")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per fake Sheets API call")
+    args = parser.parse_args()
+
+    logging.disable(logging.ERROR)
+    init_db()
+    offset = 0
+    for burst in (1, 2, 4, 8):
+        for debounce in (0.0, args.debounce):
+            user_ids = range(offset + 1, offset + args.users + 1)
+            offset += args.users
+            _create_users(user_ids)
+            backend = FakeBackend(latency=args.latency)
+            with use_backend(backend):
+                latencies = asyncio.run(_run(user_ids, burst, args, debounce))
+            messages = args.users * args.bursts * burst
+            print(f"burst={burst} debounce={debounce:.1f}s: {backend.calls['append_rows'] / messages:.2f} appends/message, "
+                  f"{backend.total_calls() / messages:.2f} API calls/message, "
+                  f"confirmation p50={statistics.median(latencies):.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Compares the handlers' database access through blocking sessions with the async engine.
+
+Each simulated user sends messages; every message does what _process_text_message
+does around the database: make sure the user exists, wait for the (simulated) LLM,
+then look up the spreadsheet ID. "sync" uses the old blocking session inside the
+event loop; "async" uses get_async_db_session with the user cache disabled; "cached"
+is the real handler path with the user profile cache. Loop lag is the worst delay seen by a
+ticker task that wakes every millisecond, i.e. how long other updates were stalled.
+
+Usage (from the project root):
+    python -m benchmarks.bench_db_handlers --users 200 --messages 5
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from unittest import mock
+
+_DB_DIR = tempfile.mkdtemp(prefix="bench-db-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_DB_DIR, 'bench.db')}")
+
+from sqlalchemy import event  # noqa: E402
+
+from src import handlers  # noqa: E402
+from src.database import User, init_db, get_db_session, async_engine, engine, dispose_async_engine  # noqa: E402
+from src.user_cache import UserProfileCache  # noqa: E402
+
+_queries = 0
+
+
+def _count_query(*args):
+    global _queries
+    _queries += 1
+
+
+class _FakeTelegramUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.first_name = f"user{user_id}"
+
+
+def _sync_ensure_user(user: _FakeTelegramUser) -> None:
+    session = get_db_session()
+    try:
+        if not session.query(User).filter(User.id == user.id).first():
+            session.add(User(id=user.id, first_name=user.first_name, spreadsheet_id=f"sheet-{user.id}"))
+            session.commit()
+    finally:
+        session.close()
+
+
+def _sync_spreadsheet_id(user_id: int):
+    session = get_db_session()
+    try:
+        user_record = session.query(User).filter(User.id == user_id).first()
+        return user_record.spreadsheet_id if user_record else None
+    finally:
+        session.close()
+
+
+async def _sync_message(user: _FakeTelegramUser, llm_latency: float) -> None:
+    _sync_ensure_user(user)
+    await asyncio.sleep(llm_latency)
+    _sync_spreadsheet_id(user.id)
+
+
+async def _async_message(user: _FakeTelegramUser, llm_latency: float) -> None:
+    await handlers._ensure_user_exists(user)
+    await asyncio.sleep(llm_latency)
+    await handlers._get_spreadsheet_id(user.id)
+
+
+async def _run(message, user_ids: range, messages: int, llm_latency: float) -> tuple[float, float]:
+    max_lag = 0.0
+    stop = asyncio.Event()
+
+    async def ticker():
+        nonlocal max_lag
+        while not stop.is_set():
+            expected = time.perf_counter() + 0.001
+            await asyncio.sleep(0.001)
+            max_lag = max(max_lag, time.perf_counter() - expected)
+
+    async def user_session(user_id: int):
+        user = _FakeTelegramUser(user_id)
+        for _ in range(messages):
+            await message(user, llm_latency)
+
+    ticker_task = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    await asyncio.gather(*(user_session(user_id) for user_id in user_ids))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await ticker_task
+    await dispose_async_engine()
+    return elapsed, max_lag
+
+
+def _run_variant(name: str, message, user_ids: range, args) -> None:
+    global _queries
+    _queries = 0
+    cache = UserProfileCache(ttl=0, negative_ttl=0) if name == "async" else UserProfileCache()
+    with mock.patch.object(handlers, "user_cache", cache):
+        elapsed, max_lag = asyncio.run(_run(message, user_ids, args.messages, args.llm_latency))
+    total = len(user_ids) * args.messages
+    print(f"{name:>6}: {total} messages in {elapsed:.2f}s ({total / elapsed:.0f} msg/s), "
+          f"max loop lag {max_lag * 1000:.1f}ms, {_queries / total:.2f} queries/message"
+          + (f", cache hit rate {cache.stats()['hit_rate']:.0%}" if name == "cached" else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Seconds of simulated LLM wait per message")
+    args = parser.parse_args()
+
+    init_db()
+    event.listen(engine, "before_cursor_execute", _count_query)
+    event.listen(async_engine.sync_engine, "before_cursor_execute", _count_query)
+    variants = (("sync", _sync_message), ("async", _async_message), ("cached", _async_message))
+    # Separate user ranges so every variant pays for the same number of inserts
+    for offset, (name, message) in enumerate(variants):
+        user_ids = range(offset * args.users + 1, (offset + 1) * args.users + 1)
+        _run_variant(name, message, user_ids, args)
+
+
+if __name__ == "__main__":
+    main()
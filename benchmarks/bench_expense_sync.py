@@ -0,0 +1,139 @@
+"""
+Compares writing expenses straight to Google Sheets with storing them locally first.
+
+"direct" awaits the sheet append before replying, as the bot used to; "local" commits
+to the Expense table, replies, and lets the ExpenseSyncer copy rows to the sheet.
+With --outage the fake Sheets API fails every call for that many seconds at the start.
+Reply latency is what a user waits for the confirmation; lost counts expenses that
+never reached the sheet, duplicates counts rows written more than once.
+
+Usage (from the project root):
+    python -m benchmarks.bench_expense_sync --users 50 --messages 4 --latency 0.1 --outage 1
+"""
+import argparse
+import asyncio
+import datetime
+import logging
+import os
+import statistics
+import tempfile
+import time
+import uuid
+from collections import Counter
+from unittest import mock
+
+_DB_DIR = tempfile.mkdtemp(prefix="bench-sync-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_DB_DIR, 'bench.db')}")
+
+from src import expense_sync, ledger, sheets_writer  # noqa: E402
+from src.database import Expense, User, init_db, get_db_session, dispose_async_engine  # noqa: E402
+from src.sheet_queue import SheetWriteQueue  # noqa: E402
+
+from .fake_gspread import FakeBackend, use_backend  # noqa: E402
+
+
+def _expense(user_id: int) -> dict:
+    return {
+        "user_id": user_id,
+        "amount": 12.5,
+        "category": "Food",
+        "description": "benchmark",
+        "timestamp": datetime.datetime.utcnow()
+    }
+
+
+def _create_users(user_ids: range) -> None:
+    session = get_db_session()
+    try:
+        for user_id in user_ids:
+            session.add(User(id=user_id, first_name=f"user{user_id}", spreadsheet_id=f"sheet-{user_id}"))
+        session.commit()
+    finally:
+        session.close()
+
+
+def _unsynced() -> int:
+    session = get_db_session()
+    try:
+        return session.query(Expense).filter(Expense.synced_at.is_(None)).count()
+    finally:
+        session.close()
+
+
+async def _direct(queue: SheetWriteQueue, user_id: int) -> bool:
+    expense = dict(_expense(user_id), expense_id=uuid.uuid4().hex)
+    try:
+        return await queue.submit(f"sheet-{user_id}", sheets_writer.write_expenses_to_sheet, [expense], f"sheet-{user_id}")
+    except Exception:
+        return False
+
+
+async def _local(syncer: expense_sync.ExpenseSyncer, user_id: int) -> bool:
+    stats = await ledger.add_expenses(user_id, [_expense(user_id)])
+    syncer.notify(user_id, f"sheet-{user_id}")
+    return stats is not None
+
+
+async def _run(name: str, backend: FakeBackend, user_ids: range, args) -> tuple[list[float], int, float]:
+    queue = SheetWriteQueue(max_workers=args.workers)
+    syncer = expense_sync.ExpenseSyncer(debounce=0.05, max_delay=0.5, interval=0.2)
+    latencies, failures = [], 0
+
+    async def user_session(user_id: int):
+        nonlocal failures
+        for _ in range(args.messages):
+            started = time.perf_counter()
+            ok = await (_direct(queue, user_id) if name == "direct" else _local(syncer, user_id))
+            latencies.append(time.perf_counter() - started)
+            failures += not ok
+            await asyncio.sleep(args.interval)
+
+    with mock.patch.object(expense_sync, "sheet_write_queue", queue):
+        syncer.start()
+        backend.outage = args.outage > 0
+        asyncio.get_running_loop().call_later(args.outage, setattr, backend, "outage", False)
+        started = time.perf_counter()
+        await asyncio.gather(*(user_session(user_id) for user_id in user_ids))
+        if name == "local":
+            while await asyncio.to_thread(_unsynced):
+                await asyncio.sleep(0.1)
+        settled = time.perf_counter() - started
+        await syncer.stop()
+    queue.shutdown()
+    await dispose_async_engine()
+    return latencies, failures, settled
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=4)
+    parser.add_argument("--interval", type=float, default=0.2, help="Seconds between one user's messages")
+    parser.add_argument("--latency", type=float, default=0.1, help="Seconds per fake Sheets API call")
+    parser.add_argument("--outage", type=float, default=1.0, help="Seconds the fake Sheets API is down at the start")
+    parser.add_argument("--workers", type=int, default=16)
+    args = parser.parse_args()
+
+    logging.disable(logging.ERROR)  # The outage makes every failed call log an error
+    init_db()
+    for offset, name in enumerate(("direct", "local")):
+        user_ids = range(offset * args.users + 1, (offset + 1) * args.users + 1)
+        _create_users(user_ids)
+        backend = FakeBackend(latency=args.latency)
+        with use_backend(backend), \
+                mock.patch.object(expense_sync, "EXPENSE_SYNC_RETRY_BASE", 0.2), \
+                mock.patch.object(expense_sync, "EXPENSE_SYNC_RETRY_MAX", 1.0):
+            latencies, failures, settled = asyncio.run(_run(name, backend, user_ids, args))
+
+        ids = Counter(row[5] for sheet in backend.spreadsheets.values()
+                      for worksheet in sheet.worksheets.values() for row in worksheet.rows[1:])
+        total = args.users * args.messages
+        latencies.sort()
+        print(f"{name:>6}: reply p50={statistics.median(latencies) * 1000:.0f}ms "
+              f"p95={latencies[int(len(latencies) * 0.95) - 1] * 1000:.0f}ms, failed replies={failures}, "
+              f"in sheet={len(ids)}/{total}, lost={total - len(ids)}, "
+              f"duplicates={sum(count - 1 for count in ids.values())}, settled in {settled:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
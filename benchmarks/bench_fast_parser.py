@@ -0,0 +1,51 @@
+"""
+Measures the rule-based expense parser on a labelled corpus.
+
+Hit rate is the share of messages answered without the LLM, accuracy the share of
+those answers whose amounts and categories match the labels.
+
+Usage (from the project root):
+    python -m benchmarks.bench_fast_parser --repeat 2000
+"""
+import argparse
+import time
+
+from src.config import FAST_PARSER_MIN_CONFIDENCE
+from src.fast_parser import parse_simple_expense
+
+from .expense_corpus import EXPENSE_CORPUS
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=2000, help="Passes over the corpus for timing")
+    parser.add_argument("--verbose", action="store_true", help="Print every mismatch")
+    args = parser.parse_args()
+
+    hits = correct = 0
+    for text, expected in EXPENSE_CORPUS:
+        items, confidence = parse_simple_expense(text)
+        if not items or confidence < FAST_PARSER_MIN_CONFIDENCE:
+            continue
+        hits += 1
+        got = [(round(item["amount"], 2), item["category"]) for item in items]
+        if got == expected:
+            correct += 1
+        elif args.verbose:
+            print(f"mismatch: {text!r}: got {got}, expected {expected}")
+
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        for text, _ in EXPENSE_CORPUS:
+            parse_simple_expense(text)
+    elapsed = time.perf_counter() - started
+    per_message_us = elapsed / (args.repeat * len(EXPENSE_CORPUS)) * 1e6
+
+    print(f"messages: {len(EXPENSE_CORPUS)}")
+    print(f"hit rate: {hits / len(EXPENSE_CORPUS):.1%} ({hits} answered without LLM)")
+    print(f"accuracy: {correct / hits if hits else 0:.1%} of answered")
+    print(f"parse time: {per_message_us:.1f}us per message")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Compares receipt uploads before and after image preprocessing.
+
+"before" sends the full photo as one base64 string inside the JSON payload, as the
+bot used to; "after" downscales/re-encodes it and streams the base64 body.
+Memory peak covers Python allocations (tracemalloc), not Pillow's internal buffers.
+
+Usage (from the project root):
+    python -m benchmarks.bench_image_payload --width 3024 --height 4032 --bandwidth 2000000
+"""
+import argparse
+import asyncio
+import base64
+import io
+import random
+import time
+import tracemalloc
+from unittest import mock
+
+from PIL import Image, ImageDraw
+
+from src import llm_parser
+from src.image_preprocessing import prepare_image
+
+from .fake_openrouter import FakeOpenRouter
+
+
+def _synthetic_receipt(width: int, height: int) -> bytes:
+    """A noisy, photo-like receipt so JPEG sizes resemble real camera shots."""
+    rng = random.Random(42)
+    noise = Image.effect_noise((width, height), 40).convert("RGB")
+    image = Image.blend(Image.new("RGB", (width, height), (235, 230, 220)), noise, 0.35)
+    draw = ImageDraw.Draw(image)
+    for line in range(40):
+        y = 200 + line * (height - 400) // 40
+        draw.text((width // 6, y), f"ITEM {line:02d} ........ {rng.uniform(1, 99):6.2f}", fill=(20, 20, 20))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=95)
+    return buffer.getvalue()
+
+
+def _payload(url: str) -> dict:
+    return {
+        "model": "fake",
+        "messages": [{"role": "user", "content": [
+            {"type": "text", "text": "Extract expenses"},
+            {"type": "image_url", "image_url": {"url": url}}
+        ]}]
+    }
+
+
+async def _before(image_bytes: bytes) -> None:
+    base64_image = base64.b64encode(image_bytes).decode('utf-8')
+    await llm_parser._make_llm_request({}, _payload(f"data:image/jpeg;base64,{base64_image}"), timeout=120)
+
+
+async def _after(image_bytes: bytes) -> None:
+    prepared = await asyncio.to_thread(prepare_image, image_bytes)
+    await llm_parser._make_llm_request({}, _payload(llm_parser.IMAGE_URL_PLACEHOLDER), timeout=120, image_bytes=prepared)
+
+
+async def _measure(runner, image_bytes: bytes) -> tuple[float, int]:
+    tracemalloc.start()
+    started = time.perf_counter()
+    await runner(image_bytes)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    await llm_parser.close_http_client()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--width", type=int, default=3024)
+    parser.add_argument("--height", type=int, default=4032)
+    parser.add_argument("--bandwidth", type=float, default=2_000_000, help="Simulated upload bytes per second")
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds of fake inference per request")
+    args = parser.parse_args()
+
+    image_bytes = _synthetic_receipt(args.width, args.height)
+    print(f"source image: {args.width}x{args.height}, {len(image_bytes) / 1024:.0f} KiB")
+
+    for name, runner in (("before", _before), ("after", _after)):
+        with FakeOpenRouter(latency=args.latency, upload_bytes_per_second=args.bandwidth) as server:
+            with mock.patch.object(llm_parser, "OPENROUTER_API_URL", server.url):
+                elapsed, peak = asyncio.run(_measure(runner, image_bytes))
+            print(f"{name:>6}: payload={server.bytes_received / 1024:.0f} KiB "
+                  f"python peak={peak / 1024 / 1024:.1f} MiB end-to-end={elapsed * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Measures the bulk import of a bank statement into the ledger and monthly sheets.
+
+A synthetic statement of --rows rows over --months months is written to a temp
+file: semicolon-separated with a few lines of account details above the header,
+decimal commas, card references in the descriptions, and about 5% income rows.
+About half of the merchants are known to the local rules (Uber, Netflix, Amazon,
+...); the others ("TESCO STORES", "PRET A MANGER") go to a local fake OpenRouter
+that categorizes by keyword, --llm-latency seconds per request. Google Sheets is
+the fake gspread backend with --sheets-latency seconds per call.
+
+Reported per run: rows per second, LLM requests, Sheets calls by method (one
+append_rows per month), and the Python heap peak (tracemalloc) while importing
+--rows / 10 rows over --months / 10 months and then all --rows rows. The peak
+stays flat because rows are streamed: it depends on the rows per month (a few
+month buffers, capped at IMPORT_APPEND_MAX_ROWS rows each), not on the file. In the
+traced runs the fake sheet only counts the rows it receives, so the peak is the
+importer's own and not the in-memory sheet's. For comparison, "read all" is the
+heap peak of only reading every row into a list first. A second import of the
+same file shows the duplicate check.
+
+Usage (from the project root):
+    python -m benchmarks.bench_import --rows 100000 --months 24
+"""
+import argparse
+import asyncio
+import contextlib
+import datetime
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from unittest import mock
+
+from .fake_gspread import FakeBackend, FakeWorksheet, use_backend
+from .fake_openrouter import FakeOpenRouter
+
+KNOWN_MERCHANTS = ["UBER *TRIP", "NETFLIX.COM", "AMAZON MKTPLACE", "SPOTIFY AB", "CITY PARKING", "STARBUCKS",
+                   "SHELL PETROL", "BOLT.EU", "PHARMACY PLUS", "CINEMA CITY"]
+UNKNOWN_MERCHANTS = {"TESCO STORES": "Groceries", "LIDL": "Groceries", "PRET A MANGER": "Food",
+                     "VODAFONE": "Utilities", "ZARA": "Shopping", "DELIVEROO": "Food", "TFL TRAVEL": "Transport",
+                     "BOOTS": "Health", "STEAM GAMES": "Entertainment", "ACME LANDLORD LTD": "Rent/Mortgage"}
+
+
+def _configure(directory: str) -> None:
+    """Environment read by src.config; must be set before src is imported."""
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(directory, 'bench.db')}")
+    os.environ["OPENROUTER_API_KEY"] = "bench"
+    os.environ["METRICS_PORT"] = "0"
+    os.environ["LLM_CACHE_DISK_PATH"] = ""
+
+
+def _write_statement(path: str, rows: int, months: int, seed: int) -> None:
+    rng = random.Random(seed)
+    start = datetime.date(2023, 1, 1)
+    days = months * 30
+    merchants = KNOWN_MERCHANTS + list(UNKNOWN_MERCHANTS)
+    with open(path, "w", encoding="utf-8", newline="") as out:
+        out.write("Account;DE00 1234 5678 9000\nStatement;Giro\n\n")
+        out.write("Booking date;Value date;Payee;Purpose;Amount;Balance\n")
+        for n in range(rows):
+            day = start + datetime.timedelta(days=n * days // rows)
+            date = day.strftime("%d.%m.%Y")
+            if rng.random() < 0.05:
+                out.write(f"{date};{date};ACME GMBH;Salary {n};2.500,00;0\n")
+                continue
+            amount = f"-{rng.uniform(1, 120):.2f}".replace(".", ",")
+            out.write(f"{date};{date};CARD {rng.randrange(1000, 9999)} {rng.choice(merchants)};"
+                      f"{rng.randrange(100000)};{amount};0\n")
+
+
+class _CategorizingOpenRouter(FakeOpenRouter):
+    """Answers categorization requests by looking up the merchant in UNKNOWN_MERCHANTS."""
+
+    def respond(self, payload: dict) -> tuple[int, dict]:
+        content = payload["messages"][-1]["content"]
+        lines = json.loads(content[content.index("{"):])
+        answer = {}
+        for key, line in lines.items():
+            answer[key] = next((category for merchant, category in UNKNOWN_MERCHANTS.items()
+                                if merchant.lower() in line.lower()), "Other")
+        return 200, {"choices": [{"message": {"content": json.dumps(answer)}}],
+                     "usage": {"prompt_tokens": 100, "completion_tokens": 20}}
+
+
+def _append_rows_counted(worksheet: FakeWorksheet, values: list, **kwargs) -> None:
+    """FakeWorksheet.append_rows that drops the rows, so they do not count toward the heap peak."""
+    worksheet.backend.api_call("append_rows")
+
+
+def _create_user(user_id: int) -> None:
+    from src.database import User, get_db_session
+
+    session = get_db_session()
+    try:
+        session.add(User(id=user_id, first_name=f"user{user_id}", spreadsheet_id=f"sheet-{user_id}"))
+        session.commit()
+    finally:
+        session.close()
+
+
+async def _import(path: str, user_id: int) -> tuple[dict, float]:
+    from src import llm_parser
+    from src.importer import StatementImporter
+
+    importer = StatementImporter()
+    started = time.perf_counter()
+    with open(path, encoding="utf-8-sig", newline="") as lines:
+        summary = await importer.run(lines, user_id, f"sheet-{user_id}")
+    elapsed = time.perf_counter() - started
+    await llm_parser.close_http_client()
+    return summary, elapsed
+
+
+def _run(name: str, path: str, user_id: int, args, trace: bool = False) -> None:
+    backend = FakeBackend(latency=args.sheets_latency)
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(use_backend(backend))
+        if trace:
+            stack.enter_context(mock.patch.object(FakeWorksheet, "append_rows", _append_rows_counted))
+            tracemalloc.start()
+        summary, elapsed = asyncio.run(_import(path, user_id))
+    peak = ""
+    if trace:
+        peak = f", heap peak {tracemalloc.get_traced_memory()[1] / 2 ** 20:5.1f} MB"
+        tracemalloc.stop()
+    calls = dict(sorted(backend.calls.items()))
+    print(f"  {name:>9}: {summary['rows']} rows in {elapsed:5.1f}s ({summary['rows'] / elapsed:6.0f} rows/s){peak}")
+    print(f"             imported {summary['imported']} into {summary['months']} months with {summary['appends']} appends, "
+          f"duplicates {summary['duplicates']}, income {summary['income']}, "
+          f"LLM-categorized {summary['categorized_by_llm']}, Other {summary['uncategorized']}")
+    print(f"             Sheets calls {calls}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--months", type=int, default=24)
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Seconds per fake categorization request")
+    parser.add_argument("--sheets-latency", type=float, default=0.1, help="Seconds per fake Sheets call")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    directory = tempfile.mkdtemp(prefix="bench-import-")
+    _configure(directory)
+    from src import llm_parser
+    from src.database import init_db, dispose_async_engine
+    from src.sheet_queue import sheet_write_queue
+    from src.statement_parser import StatementReader
+
+    init_db()
+    small, large = os.path.join(directory, "small.csv"), os.path.join(directory, "large.csv")
+    _write_statement(small, args.rows // 10, max(1, args.months // 10), args.seed)
+    _write_statement(large, args.rows, args.months, args.seed)
+    print(f"statement: {args.rows} rows over {args.months} months, {os.path.getsize(large) / 2 ** 20:.1f} MB")
+
+    with _CategorizingOpenRouter(latency=args.llm_latency) as fake:
+        llm_parser.OPENROUTER_API_URL = fake.url
+        for user_id in (1, 2, 3):
+            _create_user(user_id)
+        _run("import", large, 1, args)
+        _run("re-import", large, 1, args)
+        _run("small", small, 2, args, trace=True)
+        _run("large", large, 3, args, trace=True)
+        print(f"  LLM requests: {fake.requests}")
+
+    tracemalloc.start()
+    with open(large, encoding="utf-8-sig", newline="") as lines:
+        everything = list(StatementReader(lines))
+    print(f"  read all: {len(everything)} rows in a list, heap peak {tracemalloc.get_traced_memory()[1] / 2 ** 20:5.1f} MB")
+    tracemalloc.stop()
+
+    sheet_write_queue.shutdown()
+    asyncio.run(dispose_async_engine())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Compares a fresh httpx.AsyncClient per request with the shared pooled client.
+
+Usage (from the project root):
+    python -m benchmarks.bench_llm_client --requests 400 --concurrency 20 --handshake-latency 0.03
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from unittest import mock
+
+import httpx
+
+from src import llm_parser
+
+from .fake_openrouter import FakeOpenRouter
+
+
+def _percentile(samples: list[float], percentile: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(percentile / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def _fresh_client_request(url: str, payload: dict) -> None:
+    async with httpx.AsyncClient(timeout=15) as client:
+        response = await client.post(url, json=payload)
+        response.raise_for_status()
+
+
+async def _shared_client_request(url: str, payload: dict) -> None:
+    await llm_parser._make_llm_request({}, payload)
+
+
+async def _run(request_func, url: str, requests: int, concurrency: int) -> list[float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    payload = {"model": "fake", "messages": [{"role": "user", "content": "Lunch $15"}]}
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            await request_func(url, payload)
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    await llm_parser.close_http_client()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds per fake completion")
+    parser.add_argument("--handshake-latency", type=float, default=0.03, help="Seconds per new connection")
+    args = parser.parse_args()
+
+    for name, request_func in (("fresh", _fresh_client_request), ("shared", _shared_client_request)):
+        with FakeOpenRouter(latency=args.latency, handshake_latency=args.handshake_latency) as server:
+            with mock.patch.object(llm_parser, "OPENROUTER_API_URL", server.url):
+                latencies = asyncio.run(_run(request_func, server.url, args.requests, args.concurrency))
+            print(f"{name:>7}: p50={_percentile(latencies, 50) * 1000:.1f}ms "
+                  f"p99={_percentile(latencies, 99) * 1000:.1f}ms "
+                  f"mean={statistics.mean(latencies) * 1000:.1f}ms connections={server.connections}")
+
+
+if __name__ == "__main__":
+    main()
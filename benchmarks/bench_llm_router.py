@@ -0,0 +1,131 @@
+"""
+Measures hedged LLM requests and the circuit breaker against a local fake OpenRouter.
+
+Every model answers most requests in about --fast seconds (lognormal), but a
+--stall share of its requests stall for --stall-latency seconds, the way a busy
+free-tier provider does. Text requests go through llm_parser with routers of
+three kinds:
+
+    single:   one model, no hedging (the behaviour before the router)
+    failover: two models, the second only tried when the first fails
+    hedged:   two models, a hedge to the second after the first's p95 latency
+
+and the run reports p50/p95/p99 latency and how many extra requests hedging sent.
+The first --warmup requests of each run fill the latency window and are not counted.
+
+"outage" then makes the primary model answer every request with HTTP 503 and
+shows the breaker opening, requests going to the second model, and the primary
+getting a trial request after the cooldown.
+
+Usage (from the project root):
+    python -m benchmarks.bench_llm_router --requests 600 --concurrency 10
+"""
+import argparse
+import asyncio
+import logging
+import random
+import time
+from unittest import mock
+
+from src import llm_parser
+from src.llm_router import LLMRouter
+
+from .fake_openrouter import FakeOpenRouter
+
+PRIMARY = "model-a"
+SECONDARY = "model-b"
+
+
+def _percentile(samples: list[float], percentile: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(percentile / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _latency(args, rng: random.Random):
+    """A draw from the fast lognormal body, or a stall with probability args.stall."""
+    def draw() -> float:
+        if rng.random() < args.stall:
+            return args.stall_latency
+        return rng.lognormvariate(0, 0.3) * args.fast
+    return draw
+
+
+async def _run(router: LLMRouter, requests: int, concurrency: int, warmup: int) -> list[float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(n: int):
+        async with semaphore:
+            started = time.perf_counter()
+            items = await llm_parser._request_text_items(f"Lunch {n}")
+            if n >= warmup and items:
+                latencies.append(time.perf_counter() - started)
+
+    with mock.patch.object(llm_parser, "llm_router", router):
+        for n in range(warmup):
+            await one(n)
+        await asyncio.gather(*(one(n) for n in range(warmup, warmup + requests)))
+        await llm_parser.close_http_client()
+    return latencies
+
+
+def _hedging(args) -> None:
+    print(f"hedging ({args.requests} requests, {args.stall:.0%} stall for {args.stall_latency}s, "
+          f"concurrency {args.concurrency}):")
+    routers = {
+        "single": LLMRouter({"text": [PRIMARY]}, hedge=False),
+        "failover": LLMRouter({"text": [PRIMARY, SECONDARY]}, hedge=False),
+        "hedged": LLMRouter({"text": [PRIMARY, SECONDARY]}, hedge=True, min_hedge_delay=0.0,
+                            max_hedge_delay=args.stall_latency),
+    }
+    for name, router in routers.items():
+        rng = random.Random(args.seed)
+        fake = FakeOpenRouter(model_latencies={PRIMARY: _latency(args, rng), SECONDARY: _latency(args, rng)})
+        with fake, mock.patch.object(llm_parser, "OPENROUTER_API_URL", fake.url):
+            latencies = asyncio.run(_run(router, args.requests, args.concurrency, args.warmup))
+        sent = args.requests + args.warmup
+        stats = router.stats()
+        print(f"  {name:>8}: p50={_percentile(latencies, 50) * 1000:6.1f}ms "
+              f"p95={_percentile(latencies, 95) * 1000:6.1f}ms p99={_percentile(latencies, 99) * 1000:6.1f}ms, "
+              f"{fake.requests / sent - 1:5.1%} extra requests, hedged {stats['hedged']}, "
+              f"answered by {SECONDARY} {stats['fallback_answers']}")
+
+
+def _outage(args) -> None:
+    router = LLMRouter({"text": [PRIMARY, SECONDARY]}, hedge=True, min_hedge_delay=0.0, max_hedge_delay=0.5,
+                       breaker_failures=5, breaker_cooldown=args.cooldown)
+    fake = FakeOpenRouter(latency=args.fast, model_error_rates={PRIMARY: 1.0})
+    print(f"outage ({PRIMARY} answers 503, breaker after 5 failures, cooldown {args.cooldown}s):")
+    with fake, mock.patch.object(llm_parser, "OPENROUTER_API_URL", fake.url):
+        for phase, requests in (("down", 100), ("after cooldown", 20)):
+            if phase == "after cooldown":
+                time.sleep(args.cooldown)
+            before = dict(fake.requests_by_model)
+            latencies = asyncio.run(_run(router, requests, 1, 0))
+            sent = {model: count - before.get(model, 0) for model, count in fake.requests_by_model.items()}
+            print(f"  {phase:>14}: {len(latencies)}/{requests} answered, p50={_percentile(latencies, 50) * 1000:.1f}ms, "
+                  f"requests per model {sent}, stats {router.stats()}")
+    for model, stats in router.model_stats().items():
+        print(f"  {model}: {stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=600)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=40, help="Requests that fill the latency window first")
+    parser.add_argument("--fast", type=float, default=0.05, help="Median seconds of a normal completion")
+    parser.add_argument("--stall", type=float, default=0.04, help="Share of requests that stall")
+    parser.add_argument("--stall-latency", type=float, default=1.0, help="Seconds a stalled request takes")
+    parser.add_argument("--cooldown", type=float, default=1.0, help="Breaker cooldown in the outage run")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    _hedging(args)
+    _outage(args)
+
+
+if __name__ == "__main__":
+    main()
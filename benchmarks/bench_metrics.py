@@ -0,0 +1,148 @@
+"""
+Measures what the metrics instrumentation costs on the hot path.
+
+"primitives" times single Histogram.observe / Histogram.time / Counter.inc calls
+with metrics enabled and disabled, and observe() from --threads threads at once
+(the sheets worker pool records from threads). "pipeline" runs the instrumented
+part of a text message with no network: a user profile lookup in SQLite (cache
+miss), an LLM request answered in-process by an httpx mock transport, decoding its
+JSON, and a Sheets call through the scheduler. It reports the time per message
+with metrics on and off. "scrape" is how long rendering /metrics takes.
+
+Usage (from the project root):
+    python -m benchmarks.bench_metrics --messages 2000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+_DB_DIR = tempfile.mkdtemp(prefix="bench-metrics-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_DB_DIR, 'bench.db')}")
+
+import httpx  # noqa: E402
+
+from src import handlers, llm_parser, metrics  # noqa: E402
+from src.database import User, init_db, get_db_session, dispose_async_engine  # noqa: E402
+from src.sheets_scheduler import SheetsScheduler  # noqa: E402
+from src.user_cache import user_cache  # noqa: E402
+
+COMPLETION = {
+    "choices": [{"message": {"content": json.dumps([{"amount": 15, "category": "Food", "description": "Lunch"}])}}],
+    "usage": {"prompt_tokens": 180, "completion_tokens": 24, "total_tokens": 204}
+}
+
+
+def _per_call(func, repeat: int) -> float:
+    """Nanoseconds per call of func, best of 5 runs."""
+    best = float("inf")
+    for _ in range(5):
+        started = time.perf_counter_ns()
+        for _ in range(repeat):
+            func()
+        best = min(best, (time.perf_counter_ns() - started) / repeat)
+    return best
+
+
+def _primitives(args) -> None:
+    histogram = metrics.Histogram("bench_primitive_seconds", "benchmark", ("stage",))
+    counter = metrics.Counter("bench_primitive_total", "benchmark", ("kind",))
+
+    def timed():
+        with histogram.time("stage"):
+            pass
+
+    calls = {
+        "observe": lambda: histogram.observe(0.012, "stage"),
+        "time()": timed,
+        "inc": lambda: counter.inc("kind"),
+    }
+    for name, call in calls.items():
+        metrics.set_enabled(True)
+        enabled = _per_call(call, args.repeat)
+        metrics.set_enabled(False)
+        disabled = _per_call(call, args.repeat)
+        print(f"  {name:>8}: {enabled:6.0f} ns enabled, {disabled:5.0f} ns disabled")
+    metrics.set_enabled(True)
+
+    def worker():
+        for _ in range(args.repeat):
+            histogram.observe(0.012, "threads")
+
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    print(f"  observe from {args.threads} threads: {elapsed / (args.threads * args.repeat) * 1e9:.0f} ns per call, "
+          f"{histogram.snapshot('threads')['count']} observations recorded")
+
+
+async def _pipeline(args) -> float:
+    """Seconds per message for the instrumented steps of a text message."""
+    scheduler = SheetsScheduler(rate=0, spreadsheet_rate=0)
+    started = time.perf_counter()
+    for n in range(args.messages):
+        user_id = n % args.users + 1
+        user_cache.invalidate(user_id)  # Force the database lookup
+        profile = await handlers._load_user_profile(user_id)
+        items = await llm_parser._request_text_items("Lunch $15")
+        await asyncio.to_thread(scheduler.call, profile["spreadsheet_id"], len, items)
+    return (time.perf_counter() - started) / args.messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200_000, help="Calls per primitive measurement")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    print("primitives:")
+    _primitives(args)
+
+    init_db()
+    session = get_db_session()
+    session.add_all(User(id=user_id, first_name=f"user{user_id}", spreadsheet_id=f"sheet-{user_id}")
+                    for user_id in range(1, args.users + 1))
+    session.commit()
+    session.close()
+
+    async def run_rounds() -> dict:
+        llm_parser._http_client = httpx.AsyncClient(
+            transport=httpx.MockTransport(lambda request: httpx.Response(200, json=COMPLETION))
+        )
+        await _pipeline(args)  # Warm up connections and caches
+        best = {True: float("inf"), False: float("inf")}
+        for _ in range(args.rounds):
+            for enabled in (True, False):
+                metrics.set_enabled(enabled)
+                best[enabled] = min(best[enabled], await _pipeline(args))
+        metrics.set_enabled(True)
+        await llm_parser.close_http_client()
+        await dispose_async_engine()
+        return best
+
+    best = asyncio.run(run_rounds())
+    overhead = best[True] - best[False]
+    print(f"pipeline: {best[True] * 1e6:.0f} us/message with metrics, {best[False] * 1e6:.0f} us/message without "
+          f"({overhead * 1e6:+.1f} us, {overhead / best[False] * 100:+.1f}%)")
+    print(f"  llm_request {metrics.stage_latency.snapshot('llm_request')}, "
+          f"tokens {metrics.llm_tokens.value('prompt'):.0f} prompt / {metrics.llm_tokens.value('completion'):.0f} completion")
+
+    started = time.perf_counter()
+    body = metrics.render()
+    print(f"scrape: {len(body.splitlines())} lines rendered in {(time.perf_counter() - started) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
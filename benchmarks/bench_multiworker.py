@@ -0,0 +1,258 @@
+"""
+Runs N worker processes against one shared database and checks their coordination.
+
+Each worker starts the leader lease and the cache invalidation bus as the bot does
+in multi-worker mode, then all workers sync the same users' expenses at the same
+time, each through its own fake Sheets backend. The benchmark then:
+
+- publishes invalidation events and measures how long they take to reach every worker,
+- kills the leader with SIGKILL and measures how long until another worker leads,
+- stops the next leader cleanly (it hands the lease back) and measures the handover.
+
+"overlap" is the time two workers both considered themselves leader (expected: 0).
+Duplicates are expenses appended by more than one worker, lost ones were appended
+by none; both should be 0.
+
+Uses a temporary SQLite file unless DATABASE_URL is set (e.g. to a Postgres URL).
+
+Usage (from the project root):
+    python -m benchmarks.bench_multiworker --workers 4 --users 40 --expenses 5 --ttl 2
+"""
+import argparse
+import asyncio
+import datetime
+import logging
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+import uuid
+from collections import Counter
+
+INVALIDATION_CACHE = "bench"
+
+
+def _configure(args) -> None:
+    """Environment for the parent and (inherited by) the workers; set before importing src."""
+    if "DATABASE_URL" not in os.environ:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench-mw-'), 'bench.db')}"
+    os.environ["MULTI_WORKER"] = "true"
+    os.environ["LEADER_LEASE_TTL"] = str(args.ttl)
+    os.environ["CACHE_INVALIDATION_POLL_INTERVAL"] = str(args.poll)
+
+
+def _seed(args) -> list[str]:
+    """Creates the users and their unsynced expenses; returns the expense UIDs."""
+    from src.database import Expense, User, init_db, get_db_session
+
+    init_db()
+    session = get_db_session()
+    uids = []
+    try:
+        old = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+        for user_id in range(1, args.users + 1):
+            session.add(User(id=user_id, first_name=f"user{user_id}", spreadsheet_id=f"sheet-{user_id}"))
+            for _ in range(args.expenses):
+                uid = uuid.uuid4().hex
+                uids.append(uid)
+                session.add(Expense(expense_uid=uid, user_id=user_id, timestamp=old, amount=10.0,
+                                    category="Food", description="benchmark", created_at=old))
+        session.commit()
+    finally:
+        session.close()
+    return uids
+
+
+async def _worker_main(index: int, events, stop, args) -> None:
+    from src.coordination import leader_lease, invalidation_bus
+    from src.database import dispose_async_engine
+    from src.expense_sync import sync_user_expenses
+
+    from .fake_gspread import FakeBackend, use_backend
+
+    invalidation_bus.subscribe(INVALIDATION_CACHE, lambda sent: events.put(("invalidation", index, time.time() - float(sent))))
+    await leader_lease.start()
+    await invalidation_bus.start()
+
+    async def watch_leadership():
+        leading = None
+        while True:
+            if leader_lease.is_leader != leading:
+                leading = leader_lease.is_leader
+                events.put(("leader", index, time.time(), leading))
+            await asyncio.sleep(0.01)
+
+    watcher = asyncio.create_task(watch_leadership())
+
+    # Every worker tries to sync every user at once, in its own order
+    backend = FakeBackend(latency=args.latency)
+    user_ids = list(range(1, args.users + 1))
+    random.Random(index).shuffle(user_ids)
+    with use_backend(backend):
+        semaphore = asyncio.Semaphore(8)
+
+        async def sync(user_id: int):
+            async with semaphore:
+                return await asyncio.to_thread(sync_user_expenses, user_id, f"sheet-{user_id}")
+
+        await asyncio.gather(*(sync(user_id) for user_id in user_ids))
+    appended = [row[5] for spreadsheet in backend.spreadsheets.values()
+                for worksheet in spreadsheet.worksheets.values() for row in worksheet.rows[1:]]
+    events.put(("synced", index, appended))
+
+    while not stop.is_set():
+        await asyncio.sleep(0.01)
+    watcher.cancel()
+    await invalidation_bus.stop()
+    await leader_lease.stop()
+    events.put(("leader", index, time.time(), False))
+    await dispose_async_engine()
+
+
+def _worker(index: int, events, stop, args) -> None:
+    logging.disable(logging.WARNING)
+    asyncio.run(_worker_main(index, events, stop, args))
+
+
+async def _publish(count: int, spacing: float) -> None:
+    from src.coordination import invalidation_bus
+    from src.database import get_async_db_session, dispose_async_engine
+
+    for _ in range(count):
+        async with get_async_db_session() as session:
+            invalidation_bus.publish(session, INVALIDATION_CACHE, repr(time.time()))
+            await session.commit()
+        await asyncio.sleep(spacing)
+    await dispose_async_engine()
+
+
+class _Timeline:
+    """Collects worker events and answers questions about leadership."""
+
+    def __init__(self, events):
+        self.events = events
+        self.transitions: list[tuple[float, int, bool]] = []
+        self.invalidations: list[float] = []
+        self.appended: dict[int, list[str]] = {}
+
+    def drain(self) -> None:
+        while not self.events.empty():
+            kind, index, *rest = self.events.get()
+            if kind == "leader":
+                self.transitions.append((rest[0], index, rest[1]))
+            elif kind == "invalidation":
+                self.invalidations.append(rest[0])
+            else:
+                self.appended[index] = rest[0]
+
+    def leaders(self, dead: dict[int, float]) -> set[int]:
+        """Live workers that currently consider themselves leader."""
+        leading = set()
+        for _, index, is_leader in sorted(self.transitions):
+            (leading.add if is_leader else leading.discard)(index)
+        return leading - dead.keys()
+
+    def wait_for_leader(self, dead: dict[int, float], timeout: float) -> tuple[int | None, float]:
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            self.drain()
+            leaders = self.leaders(dead)
+            if leaders:
+                index = next(iter(leaders))
+                became = max(when for when, i, is_leader in self.transitions if i == index and is_leader)
+                return index, became
+            time.sleep(0.01)
+        return None, 0.0
+
+    def overlap(self, dead: dict[int, float]) -> float:
+        """Seconds during which more than one live worker considered itself leader."""
+        # A killed worker cannot report losing the lease; it stopped acting as leader when it died
+        transitions = sorted(self.transitions + [(when, index, False) for index, when in dead.items()])
+        leading: set[int] = set()
+        overlap, previous = 0.0, None
+        for when, index, is_leader in transitions:
+            if previous is not None and len(leading) > 1:
+                overlap += when - previous
+            (leading.add if is_leader else leading.discard)(index)
+            previous = when
+        return overlap
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--users", type=int, default=40)
+    parser.add_argument("--expenses", type=int, default=5, help="Unsynced expenses per user")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds per fake Sheets API call")
+    parser.add_argument("--ttl", type=float, default=2.0, help="LEADER_LEASE_TTL in seconds")
+    parser.add_argument("--poll", type=float, default=0.1, help="CACHE_INVALIDATION_POLL_INTERVAL in seconds")
+    parser.add_argument("--invalidations", type=int, default=50)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    _configure(args)
+    uids = _seed(args)
+
+    context = multiprocessing.get_context("spawn")
+    events = context.Queue()
+    stops = [context.Event() for _ in range(args.workers)]
+    processes = [context.Process(target=_worker, args=(index, events, stops[index], args))
+                 for index in range(args.workers)]
+    started = time.perf_counter()
+    for process in processes:
+        process.start()
+
+    timeline = _Timeline(events)
+    while len(timeline.appended) < args.workers:
+        timeline.drain()
+        time.sleep(0.05)
+    sync_time = time.perf_counter() - started
+
+    asyncio.run(_publish(args.invalidations, spacing=0.02))
+    deadline = time.time() + 5 * args.poll + 2
+    while len(timeline.invalidations) < args.invalidations * args.workers and time.time() < deadline:
+        timeline.drain()
+        time.sleep(0.05)
+
+    dead: dict[int, float] = {}
+    leader, _ = timeline.wait_for_leader(dead, timeout=3 * args.ttl)
+    killed_at = time.time()
+    processes[leader].kill()
+    dead[leader] = killed_at
+    next_leader, became = timeline.wait_for_leader(dead, timeout=3 * args.ttl)
+    failover = became - killed_at
+
+    stopped_at = time.time()
+    stops[next_leader].set()
+    processes[next_leader].join()
+    dead[next_leader] = time.time()
+    _, became = timeline.wait_for_leader(dead, timeout=3 * args.ttl)
+    handover = became - stopped_at
+
+    for stop in stops:
+        stop.set()
+    for process in processes:
+        process.join()
+    timeline.drain()
+
+    appended = Counter(uid for rows in timeline.appended.values() for uid in rows)
+    duplicates = sum(count - 1 for count in appended.values() if count > 1)
+    lost = sum(1 for uid in uids if uid not in appended)
+    latencies = sorted(timeline.invalidations)
+    backend = os.environ["DATABASE_URL"].split(":", 1)[0]
+    print(f"{args.workers} workers on {backend}, lease ttl {args.ttl}s, invalidation poll {args.poll}s")
+    print(f"  sync: {len(uids)} expenses of {args.users} users synced by all workers at once in {sync_time:.1f}s, "
+          f"duplicates={duplicates}, lost={lost}, appended per worker "
+          f"{[len(timeline.appended[index]) for index in sorted(timeline.appended)]}")
+    if latencies:
+        print(f"  invalidation: {len(latencies)}/{args.invalidations * args.workers} deliveries, "
+              f"p50={statistics.median(latencies) * 1000:.0f}ms "
+              f"p95={latencies[int(len(latencies) * 0.95) - 1] * 1000:.0f}ms max={latencies[-1] * 1000:.0f}ms")
+    print(f"  leadership: failover after SIGKILL {failover:.2f}s, handover after clean stop {handover:.2f}s, "
+          f"overlap={timeline.overlap(dead):.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""
+End-to-end load test of the message pipeline, fully offline.
+
+Synthetic Telegram Updates (texts from the expense corpus and receipt photos) are
+fed to handlers.handle_message through a real Application and the
+ShardedUpdateProcessor, exactly as in production. External services are replaced:
+- the Bot API by an in-process fake (--telegram-latency),
+- OpenRouter by a local HTTP server with canned JSON (--llm-latency),
+- Google Sheets by the fake gspread backend (--sheets-latency), which rejects calls
+  beyond --sheets-quota per --quota-window seconds with 429, like Google does.
+
+--users users send --messages messages each, back to back (a user's next message
+goes out when the previous one is answered), so --users is the concurrency.
+
+Reported:
+- throughput
+- p50/p95/p99 of the reply latency (update received -> handler done)
+- p50/p95/p99 of the sheet latency (update received -> "Saved to Google Sheet"); the
+  run ends once every message's confirmation was edited with the sheet outcome
+- API calls per message for each service, and throttled Sheets calls
+- peak RSS; Python heap peak with --trace-memory, which slows the run
+
+--json writes the results with the git commit, so runs can be compared; --compare
+prints the change against an earlier results file. Compare runs with the same
+arguments and a few hundred messages or more: short runs vary by 10-20%.
+
+Usage (from the project root):
+    python -m benchmarks.bench_pipeline --users 50 --messages 10 --photo-ratio 0.1 --json results.json
+    python -m benchmarks.bench_pipeline --users 50 --messages 10 --compare results.json
+"""
+import argparse
+import asyncio
+import datetime
+import io
+import json
+import logging
+import os
+import random
+import resource
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from unittest import mock
+
+
+def _configure(args) -> None:
+    """Environment read by src.config; must be set before src is imported."""
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench-e2e-'), 'bench.db')}")
+    os.environ["OPENROUTER_API_KEY"] = "bench"
+    os.environ["METRICS_PORT"] = "0"
+    os.environ["LLM_CACHE_DISK_PATH"] = ""
+    os.environ["EXPENSE_SYNC_DEBOUNCE"] = str(args.debounce)
+    os.environ["EXPENSE_SYNC_MAX_DELAY"] = str(max(args.debounce * 5, 1.0))
+    os.environ["EXPENSE_SYNC_INTERVAL"] = "1"
+    os.environ["EXPENSE_SYNC_RETRY_BASE"] = "0.5"
+    os.environ["CONCURRENT_UPDATES"] = str(args.workers)
+
+
+def _receipt_jpeg(width: int = 1280, height: int = 1706) -> bytes:
+    """A noisy, photo-like receipt so downloads and uploads have realistic sizes."""
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(7)
+    noise = Image.effect_noise((width, height), 40).convert("RGB")
+    image = Image.blend(Image.new("RGB", (width, height), (235, 230, 220)), noise, 0.35)
+    draw = ImageDraw.Draw(image)
+    for line in range(30):
+        draw.text((width // 6, 200 + line * 40), f"ITEM {line:02d} ........ {rng.uniform(1, 99):6.2f}", fill=(20, 20, 20))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def _update(update_id: int, user_id: int, message_id: int, text: str | None, bot):
+    from telegram import Update
+
+    message = {
+        "message_id": message_id, "date": int(time.time()),
+        "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+        "chat": {"id": user_id, "type": "private"},
+    }
+    if text is None:
+        message["photo"] = [
+            {"file_id": f"small-{update_id}", "file_unique_id": "s", "width": 320, "height": 427},
+            {"file_id": f"large-{update_id}", "file_unique_id": "l", "width": 1280, "height": 1706},
+        ]
+    else:
+        message["text"] = text
+    return Update.de_json({"update_id": update_id, "message": message}, bot)
+
+
+def _percentiles(values: list[float]) -> dict:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None}
+    values = sorted(values)
+    pick = lambda q: round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 1)  # noqa: E731
+    return {"p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99)}
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def _run(args) -> dict:
+    from telegram.ext import Application, MessageHandler, filters
+
+    from src import bot, handlers, llm_parser
+    from src.database import Expense, User, init_db, get_async_db_session
+    from src.expense_sync import expense_syncer
+    from src.sheets_scheduler import SheetsScheduler
+    from src.update_processor import ShardedUpdateProcessor
+    from sqlalchemy import func, select
+
+    from .expense_corpus import EXPENSE_CORPUS
+    from .fake_gspread import FakeBackend, use_backend
+    from .fake_openrouter import FakeOpenRouter
+    from .fake_telegram import FakeBotApi
+
+    init_db()
+    received: dict[int, float] = {}  # Update id -> when it was dispatched
+    reply_of: dict[int, int] = {}  # Bot message id of the reply -> update id
+    pending_reply: dict[int, int] = {}  # Chat id -> update id being handled
+    sheet_latency: list[float] = []
+    confirmed: set[int] = set()  # Updates whose confirmation was edited with the sheet outcome
+
+    def on_message(method: str, params: dict, message_id: int) -> None:
+        chat_id = int(params.get("chat_id", 0))
+        if method == "sendMessage" and chat_id in pending_reply:
+            reply_of.setdefault(message_id, pending_reply[chat_id])
+        elif method == "editMessageText" and "Google Sheet" in params.get("text", ""):
+            update_id = reply_of.get(message_id)
+            if update_id is None:
+                return
+            confirmed.add(update_id)
+            if "Saved to Google Sheet" in params["text"]:
+                sheet_latency.append(time.perf_counter() - received[update_id])
+
+    telegram_api = FakeBotApi(args.telegram_latency, file_bytes=_receipt_jpeg(), on_message=on_message)
+    application = (
+        Application.builder().token("1:bench").request(telegram_api).updater(None)
+        .concurrent_updates(ShardedUpdateProcessor(args.workers)).build()
+    )
+    application.add_handler(MessageHandler((filters.TEXT & ~filters.COMMAND) | filters.PHOTO, handlers.handle_message))
+
+    async with get_async_db_session() as session:
+        session.add_all(User(id=user_id, first_name=f"user{user_id}", spreadsheet_id=f"sheet-{user_id}")
+                        for user_id in range(1, args.users + 1))
+        await session.commit()
+
+    sheets = FakeBackend(latency=args.sheets_latency, quota=args.sheets_quota, quota_window=args.quota_window)
+    scheduler = SheetsScheduler(rate=0, spreadsheet_rate=0, backoff_base=0.2, backoff_max=5)
+    rng = random.Random(args.seed)
+    reply_latency: list[float] = []
+    total = args.users * args.messages
+
+    with FakeOpenRouter(latency=args.llm_latency) as llm, use_backend(sheets, scheduler), \
+            mock.patch.object(llm_parser, "OPENROUTER_API_URL", llm.url), \
+            mock.patch.object(llm_parser, "FAST_PARSER_ENABLED", args.fast_parser), \
+            mock.patch.object(llm_parser, "LLM_CACHE_ENABLED", args.llm_cache):
+        await application.initialize()
+        await bot._on_startup(application)
+        await application.start()
+        if args.trace_memory:
+            tracemalloc.start()
+
+        async def user_session(user_id: int) -> None:
+            for message_id in range(1, args.messages + 1):
+                update_id = user_id * args.messages + message_id
+                photo = rng.random() < args.photo_ratio
+                text = None if photo else rng.choice(EXPENSE_CORPUS)[0]
+                update = _update(update_id, user_id, message_id, text, application.bot)
+                received[update_id] = started = time.perf_counter()
+                pending_reply[user_id] = update_id
+                await application.update_processor.process_update(update, application.process_update(update))
+                reply_latency.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user_session(user_id) for user_id in range(1, args.users + 1)))
+        elapsed = time.perf_counter() - started
+
+        # Wait for every message's sheet confirmation (or give up after --settle-timeout)
+        deadline = time.perf_counter() + args.settle_timeout
+        while len(confirmed) < len(reply_latency) and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        settled = time.perf_counter() - started
+
+        heap_peak = tracemalloc.get_traced_memory()[1] if args.trace_memory else None
+        if args.trace_memory:
+            tracemalloc.stop()
+        async with get_async_db_session() as session:
+            stored = (await session.execute(select(func.count()).select_from(Expense))).scalar()
+            unsynced = (await session.execute(
+                select(func.count()).select_from(Expense).where(Expense.synced_at.is_(None))
+            )).scalar()
+        syncer_stats = expense_syncer.stats()
+        await application.stop()
+        await bot._on_shutdown(application)
+        await application.shutdown()
+        llm_requests = llm.requests
+
+    return {
+        "messages": total,
+        "expenses_stored": stored,
+        "expenses_unsynced": unsynced,
+        "confirmed": len(confirmed),
+        "throughput_per_s": round(total / elapsed, 1),
+        "settled_s": round(settled, 2),
+        "reply_ms": _percentiles(reply_latency),
+        "sheet_ms": _percentiles(sheet_latency),
+        "calls_per_message": {
+            "openrouter": round(llm_requests / total, 3),
+            "sheets": round(sheets.total_calls() / total, 3),
+            "telegram": round(telegram_api.total_calls() / total, 3),
+        },
+        "sheets_throttled": sheets.throttled,
+        "sheets_calls": dict(sheets.calls),
+        "telegram_calls": dict(telegram_api.calls),
+        "syncer": syncer_stats,
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "heap_peak_mb": round(heap_peak / 2 ** 20, 1) if heap_peak is not None else None,
+    }
+
+
+def _flatten(results: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def _compare(baseline: dict, results: dict) -> None:
+    print(f"\nchange against {baseline.get('commit') or 'baseline'} ({baseline.get('timestamp')}):")
+    old, new = _flatten(baseline["results"]), _flatten(results)
+    for key in sorted(old.keys() & new.keys()):
+        if old[key] == new[key]:
+            continue
+        change = f"{(new[key] - old[key]) / old[key] * 100:+.1f}%" if old[key] else "new"
+        print(f"  {key:<40} {old[key]:>10} -> {new[key]:<10} {change}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50, help="Concurrent users")
+    parser.add_argument("--messages", type=int, default=10, help="Messages per user")
+    parser.add_argument("--photo-ratio", type=float, default=0.1, help="Share of messages that are receipt photos")
+    parser.add_argument("--workers", type=int, default=64, help="Update workers (CONCURRENT_UPDATES)")
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--telegram-latency", type=float, default=0.03)
+    parser.add_argument("--sheets-latency", type=float, default=0.15)
+    parser.add_argument("--sheets-quota", type=int, default=60, help="Sheets calls accepted per window, 0 = unlimited")
+    parser.add_argument("--quota-window", type=float, default=10.0)
+    parser.add_argument("--debounce", type=float, default=0.5, help="EXPENSE_SYNC_DEBOUNCE in seconds")
+    parser.add_argument("--fast-parser", action=argparse.BooleanOptionalAction, default=True)
+    parser.add_argument("--llm-cache", action=argparse.BooleanOptionalAction, default=True)
+    parser.add_argument("--trace-memory", action="store_true", help="Also report the Python heap peak (slower)")
+    parser.add_argument("--settle-timeout", type=float, default=60.0, help="Seconds to wait for sheet syncs")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--compare", help="Results file of an earlier run to compare with")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    _configure(args)
+    results = asyncio.run(_run(args))
+
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "commit": _git_commit(),
+                "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+                "config": vars(args),
+                "results": results
+            }, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            _compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Compares the prompts before and after the prompts module.
+
+"size" builds the request messages for every corpus text (and a batch of eight,
+and a receipt image request) with the previous inline f-string templates and with
+prompts.py, and reports characters and estimated tokens per request, how long
+building and serializing the payload takes, and the stable prefix: the bytes every
+request of that kind starts with, which providers can serve from their prompt
+cache. Structured output adds the JSON schema to the payload; it is shown
+separately because providers count it as prompt tokens too. They render it ahead
+of the messages, so it is measured that way and is part of the cacheable prefix.
+
+"truncation" shows what the token budget does to a pasted wall of text.
+
+"requests" sends the corpus through llm_parser to a local fake OpenRouter that
+reports usage as the estimated prompt size, with cached tokens equal to the prefix
+shared with the previous request, and prints the per-request token histogram that
+the bot exports on /metrics. Set LLM_STRUCTURED_OUTPUT=true to run it in
+structured output mode.
+
+Usage (from the project root):
+    python -m benchmarks.bench_prompts --repeat 2000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+from src import llm_parser, metrics, prompts
+from src.config import EXPENSE_CATEGORIES, LLM_INPUT_MAX_TOKENS, LLM_STRUCTURED_OUTPUT
+from src.prompts import estimate_tokens
+
+from .expense_corpus import EXPENSE_CORPUS
+from .fake_openrouter import FakeOpenRouter
+
+IMAGE_URL = "data:image/jpeg;base64,"
+
+
+def _old_text_messages(text: str) -> list[dict]:
+    """The text prompt as llm_parser built it before the prompts module."""
+    prompt = f"""
+    Analyze the following text which may contain multiple expense entries. Extract each expense with the following details:
+    - "amount": number (float or integer)
+    - "category": a relevant category word or phrase
+    - "description": optional brief description or null
+    - "date": optional date string in ISO format (YYYY-MM-DD), or null if not specified
+
+    Return ONLY a JSON array of objects, each with keys: "amount", "category", "description", "date".
+    Valid categories include: {', '.join(EXPENSE_CATEGORIES)}.
+    If the category is not recognized, use "Other".
+    If you cannot extract any expenses, return an empty JSON array [].
+
+    Text to analyze: "{text}"
+
+    JSON Output:
+    """
+    return [{"role": "user", "content": prompt}]
+
+
+def _old_batch_messages(texts: dict[str, str]) -> list[dict]:
+    prompt = f"""
+    The JSON object below maps request ids to texts. Each text may contain multiple expense entries. For every text, extract each expense with the following details:
+    - "amount": number (float or integer)
+    - "category": a relevant category word or phrase
+    - "description": optional brief description or null
+    - "date": optional date string in ISO format (YYYY-MM-DD), or null if not specified
+
+    Return ONLY a JSON object with the same request ids as keys, each mapped to a JSON array of objects with keys: "amount", "category", "description", "date".
+    Valid categories include: {', '.join(EXPENSE_CATEGORIES)}.
+    If the category is not recognized, use "Other".
+    If a text contains no expenses, map its id to an empty JSON array [].
+
+    Texts to analyze: {json.dumps(texts, ensure_ascii=False)}
+
+    JSON Output:
+    """
+    return [{"role": "user", "content": prompt}]
+
+
+def _old_image_messages(image_url: str) -> list[dict]:
+    prompt = f"""
+    Analyze the attached image, which may contain multiple expense entries (e.g., a photo of a receipt). Extract each expense with the following details:
+    - "amount": number (float or integer)
+    - "category": a relevant category word or phrase
+    - "description": optional brief description or null
+    - "date": optional date string in ISO format (YYYY-MM-DD), or null if not specified
+
+    Return ONLY a JSON array of objects, each with keys: "amount", "category", "description", "date".
+    Valid categories include: {', '.join(EXPENSE_CATEGORIES)}.
+    If the category is not recognized, use "Other".
+    If you cannot extract any expenses, return an empty JSON array [].
+
+    JSON Output:
+    """
+    return [{"role": "user", "content": [
+        {"type": "text", "text": prompt}, {"type": "image_url", "image_url": {"url": image_url}}
+    ]}]
+
+
+def _common_prefix(first: str, second: str) -> int:
+    length = 0
+    for a, b in zip(first, second):
+        if a != b:
+            break
+        length += 1
+    return length
+
+
+def _batches(texts: list[str], size: int) -> list[dict[str, str]]:
+    return [{str(n): text for n, text in enumerate(texts[start:start + size])} for start in range(0, len(texts), size)]
+
+
+def _size(args) -> None:
+    texts = [text for text, _ in EXPENSE_CORPUS]
+    variants = {
+        "before": {"text": _old_text_messages, "batch": _old_batch_messages, "image": _old_image_messages},
+        "after": {"text": lambda t: prompts.text_messages(t, structured=False),
+                  "batch": lambda t: prompts.batch_messages(t, structured=False),
+                  "image": lambda u: prompts.image_messages(u, structured=False)},
+        "schema": {"text": lambda t: prompts.text_messages(t, structured=True),
+                   "batch": lambda t: prompts.batch_messages(t, structured=True),
+                   "image": lambda u: prompts.image_messages(u, structured=True)},
+    }
+    inputs = {"text": texts, "batch": _batches(texts, 8), "image": [IMAGE_URL, IMAGE_URL]}
+    response_kinds = {"text": "expenses", "batch": "batch", "image": "expenses"}
+
+    print(f"size ({len(texts)} corpus texts, batches of 8; 'schema' = structured output incl. response_format):")
+    for kind, kind_inputs in inputs.items():
+        for name, builders in variants.items():
+            build = builders[kind]
+            extra = {}
+            if name == "schema":
+                extra["response_format"] = prompts.response_format(response_kinds[kind], structured=True)
+            bodies = [json.dumps({**extra, "messages": build(value)}, ensure_ascii=False) for value in kind_inputs]
+            chars = sum(len(body) for body in bodies) / len(bodies)
+            tokens = sum(estimate_tokens(body) for body in bodies) / len(bodies)
+            prefix = min(_common_prefix(bodies[0], body) for body in bodies[1:])
+
+            started = time.perf_counter()
+            for _ in range(args.repeat):
+                json.dumps({**extra, "messages": build(kind_inputs[0])}, ensure_ascii=False)
+            build_us = (time.perf_counter() - started) / args.repeat * 1e6
+            print(f"  {kind:>5} {name:>6}: {chars:6.0f} chars, ~{tokens:5.0f} tokens, "
+                  f"stable prefix {prefix:5d} chars ({prefix / chars:4.0%}), built in {build_us:5.1f}us")
+
+
+def _truncation() -> None:
+    wall = " ".join(text for text, _ in EXPENSE_CORPUS) * 20
+    before = _old_text_messages(wall)[0]["content"]
+    after = prompts.text_messages(wall, structured=False)[1]["content"]
+    print(f"truncation (budget {LLM_INPUT_MAX_TOKENS} tokens): a {len(wall)}-character message "
+          f"~{estimate_tokens(before)} tokens before, ~{estimate_tokens(after)} tokens after")
+
+
+class _UsageReportingOpenRouter(FakeOpenRouter):
+    """Reports the estimated prompt size as usage, with the prefix shared with the previous request as cached."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._previous = ""
+
+    def respond(self, payload: dict) -> tuple[int, dict]:
+        body = json.dumps({key: payload.get(key) for key in ("response_format", "messages")}, ensure_ascii=False)
+        with self._lock:
+            cached = _common_prefix(self._previous, body)
+            self._previous = body
+        items = json.loads(self.content)
+        if payload.get("response_format", {}).get("json_schema", {}).get("name") == "batch_expenses":
+            content = {"results": []}
+        elif payload.get("response_format"):
+            content = {"expenses": items}
+        else:
+            content = items
+        return 200, {
+            "choices": [{"message": {"content": json.dumps(content)}}],
+            "usage": {"prompt_tokens": estimate_tokens(body), "completion_tokens": estimate_tokens(self.content),
+                      "prompt_tokens_details": {"cached_tokens": cached // 4}},
+        }
+
+
+async def _requests(args) -> None:
+    with _UsageReportingOpenRouter(latency=0) as fake:
+        llm_parser.OPENROUTER_API_URL = fake.url
+        for _ in range(args.rounds):
+            for text, _ in EXPENSE_CORPUS:
+                items = await llm_parser._request_text_items(text)
+                assert items, "the fake answer did not parse"
+        await llm_parser.close_http_client()
+    prompt = metrics.llm_request_tokens.snapshot("text", "prompt")
+    completion = metrics.llm_request_tokens.snapshot("text", "completion")
+    print(f"requests ({prompt['count']} text requests, structured output {'on' if LLM_STRUCTURED_OUTPUT else 'off'}):")
+    print(f"  prompt tokens per request: mean {prompt['sum'] / prompt['count']:.0f}, p50<={prompt['p50']}, p99<={prompt['p99']}")
+    print(f"  completion tokens per request: mean {completion['sum'] / completion['count']:.0f}")
+    print(f"  cached prompt tokens: {metrics.llm_tokens.value('cached') / metrics.llm_tokens.value('prompt'):.0%} "
+          f"of {metrics.llm_tokens.value('prompt'):.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=2000, help="Builds per payload timing")
+    parser.add_argument("--rounds", type=int, default=2, help="Passes over the corpus in the requests run")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    _size(args)
+    _truncation()
+    asyncio.run(_requests(args))
+
+
+if __name__ == "__main__":
+    main()
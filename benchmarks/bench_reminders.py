@@ -0,0 +1,175 @@
+"""
+Fans the daily reminder out to a large user base through a fake Telegram Bot.
+
+The fake Bot answers after --latency seconds and enforces Telegram's ~30 messages/s
+bot-wide limit, raising RetryAfter when it is exceeded; --blocked of the users have
+blocked the bot. To keep the run short the clock is scaled by --speedup: latency,
+limit and send rate are all scaled, and durations are reported in real-time terms.
+
+"sequential" is the old job (load every ID with .all(), await each send in turn),
+timed on a sample and extrapolated. "unpaced" sends concurrently without pacing,
+"dispatcher" is the ReminderDispatcher with everyone in one timezone, and
+"dispatcher 24tz" spreads users over 24 timezones and runs the 15-minute checks
+of a whole day. --logged of the users already logged an expense that day.
+
+Usage (from the project root):
+    python -m benchmarks.bench_reminders --users 100000 --speedup 100
+"""
+import argparse
+import asyncio
+import datetime
+import logging
+import os
+import random
+import tempfile
+import time
+
+_DB_DIR = tempfile.mkdtemp(prefix="bench-reminders-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_DB_DIR, 'bench.db')}")
+
+import telegram  # noqa: E402
+from sqlalchemy import insert, update  # noqa: E402
+
+from src.database import User, engine, init_db, get_db_session, dispose_async_engine  # noqa: E402
+from src.reminders import ReminderDispatcher, parse_timezone  # noqa: E402
+
+DAY = datetime.date(2026, 1, 15)
+# Etc/GMT-12 is UTC+12: local 20:00 in these zones falls between 08:00 UTC and 07:00 UTC the next day
+ZONES = [f"Etc/GMT{offset:+d}" if offset else "UTC" for offset in range(-12, 12)]
+
+
+class FakeBot:
+    """send_message() with fixed latency and a bot-wide messages-per-second limit."""
+
+    def __init__(self, latency: float, limit: float, speedup: float, blocked: set[int]):
+        self.latency = latency
+        self.limit = limit
+        self.speedup = speedup
+        self.blocked = blocked
+        self.window_start = 0.0
+        self.window_count = 0
+        self.sent = 0
+        self.retry_after = 0
+
+    async def send_message(self, chat_id: int, text: str):
+        now = asyncio.get_running_loop().time()
+        if now - self.window_start >= 1 / self.speedup:
+            self.window_start, self.window_count = now, 0
+        self.window_count += 1
+        if self.window_count > self.limit:
+            self.retry_after += 1
+            raise telegram.error.RetryAfter(datetime.timedelta(seconds=2 / self.speedup))
+        await asyncio.sleep(self.latency)
+        if chat_id in self.blocked:
+            raise telegram.error.Forbidden("Forbidden: bot was blocked by the user")
+        self.sent += 1
+
+
+def _create_users(count: int, logged: float) -> set[int]:
+    """Inserts the users; returns the IDs of those who already logged an expense on DAY (local)."""
+    rng = random.Random(7)
+    logged_ids = {user_id for user_id in range(1, count + 1) if rng.random() < logged}
+    with engine.begin() as connection:
+        connection.execute(insert(User), [
+            {"id": user_id, "first_name": f"user{user_id}", "monthly_limit": 1800.0} for user_id in range(1, count + 1)
+        ])
+    return logged_ids
+
+
+def _assign_timezones(count: int, zones: list[str | None], logged_ids: set[int]) -> None:
+    """Spreads users round-robin over zones and dates logged users' last expense on DAY in their zone."""
+    session = get_db_session()
+    try:
+        # Everyone got yesterday's reminder, as in steady state
+        session.execute(update(User).values(reminded_on=DAY - datetime.timedelta(days=1), last_expense_at=None))
+        rows = []
+        for user_id in range(1, count + 1):
+            zone = zones[user_id % len(zones)]
+            row = {"id": user_id, "timezone": zone}
+            if user_id in logged_ids:
+                local_noon = datetime.datetime.combine(DAY, datetime.time(12), tzinfo=parse_timezone(zone or "UTC"))
+                row["last_expense_at"] = local_noon.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+            rows.append(row)
+        session.execute(update(User), rows)
+        session.commit()
+    finally:
+        session.close()
+
+
+async def _sequential(bot: FakeBot, sample: int) -> float:
+    """The old job on the first `sample` users; returns seconds per user."""
+    session = get_db_session()
+    try:
+        user_ids = session.query(User.id).all()
+    finally:
+        session.close()
+    started = time.perf_counter()
+    for (user_id,) in user_ids[:sample]:
+        try:
+            await bot.send_message(chat_id=user_id, text="Remember to add your expenses for today!")
+        except Exception:
+            pass
+    return (time.perf_counter() - started) / sample
+
+
+async def _checks(dispatcher: ReminderDispatcher, bot: FakeBot, times: list[datetime.datetime]) -> list[tuple[int, float]]:
+    """Runs the dispatcher at each check time; returns (messages attempted, seconds) per check."""
+    runs = []
+    for now in times:
+        started = time.perf_counter()
+        outcomes = await dispatcher.run(bot, now=now)
+        runs.append((sum(outcomes.values()), time.perf_counter() - started))
+    await dispose_async_engine()
+    return runs
+
+
+def _report(name: str, bot: FakeBot, runs: list[tuple[int, float]], speedup: float, expected: int) -> None:
+    busy = [(count, seconds) for count, seconds in runs if count]
+    total = sum(seconds for _, seconds in busy) * speedup
+    count, longest = max(busy, key=lambda run: run[1]) if busy else (0, 0.0)
+    print(f"{name:>16}: delivered {bot.sent}/{expected} in {total / 60:.1f} min of sending over {len(busy)} check(s), "
+          f"longest check {longest * speedup / 60:.1f} min ({count} users), {bot.retry_after} x RetryAfter")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--logged", type=float, default=0.2, help="Fraction of users who already logged today")
+    parser.add_argument("--blocked", type=float, default=0.01, help="Fraction of users who blocked the bot")
+    parser.add_argument("--latency", type=float, default=0.08, help="Seconds per real send_message call")
+    parser.add_argument("--limit", type=float, default=30, help="Real bot-wide messages per second")
+    parser.add_argument("--rate", type=float, default=25, help="Real dispatcher send rate")
+    parser.add_argument("--speedup", type=float, default=100, help="Clock scaling factor")
+    parser.add_argument("--sample", type=int, default=2000, help="Users timed for the sequential baseline")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    init_db()
+    logged_ids = _create_users(args.users, args.logged)
+    rng = random.Random(11)
+    blocked = {user_id for user_id in range(1, args.users + 1) if rng.random() < args.blocked}
+    expected = args.users - len(logged_ids | blocked)
+    latency = args.latency / args.speedup
+
+    bot = FakeBot(latency, args.limit, args.speedup, blocked)
+    per_user = asyncio.run(_sequential(bot, args.sample)) * args.speedup
+    print(f"{'sequential':>16}: {per_user * 1000:.0f}ms per user, about {per_user * args.users / 3600:.1f} h "
+          f"for {args.users} users in one job (no skipping of users who already logged)")
+
+    evening = datetime.datetime.combine(DAY, datetime.time(20), tzinfo=datetime.timezone.utc)
+    day_of_checks = [evening - datetime.timedelta(hours=12) + datetime.timedelta(minutes=15 * k) for k in range(4 * 24)]
+    variants = [
+        ("unpaced", [None], dict(rate=0), [evening]),
+        ("dispatcher", [None], dict(rate=args.rate * args.speedup), [evening]),
+        ("dispatcher 24tz", ZONES, dict(rate=args.rate * args.speedup), day_of_checks),
+    ]
+    for name, zones, options, times in variants:
+        _assign_timezones(args.users, zones, logged_ids)
+        bot = FakeBot(latency, args.limit, args.speedup, blocked)
+        dispatcher = ReminderDispatcher(default_timezone="UTC", chunk_size=1000, max_retries=100, **options)
+        runs = asyncio.run(_checks(dispatcher, bot, times))
+        _report(name, bot, runs, args.speedup, expected)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Compares blocking sheet writes inside async handlers with the per-spreadsheet write queue.
+
+Usage (from the project root):
+    python -m benchmarks.bench_sheet_queue --users 50 --messages 4 --latency 0.1
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import tempfile
+import time
+import uuid
+
+_DB_DIR = tempfile.mkdtemp(prefix="bench-sheets-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_DB_DIR, 'bench.db')}")
+
+from src import sheets_writer  # noqa: E402
+from src.database import init_db  # noqa: E402
+from src.sheet_queue import SheetWriteQueue  # noqa: E402
+
+from .fake_gspread import FakeBackend, use_backend
+
+
+def _expenses(user_id: int) -> list[dict]:
+    return [{
+        "user_id": user_id,
+        "amount": 12.5,
+        "category": "Food",
+        "description": "benchmark",
+        "timestamp": datetime.datetime.utcnow(),
+        "expense_id": uuid.uuid4().hex
+    }]
+
+
+async def _run_blocking(users: int, messages: int) -> None:
+    async def user_session(user_id: int):
+        for _ in range(messages):
+            sheets_writer.write_expenses_to_sheet(_expenses(user_id), spreadsheet_id=f"sheet-{user_id}")
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(user_session(user_id) for user_id in range(users)))
+
+
+async def _run_queued(users: int, messages: int, workers: int) -> None:
+    queue = SheetWriteQueue(max_workers=workers)
+
+    async def user_session(user_id: int):
+        for _ in range(messages):
+            await queue.submit(
+                f"sheet-{user_id}",
+                sheets_writer.write_expenses_to_sheet,
+                _expenses(user_id),
+                f"sheet-{user_id}"
+            )
+
+    try:
+        await asyncio.gather(*(user_session(user_id) for user_id in range(users)))
+    finally:
+        queue.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.1, help="Seconds per fake Sheets API call")
+    parser.add_argument("--workers", type=int, default=16)
+    args = parser.parse_args()
+
+    init_db()
+    total = args.users * args.messages
+    for name, runner in (
+        ("blocking", lambda: _run_blocking(args.users, args.messages)),
+        ("queued", lambda: _run_queued(args.users, args.messages, args.workers)),
+    ):
+        backend = FakeBackend(latency=args.latency)
+        with use_backend(backend):
+            started = time.perf_counter()
+            asyncio.run(runner())
+            elapsed = time.perf_counter() - started
+        print(f"{name:>9}: {total} writes in {elapsed:.2f}s -> {total / elapsed:.1f} writes/s "
+              f"({backend.total_calls() / total:.1f} API calls/write)")
+
+
+if __name__ == "__main__":
+    main()
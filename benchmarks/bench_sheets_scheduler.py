@@ -0,0 +1,115 @@
+"""
+Drives sheet writes into a fake Sheets API that enforces a per-window call quota.
+
+"unscheduled" sends calls as they come and gives up on the first 429, as the bot
+used to; "backoff" retries 429s with Retry-After and jittered backoff but does not
+pace calls; "scheduled" also paces calls with token buckets sized to the quota.
+Half of the spreadsheets write at background priority (like sync retries), the
+other half at interactive priority, so the latency split shows the prioritization.
+
+Usage (from the project root):
+    python -m benchmarks.bench_sheets_scheduler --sheets 40 --writes 5 --quota 60 --window 5
+"""
+import argparse
+import asyncio
+import datetime
+import logging
+import os
+import statistics
+import tempfile
+import time
+import uuid
+
+_DB_DIR = tempfile.mkdtemp(prefix="bench-scheduler-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_DB_DIR, 'bench.db')}")
+
+from src import sheets_writer  # noqa: E402
+from src.database import init_db  # noqa: E402
+from src.sheet_queue import SheetWriteQueue  # noqa: E402
+from src.sheets_scheduler import SheetsScheduler, BACKGROUND, INTERACTIVE  # noqa: E402
+
+from .fake_gspread import FakeBackend, use_backend  # noqa: E402
+
+
+def _expenses(user_id: int) -> list[dict]:
+    return [{
+        "user_id": user_id,
+        "amount": 12.5,
+        "category": "Food",
+        "description": "benchmark",
+        "timestamp": datetime.datetime.utcnow(),
+        "expense_id": uuid.uuid4().hex
+    }]
+
+
+def _write(scheduler: SheetsScheduler, priority: int, user_id: int) -> bool:
+    with scheduler.priority(priority):
+        try:
+            return sheets_writer.write_expenses_to_sheet(_expenses(user_id), f"sheet-{user_id}")
+        except Exception:
+            return False
+
+
+async def _run(scheduler: SheetsScheduler, args) -> dict[int, list[tuple[float, bool]]]:
+    queue = SheetWriteQueue(max_workers=args.workers)
+    results: dict[int, list[tuple[float, bool]]] = {INTERACTIVE: [], BACKGROUND: []}
+
+    async def sheet_session(user_id: int):
+        priority = BACKGROUND if user_id % 2 else INTERACTIVE
+        for _ in range(args.writes):
+            started = time.perf_counter()
+            ok = await queue.submit(f"sheet-{user_id}", _write, scheduler, priority, user_id)
+            results[priority].append((time.perf_counter() - started, ok))
+
+    try:
+        await asyncio.gather(*(sheet_session(user_id) for user_id in range(args.sheets)))
+    finally:
+        queue.shutdown()
+    return results
+
+
+def _summary(samples: list[tuple[float, bool]]) -> str:
+    latencies = sorted(latency for latency, ok in samples if ok)
+    if not latencies:
+        return "no successful writes"
+    p95 = latencies[max(int(len(latencies) * 0.95) - 1, 0)]
+    return f"p50={statistics.median(latencies):.2f}s p95={p95:.2f}s"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sheets", type=int, default=40)
+    parser.add_argument("--writes", type=int, default=5, help="Writes per spreadsheet")
+    parser.add_argument("--quota", type=int, default=60, help="Calls the fake API accepts per window")
+    parser.add_argument("--window", type=float, default=5.0, help="Quota window in seconds")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds per fake Sheets API call")
+    parser.add_argument("--workers", type=int, default=32)
+    args = parser.parse_args()
+
+    logging.disable(logging.ERROR)
+    init_db()
+    ceiling = args.quota / args.window
+    variants = {
+        "unscheduled": dict(rate=0, spreadsheet_rate=0, max_retries=0),
+        "backoff": dict(rate=0, spreadsheet_rate=0, max_retries=8, backoff_base=0.25, backoff_max=args.window),
+        "scheduled": dict(rate=ceiling, burst=1, spreadsheet_rate=0, max_retries=8,
+                          backoff_base=0.25, backoff_max=args.window),
+    }
+    print(f"quota ceiling: {ceiling:.1f} calls/s")
+    for name, options in variants.items():
+        backend = FakeBackend(latency=args.latency, quota=args.quota, quota_window=args.window)
+        scheduler = SheetsScheduler(**options)
+        with use_backend(backend, scheduler):
+            started = time.perf_counter()
+            results = asyncio.run(_run(scheduler, args))
+            elapsed = time.perf_counter() - started
+
+        written = sum(ok for samples in results.values() for _, ok in samples)
+        total = args.sheets * args.writes
+        print(f"{name:>11}: {written}/{total} writes in {elapsed:.1f}s, "
+              f"{backend.accepted_calls() / elapsed:.1f} accepted calls/s, {backend.throttled} x 429 | "
+              f"interactive {_summary(results[INTERACTIVE])} | background {_summary(results[BACKGROUND])}")
+
+
+if __name__ == "__main__":
+    main()
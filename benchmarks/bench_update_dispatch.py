@@ -0,0 +1,84 @@
+"""
+Measures how update throughput scales with the number of active users.
+
+Synthetic message updates are fed to the update processor the way the Application
+does (one task per update, in arrival order). The handler stands in for the
+expense pipeline with --work seconds of I/O. The total number of updates is fixed
+and spread over 1..N active users, so throughput should grow with active users
+until every worker is busy, while each user's updates stay in order.
+
+"sequential" is one update at a time (the old default); "sharded" is the
+ShardedUpdateProcessor with --workers queues.
+
+Usage (from the project root):
+    python -m benchmarks.bench_update_dispatch --updates 512 --workers 64 --work 0.02
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from telegram import Update
+from telegram.ext import SimpleUpdateProcessor
+
+from src.update_processor import ShardedUpdateProcessor
+
+
+def _update(update_id: int, user_id: int, message_id: int) -> Update:
+    sender = {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+    return Update.de_json({"update_id": update_id, "message": {
+        "message_id": message_id, "date": 0, "from": sender,
+        "chat": {"id": user_id, "type": "private"}, "text": "Lunch $15"
+    }}, None)
+
+
+async def _run(processor, users: int, args) -> tuple[float, int, dict]:
+    last_seen: dict[int, int] = {}
+    active: set[int] = set()
+    violations = 0
+
+    async def handle(update: Update):
+        nonlocal violations
+        user_id, message_id = update.effective_user.id, update.message.message_id
+        if user_id in active or last_seen.get(user_id, 0) > message_id:
+            violations += 1
+        active.add(user_id)
+        last_seen[user_id] = message_id
+        await asyncio.sleep(args.work)
+        active.discard(user_id)
+
+    # Round-robin over users, so each user's messages arrive in message_id order
+    updates = [_update(n, n % users + 1, n // users + 1) for n in range(args.updates)]
+    await processor.initialize()
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        asyncio.create_task(processor.process_update(update, handle(update))) for update in updates
+    ))
+    elapsed = time.perf_counter() - started
+    stats = processor.stats() if hasattr(processor, "stats") else {}
+    await processor.shutdown()
+    return len(updates) / elapsed, violations, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--updates", type=int, default=512)
+    parser.add_argument("--workers", type=int, default=64)
+    parser.add_argument("--queue-size", type=int, default=100)
+    parser.add_argument("--work", type=float, default=0.02, help="Seconds of simulated I/O per update")
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 4, 16, 64, 256])
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    for users in args.users:
+        sequential, _, _ = asyncio.run(_run(SimpleUpdateProcessor(1), users, args))
+        processor = ShardedUpdateProcessor(args.workers, args.queue_size)
+        sharded, violations, stats = asyncio.run(_run(processor, users, args))
+        print(f"{users:>4} active users: sequential {sequential:6.0f} updates/s | sharded {sharded:6.0f} updates/s, "
+              f"{stats['active_shards']} shards used, peak depth {stats['peak_depth']}, "
+              f"wait p50={stats['wait_p50'] * 1000:.0f}ms p95={stats['wait_p95'] * 1000:.0f}ms, "
+              f"ordering violations={violations}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Load-tests the webhook front end by POSTing synthetic Telegram Update payloads.
+
+The real WebhookServer runs under uvicorn on a local port; Bot API calls (getMe and
+the handler's reply) are answered in-process after --api-latency seconds. The
+handler stands in for the expense pipeline: it awaits --work seconds of I/O and
+replies. Each user's messages are delivered in order over up to --connections
+parallel connections (Telegram's max_connections), users interleaved.
+
+"sequential" processes one update at a time, as polling did; "per-user" uses the
+ShardedUpdateProcessor. Ordering violations count updates of one user that were
+handled out of order or overlapped with another of that user's updates.
+
+Usage (from the project root):
+    python -m benchmarks.bench_webhook --users 100 --messages 5 --work 0.05
+"""
+import argparse
+import asyncio
+import json
+import logging
+import socket
+import statistics
+import time
+
+import uvicorn
+from telegram.ext import Application, MessageHandler, SimpleUpdateProcessor, filters
+
+from src.update_processor import ShardedUpdateProcessor
+from src.webhook import WebhookServer, SECRET_TOKEN_HEADER
+
+from .fake_telegram import FakeBotApi
+
+SECRET = "bench-secret"
+
+
+class Recorder:
+    """Handler that simulates the pipeline's I/O and checks per-user ordering."""
+
+    def __init__(self, work: float):
+        self.work = work
+        self.last_seen: dict[int, int] = {}
+        self.active: set[int] = set()
+        self.violations = 0
+        self.done: dict[int, float] = {}
+
+    async def handle(self, update, context) -> None:
+        user_id, message_id = update.effective_user.id, update.message.message_id
+        if user_id in self.active or self.last_seen.get(user_id, 0) > message_id:
+            self.violations += 1
+        self.active.add(user_id)
+        self.last_seen[user_id] = message_id
+        try:
+            await asyncio.sleep(self.work)
+            await update.message.reply_text("✅ Added 1 expense(s)")
+        finally:
+            self.active.discard(user_id)
+            self.done[update.update_id] = time.perf_counter()
+
+
+def _payload(update_id: int, user_id: int, message_id: int) -> dict:
+    sender = {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+    return {"update_id": update_id, "message": {
+        "message_id": message_id, "date": int(time.time()), "from": sender,
+        "chat": {"id": user_id, "type": "private"}, "text": "Lunch $15"
+    }}
+
+
+async def _post(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, payload: dict) -> int:
+    """POSTs one update over a kept-alive HTTP/1.1 connection; returns the status code."""
+    body = json.dumps(payload).encode()
+    writer.write(
+        f"POST /telegram HTTP/1.1\r\nHost: bench\r\nContent-Type: application/json\r\n"
+        f"{SECRET_TOKEN_HEADER}: {SECRET}\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+    head = (await reader.readuntil(b"\r\n\r\n")).decode()
+    length = next((int(line.split(":", 1)[1]) for line in head.split("\r\n")
+                   if line.lower().startswith("content-length:")), 0)
+    if length:
+        await reader.readexactly(length)
+    return int(head.split(" ", 2)[1])
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _run(processor, args) -> dict:
+    recorder = Recorder(args.work)
+    application = (
+        Application.builder().token("1:bench").request(FakeBotApi(args.api_latency))
+        .updater(None).concurrent_updates(processor).build()
+    )
+    application.add_handler(MessageHandler(filters.TEXT, recorder.handle))
+    server = WebhookServer(application, path="telegram", secret_token=SECRET,
+                           max_pending=args.max_pending, admit_timeout=args.admit_timeout)
+    port = _free_port()
+    webserver = uvicorn.Server(uvicorn.Config(server.app, host="127.0.0.1", port=port, log_level="error"))
+
+    await application.initialize()
+    await application.start()
+    serving = asyncio.create_task(webserver.serve())
+    while not webserver.started:
+        await asyncio.sleep(0.01)
+
+    sent: dict[int, float] = {}
+    statuses: dict[int, int] = {}
+    pending: asyncio.Queue = asyncio.Queue()
+    for user_id in range(1, args.users + 1):
+        pending.put_nowait((user_id, 1))
+    total = args.users * args.messages
+
+    async def connection():
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            while (item := await pending.get()) is not None:
+                user_id, message_id = item
+                update_id = user_id * args.messages + message_id
+                sent.setdefault(update_id, time.perf_counter())
+                status = await _post(reader, writer, _payload(update_id, user_id, message_id))
+                statuses[status] = statuses.get(status, 0) + 1
+                if status != 200:
+                    pending.put_nowait(item)  # Telegram redelivers updates that were not acknowledged
+                elif message_id < args.messages:
+                    pending.put_nowait((user_id, message_id + 1))
+                if statuses.get(200, 0) == total:
+                    for _ in range(args.connections):
+                        pending.put_nowait(None)  # Everything was delivered: stop all connections
+        finally:
+            writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(connection() for _ in range(args.connections)))
+    delivered = time.perf_counter() - started
+    while len(recorder.done) < statuses.get(200, 0):
+        await asyncio.sleep(0.01)
+    processed = time.perf_counter() - started
+
+    webserver.should_exit = True
+    await serving
+    await application.stop()
+    await application.shutdown()
+
+    latencies = sorted(recorder.done[update_id] - sent[update_id] for update_id in recorder.done)
+    return {
+        "delivered_per_s": len(sent) / delivered,
+        "processed_per_s": len(recorder.done) / processed,
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+        "violations": recorder.violations,
+        "statuses": statuses
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--messages", type=int, default=5, help="Messages per user")
+    parser.add_argument("--connections", type=int, default=40, help="Parallel webhook deliveries")
+    parser.add_argument("--work", type=float, default=0.05, help="Seconds of simulated I/O per update")
+    parser.add_argument("--api-latency", type=float, default=0.03, help="Seconds per Bot API call")
+    parser.add_argument("--concurrency", type=int, default=64, help="Update workers (CONCURRENT_UPDATES) for per-user")
+    parser.add_argument("--max-pending", type=int, default=1000)
+    parser.add_argument("--admit-timeout", type=float, default=5.0)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    variants = {
+        "sequential": lambda: SimpleUpdateProcessor(1),
+        "per-user": lambda: ShardedUpdateProcessor(args.concurrency),
+    }
+    for name, processor in variants.items():
+        result = asyncio.run(_run(processor(), args))
+        print(f"{name:>10}: delivered {result['delivered_per_s']:.0f} updates/s, "
+              f"processed {result['processed_per_s']:.0f} updates/s, "
+              f"update->reply p50={result['p50'] * 1000:.0f}ms p95={result['p95'] * 1000:.0f}ms, "
+              f"ordering violations={result['violations']}, HTTP {result['statuses']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# Labelled sample of user messages: (text, [(amount, category), ...])
+EXPENSE_CORPUS = [
+    ("Lunch $15", [(15.0, "Food")]),
+    ("taxi 12.5", [(12.5, "Transport")]),
+    ("coffee 3,50€", [(3.5, "Food")]),
+    ("Coffee 4", [(4.0, "Food")]),
+    ("dinner 42.80 yesterday", [(42.8, "Food")]),
+    ("uber 18", [(18.0, "Transport")]),
+    ("bus ticket 2", [(2.0, "Transport")]),
+    ("Groceries 63.20", [(63.2, "Groceries")]),
+    ("supermarket 87", [(87.0, "Groceries")]),
+    ("Rent 1,200.00", [(1200.0, "Rent/Mortgage")]),
+    ("mortgage 950", [(950.0, "Rent/Mortgage")]),
+    ("Netflix 15.99", [(15.99, "Subscriptions")]),
+    ("spotify subscription 9.99", [(9.99, "Subscriptions")]),
+    ("electricity bill 74", [(74.0, "Utilities")]),
+    ("internet 30", [(30.0, "Utilities")]),
+    ("phone 25 usd", [(25.0, "Utilities")]),
+    ("cinema 12", [(12.0, "Entertainment")]),
+    ("concert tickets 80", [(80.0, "Entertainment")]),
+    ("beer with friends 24", [(24.0, "Entertainment")]),
+    ("pharmacy 17.40", [(17.4, "Health")]),
+    ("dentist 120", [(120.0, "Health")]),
+    ("gym membership 45", [(45.0, "Health")]),
+    ("new shoes 89.99", [(89.99, "Shopping")]),
+    ("clothes 120 2024-05-01", [(120.0, "Shopping")]),
+    ("amazon order 34.50", [(34.5, "Shopping")]),
+    ("breakfast 8 today", [(8.0, "Food")]),
+    ("pizza 22$", [(22.0, "Food")]),
+    ("€9 sushi", [(9.0, "Food")]),
+    ("paid 40 for fuel", [(40.0, "Transport")]),
+    ("spent 13 on lunch", [(13.0, "Food")]),
+    ("parking 6 2 days ago", [(6.0, "Transport")]),
+    ("milk and bread 5", [(5.0, "Groceries")]),
+    ("train to Lviv 420 uah", [(420.0, "Transport")]),
+    ("vitamins 19", [(19.0, "Health")]),
+    ("water bill 21.30", [(21.3, "Utilities")]),
+    ("youtube premium 11.99", [(11.99, "Subscriptions")]),
+    ("gift for mom 50", [(50.0, "Shopping")]),
+    ("museum 15", [(15.0, "Entertainment")]),
+    ("tea 2.5", [(2.5, "Food")]),
+    ("flight to Berlin 180", [(180.0, "Transport")]),
+    # Messages the rule-based parser should hand over to the LLM
+    ("lunch 15 and taxi 12", [(15.0, "Food"), (12.0, "Transport")]),
+    ("coffee 4; groceries 32", [(4.0, "Food"), (32.0, "Groceries")]),
+    ("haircut 25", [(25.0, "Other")]),
+    ("paid the plumber 90", [(90.0, "Other")]),
+    ("birthday present for my sister from the mall 60", [(60.0, "Shopping")]),
+    ("2 coffees 7", [(7.0, "Food")]),
+    ("vet visit for the dog 75", [(75.0, "Health")]),
+    ("Lunch 12, dinner 30", [(12.0, "Food"), (30.0, "Food")]),
+    ("books 40", [(40.0, "Shopping")]),
+    ("donation 10", [(10.0, "Other")]),
+]
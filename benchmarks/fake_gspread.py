@@ -0,0 +1,190 @@
+import contextlib
+import json
+import math
+import threading
+import time
+from collections import Counter
+from unittest import mock
+
+from gspread.exceptions import APIError, SpreadsheetNotFound, WorksheetNotFound
+
+
+@contextlib.contextmanager
+def use_backend(backend: "FakeBackend", scheduler=None):
+    """
+    Points sheets_writer at the fake backend with a fresh handle cache.
+
+    Calls go through `scheduler`, by default one that retries but does not pace, so
+    benchmarks measure the code under test rather than the production quota.
+    """
+    from src import sheet_stats, sheets_writer
+    from src.sheets_scheduler import SheetsScheduler
+
+    scheduler = scheduler or SheetsScheduler(rate=0, spreadsheet_rate=0)
+    sheets_writer._handle_cache.clear()  # Handles from a previous run point at its backend
+    with mock.patch.object(sheets_writer, "_get_gspread_client", backend.client), \
+            mock.patch.object(sheets_writer, "sheets_scheduler", scheduler), \
+            mock.patch.object(sheet_stats, "sheets_scheduler", scheduler):
+        yield
+
+
+class _FakeResponse:
+    """Just enough of requests.Response for gspread's APIError."""
+
+    def __init__(self, status_code: int, message: str, headers: dict = None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = json.dumps({"error": {"code": status_code, "message": message, "status": "RESOURCE_EXHAUSTED"}})
+
+    def json(self) -> dict:
+        return json.loads(self.text)
+
+
+class FakeBackend:
+    """
+    In-memory stand-in for the Google Sheets API that records calls and injects latency.
+
+    With quota set, at most that many calls are accepted per quota_window seconds;
+    further calls are rejected with a 429 APIError carrying a Retry-After header, as
+    Google does when the service account's per-minute quota is exhausted.
+    """
+
+    def __init__(self, latency: float = 0.1, quota: int = 0, quota_window: float = 60.0):
+        self.latency = latency
+        self.outage = False  # While True every call fails after its latency, like an unreachable API
+        self.quota = quota
+        self.quota_window = quota_window
+        self.calls = Counter()
+        self.throttled = 0
+        self.spreadsheets: dict[str, "FakeSpreadsheet"] = {}
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._window_calls = 0
+
+    def api_call(self, name: str) -> None:
+        with self._lock:
+            self.calls[name] += 1
+            retry_after = self._check_quota()
+        if self.latency:
+            time.sleep(self.latency)
+        if retry_after is not None:
+            raise APIError(_FakeResponse(429, f"Quota exceeded during {name}", {"Retry-After": str(retry_after)}))
+        if self.outage:
+            raise ConnectionError(f"fake Sheets outage during {name}")
+
+    def _check_quota(self) -> int | None:
+        """Counts a call against the quota; returns Retry-After seconds if it is rejected."""
+        if not self.quota:
+            return None
+        now = time.monotonic()
+        if now - self._window_start >= self.quota_window:
+            self._window_start, self._window_calls = now, 0
+        if self._window_calls >= self.quota:
+            self.throttled += 1
+            return max(1, math.ceil(self._window_start + self.quota_window - now))
+        self._window_calls += 1
+        return None
+
+    def accepted_calls(self) -> int:
+        return self.total_calls() - self.throttled
+
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    def client(self) -> "FakeClient":
+        return FakeClient(self)
+
+
+class FakeClient:
+    def __init__(self, backend: FakeBackend):
+        self.backend = backend
+
+    def open_by_key(self, key: str) -> "FakeSpreadsheet":
+        self.backend.api_call("open_by_key")
+        with self.backend._lock:
+            if key.startswith("missing"):
+                raise SpreadsheetNotFound(key)
+            if key not in self.backend.spreadsheets:
+                self.backend.spreadsheets[key] = FakeSpreadsheet(self.backend, key)
+            return self.backend.spreadsheets[key]
+
+
+class FakeSpreadsheet:
+    def __init__(self, backend: FakeBackend, key: str):
+        self.backend = backend
+        self.id = key
+        self.worksheets: dict[str, "FakeWorksheet"] = {}
+
+    def worksheet(self, title: str) -> "FakeWorksheet":
+        self.backend.api_call("worksheet")
+        if title not in self.worksheets:
+            raise WorksheetNotFound(title)
+        return self.worksheets[title]
+
+    def values_batch_get(self, ranges: list, params: dict = None) -> dict:
+        self.backend.api_call("values_batch_get")
+        value_ranges = []
+        for range_name in ranges:
+            title, _, cells = range_name.partition("!")
+            worksheet = self.worksheets.get(title.strip("'"))
+            values = worksheet.formula_values(cells) if worksheet else []
+            value_ranges.append({"range": range_name, "values": values})
+        return {"valueRanges": value_ranges}
+
+    def add_worksheet(self, title: str, rows, cols) -> "FakeWorksheet":
+        self.backend.api_call("add_worksheet")
+        worksheet = self.worksheets[title] = FakeWorksheet(self.backend, title, self.id)
+        return worksheet
+
+
+class FakeWorksheet:
+    def __init__(self, backend: FakeBackend, title: str, spreadsheet_id: str = ""):
+        self.backend = backend
+        self.title = title
+        self.spreadsheet_id = spreadsheet_id
+        self.rows: list[list] = []
+        self.blocks: dict[str, list[list]] = {}  # Values written with update() by range, e.g. the stats block
+
+    def row_values(self, row: int) -> list:
+        self.backend.api_call("row_values")
+        return list(self.rows[row - 1]) if len(self.rows) >= row else []
+
+    def append_row(self, values: list, **kwargs) -> None:
+        self.backend.api_call("append_row")
+        self.rows.append(list(values))
+
+    def insert_row(self, values: list, index: int = 1, **kwargs) -> None:
+        self.backend.api_call("insert_row")
+        self.rows.insert(index - 1, list(values))
+
+    def append_rows(self, values: list, **kwargs) -> None:
+        self.backend.api_call("append_rows")
+        self.rows.extend(list(row) for row in values)
+
+    def update(self, range_name: str = None, values: list = None, **kwargs) -> dict:
+        self.backend.api_call("update")
+        if range_name.startswith("A1:"):
+            if self.rows:
+                self.rows[0] = list(values[0])
+            else:
+                self.rows.append(list(values[0]))
+            return {}
+        self.blocks[range_name] = [list(row) for row in values]
+        return {}
+
+    def batch_clear(self, ranges: list) -> dict:
+        self.backend.api_call("batch_clear")
+        for range_name in ranges:
+            self.blocks.pop(range_name, None)
+        return {}
+
+    def get(self, range_name: str, **kwargs) -> list:
+        self.backend.api_call("get")
+        if range_name.startswith("F"):
+            return [[row[5]] for row in self.rows[1:] if len(row) > 5]
+        return [[row[1], row[2]] for row in self.rows[1:] if len(row) > 2]
+
+    def formula_values(self, cells: str) -> list:
+        if cells.startswith("A1"):
+            return [list(self.rows[0])] if self.rows else []
+        return [list(row) for row in self.blocks.get(cells, [])]
@@ -0,0 +1,149 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+DEFAULT_CONTENT = json.dumps([
+    {"amount": 15, "category": "Food", "description": "Lunch", "date": None}
+])
+
+
+class FakeOpenRouter:
+    """
+    Local stand-in for the OpenRouter chat completions endpoint.
+
+    latency is added to every request; handshake_latency is added once per new
+    connection to model the TCP+TLS setup a pooled client avoids. upload_bytes_per_second,
+    if set, adds the time a request body of that size would take to upload. Requests
+    with "stream": true are answered as SSE, stream_chunk_chars characters per event.
+
+    model_latencies maps a model name to a function returning the latency of one
+    request to it (e.g. a random draw from a heavy-tailed distribution), replacing
+    latency for that model; model_error_rates maps a model to the share of its
+    requests answered with HTTP 503.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        handshake_latency: float = 0.0,
+        content: str = DEFAULT_CONTENT,
+        upload_bytes_per_second: float = 0.0,
+        stream_chunk_chars: int = 8,
+        stream_chunk_delay: float = 0.0,
+        model_latencies: dict[str, Callable[[], float]] | None = None,
+        model_error_rates: dict[str, float] | None = None,
+        seed: int = 1
+    ):
+        self.latency = latency
+        self.handshake_latency = handshake_latency
+        self.upload_bytes_per_second = upload_bytes_per_second
+        self.bytes_received = 0
+        self.stream_chunk_chars = stream_chunk_chars
+        self.stream_chunk_delay = stream_chunk_delay
+        self.content = content
+        self.model_latencies = model_latencies or {}
+        self.model_error_rates = model_error_rates or {}
+        self.requests = 0
+        self.requests_by_model: dict[str, int] = {}
+        self._random = random.Random(seed)
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/api/v1/chat/completions"
+
+    def respond(self, payload: dict) -> tuple[int, dict]:
+        """Returns (status, body) for a request; override for custom behaviour."""
+        return 200, {
+            "choices": [{"message": {"content": self.content}}],
+            "usage": {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120}
+        }
+
+    def _plan(self, payload: dict, length: int) -> tuple[float, bool]:
+        """(delay, fail) for a request: its model's latency and whether it gets a 503."""
+        model = payload.get("model")
+        with self._lock:
+            self.requests += 1
+            self.bytes_received += length
+            self.requests_by_model[model] = self.requests_by_model.get(model, 0) + 1
+            fail = self._random.random() < self.model_error_rates.get(model, 0.0)
+        latency = self.model_latencies[model]() if model in self.model_latencies else self.latency
+        if self.upload_bytes_per_second:
+            latency += length / self.upload_bytes_per_second
+        return latency, fail
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with fake._lock:
+                    fake.connections += 1
+                if fake.handshake_latency:
+                    time.sleep(fake.handshake_latency)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                delay, fail = fake._plan(payload, length)
+                if delay:
+                    time.sleep(delay)
+                if fail:
+                    status, body = 503, {"error": {"code": 503, "message": "Provider unavailable"}}
+                elif payload.get("stream"):
+                    self._stream(payload)
+                    return
+                else:
+                    status, body = fake.respond(payload)
+                data = json.dumps(body).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True  # The client cancelled the request, e.g. a losing hedge
+
+            def _stream(self, payload):
+                """Sends the completion as SSE events, a few characters per event."""
+                status, body = fake.respond(payload)
+                content = body.get("choices", [{}])[0].get("message", {}).get("content", "")
+                self.send_response(status)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.wfile.write(b": OPENROUTER PROCESSING\n\n")
+                for start in range(0, len(content), fake.stream_chunk_chars):
+                    event = {"choices": [{"delta": {"content": content[start:start + fake.stream_chunk_chars]}}]}
+                    self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+                    self.wfile.flush()
+                    if fake.stream_chunk_delay:
+                        time.sleep(fake.stream_chunk_delay)
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self) -> "FakeOpenRouter":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._server.shutdown()
+        self._server.server_close()
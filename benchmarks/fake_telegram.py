@@ -0,0 +1,65 @@
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter
+
+from telegram.request import BaseRequest
+
+FILE_PATH = "photos/receipt.jpg"
+
+
+class FakeBotApi(BaseRequest):
+    """
+    Answers Bot API calls in-process after a fixed latency, for Application.builder().request().
+
+    Sent and edited messages get increasing message_ids; getFile points at a file
+    whose download returns file_bytes. Every call is counted by method, and
+    on_message(method, params, message_id) is called for sendMessage and
+    editMessageText so benchmarks can timestamp replies.
+    """
+
+    def __init__(self, latency: float = 0.0, file_bytes: bytes = b"", on_message=None):
+        self.latency = latency
+        self.file_bytes = file_bytes
+        self.on_message = on_message
+        self.calls = Counter()
+        self._message_ids = itertools.count(1)
+
+    @property
+    def read_timeout(self) -> float:
+        return 5.0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    async def do_request(self, url: str, method: str, request_data=None, **kwargs) -> tuple[int, bytes]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if "/file/bot" in url:
+            self.calls["download"] += 1
+            return 200, self.file_bytes
+
+        endpoint = url.rsplit("/", 1)[-1]
+        self.calls[endpoint] += 1
+        params = request_data.parameters if request_data else {}
+        if endpoint == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+        elif endpoint in ("sendMessage", "editMessageText"):
+            message_id = int(params.get("message_id") or next(self._message_ids))
+            result = {"message_id": message_id, "date": int(time.time()), "text": params.get("text", ""),
+                      "chat": {"id": int(params.get("chat_id", 0)), "type": "private"}}
+            if self.on_message:
+                self.on_message(endpoint, params, message_id)
+        elif endpoint == "getFile":
+            result = {"file_id": params.get("file_id", ""), "file_unique_id": "receipt",
+                      "file_size": len(self.file_bytes), "file_path": FILE_PATH}
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
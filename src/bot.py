@@ -1,10 +1,27 @@
+import asyncio
 import logging
+import time
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
-from datetime import time
 
 from . import config
-from .handlers import start, handle_message, error_handler, set_spreadsheet_id
-from .database import init_db, get_db_session, User
+from .handlers import (
+    start, handle_message, error_handler, set_spreadsheet_id, set_monthly_limit, show_monthly_stats, set_timezone,
+    set_category_mapping, import_statement_command, handle_import_document
+)
+from .database import init_db, dispose_async_engine
+from .sheet_queue import sheet_write_queue
+from .expense_sync import expense_syncer
+from .sheets_scheduler import sheets_scheduler
+from .llm_parser import start_http_client, close_http_client
+from .llm_cache import response_cache
+from .llm_router import llm_router
+from .user_cache import user_cache, PROFILE_CACHE
+from .categories import category_index, CATEGORY_MAPPINGS_CACHE
+from .coordination import leader_lease, invalidation_bus, worker_id
+from .reminders import reminder_dispatcher
+from .importer import statement_importer
+from .update_processor import ShardedUpdateProcessor
+from . import metrics
 
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
@@ -13,23 +30,53 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 async def send_daily_reminder(context: ContextTypes.DEFAULT_TYPE):
-    """Send daily expense reminder to all registered users."""
+    """Send the daily expense reminder to users whose local reminder time has come."""
+    if not leader_lease.is_leader:
+        return  # Another worker process sends the reminders
     try:
-        session = get_db_session()
-        try:
-            user_ids = session.query(User.id).all()
-            for (user_id,) in user_ids:
-                try:
-                    await context.bot.send_message(
-                        chat_id=user_id,
-                        text="Remember to add your expenses for today!"
-                    )
-                except Exception as e:
-                    logger.error(f"Failed to send reminder to user {user_id}: {e}")
-        finally:
-            session.close()
+        await reminder_dispatcher.run(context.bot)
     except Exception as e:
-        logger.error(f"Error in daily reminder job: {e}")
+        logger.error(f"Error in daily reminder job: {e}", exc_info=True)
+
+async def _on_startup(application: Application) -> None:
+    """Create resources shared across updates."""
+    await start_http_client()
+    for name, stats in (
+        ("llm_cache", response_cache.stats), ("user_cache", user_cache.stats), ("expense_sync", expense_syncer.stats),
+        ("sheets", sheets_scheduler.stats), ("reminders", reminder_dispatcher.stats),
+        ("updates", application.update_processor.stats), ("leader", leader_lease.stats),
+        ("categories", category_index.stats), ("llm_router", llm_router.stats),
+        ("imports", statement_importer.stats),
+    ):
+        metrics.register_stats(name, stats)
+    await metrics.metrics_server.start()
+    await leader_lease.start()
+    invalidation_bus.subscribe(PROFILE_CACHE, lambda user_id: user_cache.invalidate(int(user_id)))
+    invalidation_bus.subscribe(CATEGORY_MAPPINGS_CACHE, lambda user_id: category_index.forget_user(int(user_id)))
+    await invalidation_bus.start()
+    expense_syncer.start()
+
+async def _on_shutdown(application: Application) -> None:
+    """Release resources held across updates."""
+    await close_http_client()
+    await metrics.metrics_server.stop()
+    await expense_syncer.stop()
+    await invalidation_bus.stop()
+    await leader_lease.stop()
+    sheet_write_queue.shutdown()
+    await dispose_async_engine()
+    logger.info(f"LLM response cache stats: {response_cache.stats()}")
+    logger.info(f"User profile cache stats: {user_cache.stats()}")
+    logger.info(f"Expense syncer stats: {expense_syncer.stats()}")
+    logger.info(f"Sheets scheduler stats: {sheets_scheduler.stats()}")
+    logger.info(f"Reminder stats: {reminder_dispatcher.stats()}")
+    logger.info(f"Category index stats: {category_index.stats()}")
+    logger.info(f"LLM router stats: {llm_router.stats()}, per model: {llm_router.model_stats()}")
+    logger.info(f"Import stats: {statement_importer.stats()}")
+    logger.info(f"Update processor stats: {application.update_processor.stats()}")
+    if config.MULTI_WORKER:
+        logger.info(f"Worker {worker_id} lease stats: {leader_lease.stats()}, "
+                    f"invalidation stats: {invalidation_bus.stats()}")
 
 def main():
     """Start the Telegram Expense Tracker bot."""
@@ -39,28 +86,59 @@ def main():
 
     init_db()
 
-    # Create the Telegram application
-    application = Application.builder().token(config.TELEGRAM_BOT_TOKEN).build()
+    if config.BOT_MODE not in ("polling", "webhook"):
+        print(f"ERROR: BOT_MODE must be 'polling' or 'webhook', got '{config.BOT_MODE}'")
+        return
+    if config.MULTI_WORKER and config.BOT_MODE != "webhook":
+        # Telegram hands getUpdates to one poller at a time; the others would get 409 Conflict
+        print("ERROR: MULTI_WORKER requires BOT_MODE=webhook")
+        return
+
+    # Create the Telegram application; updates of different users are processed concurrently
+    builder = (
+        Application.builder()
+        .token(config.TELEGRAM_BOT_TOKEN)
+        .concurrent_updates(ShardedUpdateProcessor())
+        .post_init(_on_startup)
+        .post_shutdown(_on_shutdown)
+    )
+    if config.BOT_MODE == "webhook":
+        builder = builder.updater(None)  # Updates arrive through the webhook server instead
+    application = builder.build()
 
     # Register command and message handlers
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("setsheet", set_spreadsheet_id))
+    application.add_handler(CommandHandler("limit", set_monthly_limit))
+    application.add_handler(CommandHandler("stats", show_monthly_stats))
+    application.add_handler(CommandHandler("timezone", set_timezone))
+    application.add_handler(CommandHandler("category", set_category_mapping))
+    application.add_handler(CommandHandler("import", import_statement_command))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
     application.add_handler(MessageHandler(filters.PHOTO, handle_message))
+    application.add_handler(MessageHandler(filters.Document.ALL, handle_import_document))
 
     # Register error handler
     application.add_error_handler(error_handler)
 
-    # Schedule daily reminder using application's job queue
+    # Check for timezones whose reminder is due every REMINDER_CHECK_INTERVAL seconds,
+    # aligned to the clock so a 20:00 reminder goes out at 20:00
     job_queue = application.job_queue
-    job_queue.run_daily(
+    interval = config.REMINDER_CHECK_INTERVAL
+    job_queue.run_repeating(
         send_daily_reminder,
-        time=time(hour=20, minute=0, second=0),
-        job_kwargs={'misfire_grace_time': 15*60}
+        interval=interval,
+        first=interval - time.time() % interval,
+        job_kwargs={'misfire_grace_time': interval, 'coalesce': True}
     )
 
-    logger.info("Starting bot polling...")
-    application.run_polling()
+    if config.BOT_MODE == "webhook":
+        from .webhook import serve_webhook  # Needs starlette and uvicorn
+        logger.info("Starting bot in webhook mode...")
+        asyncio.run(serve_webhook(application))
+    else:
+        logger.info("Starting bot polling...")
+        application.run_polling()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
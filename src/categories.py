@@ -0,0 +1,319 @@
+import difflib
+import logging
+import re
+from collections import OrderedDict
+
+from sqlalchemy import select
+
+from .config import EXPENSE_CATEGORIES, CATEGORY_FUZZY_CUTOFF, CATEGORY_FUZZY_MAX_LENGTH, USER_CACHE_MAX_ENTRIES
+from .database import CategoryMapping, get_async_db_session
+
+logger = logging.getLogger(__name__)
+
+OTHER = "Other"
+
+# Invalidation channel other worker processes publish /category changes on
+CATEGORY_MAPPINGS_CACHE = "category_mappings"
+
+# Synonym -> category, for words in messages and for labels the LLM invents ("Dining",
+# "Transportation"); category names themselves match too
+CATEGORY_SYNONYMS = {
+    "Food": [
+        "lunch", "dinner", "breakfast", "brunch", "coffee", "cafe", "restaurant", "pizza", "burger",
+        "sushi", "snack", "snacks", "food", "meal", "tea", "bakery", "takeaway", "mcdonalds", "kfc",
+        "dining", "eating out", "restaurants", "food and drink", "food and drinks", "starbucks",
+        "latte", "cappuccino", "kebab", "canteen",
+    ],
+    "Transport": [
+        "taxi", "uber", "bolt", "lyft", "bus", "metro", "subway", "train", "tram", "fuel", "gas",
+        "petrol", "parking", "ticket", "flight", "transport", "transportation", "travel", "commute",
+        "car", "toll", "diesel", "railway", "airfare",
+    ],
+    "Utilities": [
+        "electricity", "water", "internet", "phone", "mobile", "utilities", "heating", "wifi", "bills",
+        "utility", "energy",
+    ],
+    "Entertainment": [
+        "cinema", "movie", "movies", "concert", "theatre", "theater", "bar", "beer", "drinks",
+        "games", "game", "museum", "entertainment", "leisure", "hobby", "hobbies", "party",
+    ],
+    "Shopping": [
+        "clothes", "shoes", "shopping", "amazon", "gift", "gifts", "electronics", "furniture",
+        "clothing", "apparel", "household",
+    ],
+    "Health": [
+        "pharmacy", "medicine", "doctor", "dentist", "gym", "vitamins", "health", "hospital",
+        "healthcare", "medical", "fitness", "drugstore", "personal care",
+    ],
+    "Groceries": [
+        "groceries", "grocery", "supermarket", "market", "milk", "bread", "vegetables", "fruits",
+        "fruit", "eggs",
+    ],
+    "Rent/Mortgage": ["rent", "mortgage", "housing", "rent mortgage"],
+    "Subscriptions": [
+        "netflix", "spotify", "youtube", "subscription", "subscriptions", "icloud", "patreon",
+        "streaming", "membership",
+    ],
+}
+
+_TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+_FUZZY_CACHE_SIZE = 4096
+MAX_TERMS_PER_USER = 200
+MAX_TERM_LENGTH = 64
+
+
+def normalize_term(text: str) -> str:
+    """Case-folds text and collapses punctuation and whitespace: "Rent / Mortgage" -> "rent mortgage"."""
+    return " ".join(_TOKEN_RE.findall(text.casefold()))
+
+
+class _LearnedTerms:
+    """A user's mappings, split into single words (dict lookups) and phrases (substring checks)."""
+
+    __slots__ = ("words", "phrases")
+
+    def __init__(self, mappings: dict[str, str]):
+        self.words = {term: category for term, category in mappings.items() if " " not in term}
+        self.phrases = tuple((term, category) for term, category in mappings.items() if " " in term)
+
+    def __bool__(self) -> bool:
+        return bool(self.words or self.phrases)
+
+    def as_dict(self) -> dict[str, str]:
+        return {**self.words, **dict(self.phrases)}
+
+
+class CategoryIndex:
+    """
+    Maps free-form category labels and expense words to the configured categories.
+
+    Category names and the synonym table are normalized into one dict when the index
+    is built, so the common cases are dict lookups. resolve() tries, in order: the
+    user's own mappings (taught with /category), the whole label, each word of the
+    label, a fuzzy match of the label (for typos such as "Helth"; bounded by length
+    and memoized) and the words of the expense description. Only when all of them
+    miss does an expense land in "Other".
+
+    Learned mappings live in the database and are kept in memory for up to
+    max_users users; load_user() reads a user's mappings on first use.
+    """
+
+    def __init__(
+        self,
+        categories: list[str] = EXPENSE_CATEGORIES,
+        synonyms: dict[str, list[str]] = CATEGORY_SYNONYMS,
+        fuzzy_cutoff: float = CATEGORY_FUZZY_CUTOFF,
+        fuzzy_max_length: int = CATEGORY_FUZZY_MAX_LENGTH,
+        max_users: int = USER_CACHE_MAX_ENTRIES
+    ):
+        self._names = {normalize_term(category): category for category in categories}
+        self._index = dict(self._names)
+        for category, terms in synonyms.items():
+            for term in terms:
+                self._index.setdefault(normalize_term(term), category)
+        self._fuzzy_candidates = list(self._index)
+        # Spellings labels arrive in verbatim ("Food", "food", "Transportation"), checked before normalizing
+        self._labels = {}
+        for key, category in self._index.items():
+            for spelling in (key, key.capitalize(), key.title()):
+                self._labels.setdefault(spelling, category)
+        self._labels.update({category: category for category in categories})
+        self._fuzzy_cutoff = fuzzy_cutoff
+        self._fuzzy_max_length = fuzzy_max_length
+        self._fuzzy_cache: dict[str, str | None] = {}
+        self._max_users = max_users
+        self._learned: OrderedDict[int, _LearnedTerms] = OrderedDict()
+        self._counters = {
+            "learned": 0, "exact": 0, "word": 0, "fuzzy": 0, "description": 0, "other": 0,
+            "fuzzy_computed": 0, "user_loads": 0,
+        }
+
+    def _lookup(self, key: str) -> str | None:
+        """Exact match of a normalized term, also trying it without a plural "s"."""
+        category = self._index.get(key)
+        if category is None and len(key) > 3 and key.endswith("s"):
+            category = self._index.get(key[:-1])
+        return category
+
+    def _match_words(self, key: str) -> str | None:
+        for word in key.split():
+            category = self._lookup(word)
+            if category:
+                return category
+        return None
+
+    def _fuzzy(self, key: str) -> str | None:
+        if not self._fuzzy_cutoff or len(key) > self._fuzzy_max_length:
+            return None
+        try:
+            return self._fuzzy_cache[key]
+        except KeyError:
+            pass
+        matches = difflib.get_close_matches(key, self._fuzzy_candidates, n=1, cutoff=self._fuzzy_cutoff)
+        category = self._index[matches[0]] if matches else None
+        if len(self._fuzzy_cache) >= _FUZZY_CACHE_SIZE:
+            self._fuzzy_cache.clear()
+        self._fuzzy_cache[key] = category
+        self._counters["fuzzy_computed"] += 1
+        return category
+
+    @staticmethod
+    def _match_learned(learned: "_LearnedTerms", keys: tuple) -> str | None:
+        """The user's mapping for a word or a phrase within one of the normalized keys."""
+        for key in keys:
+            if not key:
+                continue
+            for word in key.split():
+                category = learned.words.get(word)
+                if category:
+                    return category
+            if learned.phrases:
+                padded = f" {key} "
+                for phrase, category in learned.phrases:
+                    if f" {phrase} " in padded:
+                        return category
+        return None
+
+    def lookup_word(self, word: str, user_id: int | None = None) -> str | None:
+        """Category of a single message word (letters only, no fuzzy matching), for the rule-based parser."""
+        key = word.casefold()
+        learned = self._learned.get(user_id) if user_id is not None else None
+        if learned:
+            category = learned.words.get(key)
+            if category:
+                return category
+        return self._lookup(key)
+
+    def resolve(self, label, user_id: int | None = None, description=None) -> str:
+        """
+        Maps an expense's category label to one of the configured categories.
+
+        Args:
+            label: The category the parser or the LLM produced; may be missing or invalid.
+            user_id: Telegram user ID whose learned mappings apply.
+            description: The expense description, used when the label does not decide.
+
+        Returns:
+            A configured category name, "Other" when nothing matches.
+        """
+        learned = self._learned.get(user_id) if user_id is not None else None
+        if learned:
+            category = self._match_learned(learned, (
+                normalize_term(description) if isinstance(description, str) else "",
+                normalize_term(label) if isinstance(label, str) else "",
+            ))
+            if category:
+                self._counters["learned"] += 1
+                return category
+
+        if isinstance(label, str):
+            # Labels usually arrive spelt like a category name or a synonym: one dict lookup
+            category = self._labels.get(label)
+            if category and category != OTHER:
+                self._counters["exact"] += 1
+                return category
+            key = normalize_term(label) if category is None else ""
+            if key:
+                category = self._lookup(key)
+                if category and category != OTHER:
+                    self._counters["exact"] += 1
+                    return category
+                category = self._match_words(key)
+                if category and category != OTHER:
+                    self._counters["word"] += 1
+                    return category
+                category = self._fuzzy(key)
+                if category and category != OTHER:
+                    self._counters["fuzzy"] += 1
+                    return category
+
+        # "Other" or no label: the description may still say what it was ("Uber to airport")
+        if isinstance(description, str) and description:
+            category = self._match_words(normalize_term(description))
+            if category and category != OTHER:
+                self._counters["description"] += 1
+                return category
+        self._counters["other"] += 1
+        return OTHER
+
+    def canonical(self, label: str) -> str | None:
+        """A configured category name matching label exactly or nearly (synonyms do not count)."""
+        key = normalize_term(label)
+        category = self._names.get(key)
+        if category is None and key:
+            matches = difflib.get_close_matches(key, list(self._names), n=1, cutoff=self._fuzzy_cutoff or 0.8)
+            category = self._names[matches[0]] if matches else None
+        return category
+
+    def mappings(self, user_id: int) -> dict[str, str]:
+        """The user's learned mappings if they are loaded, else an empty dict."""
+        learned = self._learned.get(user_id)
+        return learned.as_dict() if learned else {}
+
+    async def load_user(self, user_id: int) -> None:
+        """Reads the user's learned mappings from the database unless they are already in memory."""
+        if user_id in self._learned:
+            self._learned.move_to_end(user_id)
+            return
+        try:
+            async with get_async_db_session() as session:
+                rows = (await session.execute(
+                    select(CategoryMapping.term, CategoryMapping.category).where(CategoryMapping.user_id == user_id)
+                )).all()
+        except Exception as e:
+            logger.warning(f"Could not load category mappings for user {user_id}: {e}")
+            return
+        self._store(user_id, {term: category for term, category in rows})
+        self._counters["user_loads"] += 1
+
+    def _store(self, user_id: int, mappings: dict[str, str]) -> None:
+        self._learned[user_id] = _LearnedTerms(mappings)
+        self._learned.move_to_end(user_id)
+        while len(self._learned) > self._max_users:
+            self._learned.popitem(last=False)
+
+    def forget_user(self, user_id: int) -> None:
+        """Drops the user's mappings from memory; they are re-read on the user's next message."""
+        self._learned.pop(user_id, None)
+
+    async def learn(self, user_id: int, term: str, category: str, publish=None) -> bool:
+        """
+        Stores that the user files expenses mentioning term under category.
+
+        Args:
+            user_id: Telegram user ID.
+            term: One or more words, matched case-insensitively as whole words.
+            category: A configured category name.
+            publish: Optional callback(session) run before the commit, e.g. to publish
+                a cache invalidation in the same transaction.
+
+        Returns:
+            False if the term is empty or too long, or the user already has the maximum
+            number of mappings.
+        """
+        key = normalize_term(term)
+        if not key or len(key) > MAX_TERM_LENGTH:
+            return False
+        await self.load_user(user_id)
+        learned = self.mappings(user_id)
+        if key not in learned and len(learned) >= MAX_TERMS_PER_USER:
+            return False
+
+        async with get_async_db_session() as session:
+            mapping = await session.get(CategoryMapping, (user_id, key))
+            if mapping is None:
+                session.add(CategoryMapping(user_id=user_id, term=key, category=category))
+            else:
+                mapping.category = category
+            if publish:
+                publish(session)
+            await session.commit()
+        learned[key] = category
+        self._store(user_id, learned)
+        return True
+
+    def stats(self) -> dict:
+        return {**self._counters, "users_loaded": len(self._learned), "fuzzy_cached": len(self._fuzzy_cache)}
+
+
+category_index = CategoryIndex()
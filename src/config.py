@@ -6,6 +6,32 @@ load_dotenv()
 # Telegram Bot Token
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "YOUR_TELEGRAM_BOT_TOKEN")
 
+# How updates reach the bot: "polling" (getUpdates loop) or "webhook" (local ASGI server)
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "64"))  # Update workers; each user's updates stay on one worker
+UPDATE_QUEUE_SIZE = int(os.getenv("UPDATE_QUEUE_SIZE", "100"))  # Updates waiting per worker before new ones are held back (in memory when polling)
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # Public base URL registered with Telegram, empty to leave the webhook as is
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN", "")  # Checked against Telegram's secret token header
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))  # Parallel deliveries Telegram may open (1-100)
+WEBHOOK_MAX_PENDING = int(os.getenv("WEBHOOK_MAX_PENDING", "1000"))  # Accepted but unfinished updates before deliveries wait
+WEBHOOK_ADMIT_TIMEOUT = float(os.getenv("WEBHOOK_ADMIT_TIMEOUT", "5"))  # Seconds a delivery waits for room before a 503
+
+# Several worker processes sharing DATABASE_URL (webhook mode): one leader runs scheduled jobs
+MULTI_WORKER = os.getenv("MULTI_WORKER", "false").lower() in ("1", "true", "yes")
+WORKER_ID = os.getenv("WORKER_ID", "")  # Unique name of this process, defaults to host:pid
+LEADER_LEASE_TTL = float(os.getenv("LEADER_LEASE_TTL", "30"))  # Seconds before a silent leader is replaced
+CACHE_INVALIDATION_POLL_INTERVAL = float(os.getenv("CACHE_INVALIDATION_POLL_INTERVAL", "1.0"))  # Seconds between checks for other workers' changes
+CACHE_INVALIDATION_RETENTION = int(os.getenv("CACHE_INVALIDATION_RETENTION", "3600"))  # Seconds invalidation events are kept
+
+# Latency histograms and counters, served in the Prometheus text format on a local port
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+METRICS_LISTEN = os.getenv("METRICS_LISTEN", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))  # 0 disables the /metrics endpoint (recording stays on)
+METRICS_PORT_RANGE = int(os.getenv("METRICS_PORT_RANGE", "16" if MULTI_WORKER else "1"))  # Ports tried from METRICS_PORT on; each worker takes the first free one
+
 # OpenRouter API Key
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY", "YOUR_OPENROUTER_API_KEY")
 
@@ -15,14 +41,116 @@ OPENROUTER_API_URL = os.getenv("OPENROUTER_API_URL", "https://openrouter.ai/api/
 # LLM Model
 LLM_MODEL = os.getenv("LLM_MODEL", "meta-llama/llama-4-maverick:free")
 
+# Models tried in order per request kind (comma-separated), with hedging and circuit breaking
+LLM_TEXT_MODELS = [m.strip() for m in os.getenv("LLM_TEXT_MODELS", LLM_MODEL).split(",") if m.strip()]
+LLM_IMAGE_MODELS = [m.strip() for m in os.getenv("LLM_IMAGE_MODELS", LLM_MODEL).split(",") if m.strip()]
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "true").lower() in ("1", "true", "yes")  # Needs two or more models
+LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))  # Latency quantile of a model after which a hedge is sent
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.5"))  # Seconds; bounds on the hedge delay
+LLM_HEDGE_MAX_DELAY = float(os.getenv("LLM_HEDGE_MAX_DELAY", "8"))  # Also used until a model has enough latency samples
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))  # Consecutive failures before a model is skipped
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))  # Seconds a failing model is skipped before a trial request
+
+# Prompt size and answer format
+LLM_INPUT_MAX_TOKENS = int(os.getenv("LLM_INPUT_MAX_TOKENS", "500"))  # Approximate token budget per user text, 0 for no limit
+LLM_STRUCTURED_OUTPUT = os.getenv("LLM_STRUCTURED_OUTPUT", "false").lower() in ("1", "true", "yes")  # JSON schema response_format, if the model supports it
+
+# Rule-based parser tried before the LLM for simple messages like "Lunch $15"
+FAST_PARSER_ENABLED = os.getenv("FAST_PARSER_ENABLED", "true").lower() in ("1", "true", "yes")
+FAST_PARSER_MIN_CONFIDENCE = float(os.getenv("FAST_PARSER_MIN_CONFIDENCE", "0.8"))
+
+# Cache of parsed LLM responses keyed by model, prompt version and input content
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2048"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(6 * 3600)))  # Seconds
+LLM_CACHE_DISK_PATH = os.getenv("LLM_CACHE_DISK_PATH", "")  # SQLite file for the on-disk tier, empty to disable
+LLM_CACHE_DISK_MAX_ENTRIES = int(os.getenv("LLM_CACHE_DISK_MAX_ENTRIES", "50000"))
+
+# Receipt image preprocessing before upload to the LLM
+IMAGE_PREPROCESSING_ENABLED = os.getenv("IMAGE_PREPROCESSING_ENABLED", "true").lower() in ("1", "true", "yes")
+IMAGE_MIN_SIDE = int(os.getenv("IMAGE_MIN_SIDE", "800"))  # Smallest Telegram photo size (longer side) worth downloading
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "1280"))  # Longer side after downscaling
+IMAGE_TARGET_BYTES = int(os.getenv("IMAGE_TARGET_BYTES", "250000"))  # JPEG size budget
+IMAGE_GRAYSCALE = os.getenv("IMAGE_GRAYSCALE", "true").lower() in ("1", "true", "yes")
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "80"))
+
+# Opt-in micro-batching of concurrent text parse requests into one LLM prompt
+LLM_BATCH_ENABLED = os.getenv("LLM_BATCH_ENABLED", "false").lower() in ("1", "true", "yes")
+LLM_BATCH_WINDOW_MS = int(os.getenv("LLM_BATCH_WINDOW_MS", "100"))  # How long to collect requests
+LLM_BATCH_MAX_SIZE = int(os.getenv("LLM_BATCH_MAX_SIZE", "8"))  # Flush early once this many are waiting
+
+# Stream receipt parsing results and show them progressively
+LLM_STREAMING_ENABLED = os.getenv("LLM_STREAMING_ENABLED", "true").lower() in ("1", "true", "yes")
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))  # Min seconds between progress message edits
+
+# Shared HTTP client for OpenRouter requests
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "20"))
+LLM_HTTP_MAX_KEEPALIVE = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "16"))  # Keep at least LLM_MAX_CONCURRENCY to avoid reconnect churn
+LLM_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "60"))  # Seconds an idle connection is kept open
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "false").lower() in ("1", "true", "yes")  # Requires the 'h2' package
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))  # Max in-flight OpenRouter requests
+
 # Site URL and Name for OpenRouter headers
 YOUR_SITE_URL = os.getenv("YOUR_SITE_URL", "http://localhost")
 YOUR_SITE_NAME = os.getenv("YOUR_SITE_NAME", "TelegramExpenseBot")
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///user_data.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))  # Persistent connections per engine (Postgres)
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))  # Extra connections allowed under bursts (Postgres)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # Seconds before a pooled connection is replaced
+
+# User profile cache
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "3600"))  # Seconds before a cached profile is re-read
+USER_CACHE_NEGATIVE_TTL = int(os.getenv("USER_CACHE_NEGATIVE_TTL", "60"))  # Seconds to remember unknown users, 0 to disable
+
+# Monthly stats
+DEFAULT_MONTHLY_LIMIT = float(os.getenv("DEFAULT_MONTHLY_LIMIT", "1800"))  # Limit for users who have not set one
+LEDGER_RECONCILE_INTERVAL = int(os.getenv("LEDGER_RECONCILE_INTERVAL", "3600"))  # Seconds between sheet reconciliations
 
 # Google Sheets Configuration
 GOOGLE_SERVICE_ACCOUNT_CREDENTIALS_PATH = os.getenv("GOOGLE_SERVICE_ACCOUNT_CREDENTIALS_PATH", "creds.json")  # Path to your service account JSON key file
+SHEETS_MAX_WORKERS = int(os.getenv("SHEETS_MAX_WORKERS", "8"))  # Worker threads running blocking gspread calls
+SHEETS_HANDLE_CACHE_SIZE = int(os.getenv("SHEETS_HANDLE_CACHE_SIZE", "512"))  # Cached Spreadsheet/Worksheet handles
+SHEETS_HANDLE_CACHE_TTL = int(os.getenv("SHEETS_HANDLE_CACHE_TTL", "1800"))  # Seconds before a handle is re-fetched
+SHEETS_RATE_LIMIT = float(os.getenv("SHEETS_RATE_LIMIT", "1.0"))  # API calls per second for the service account, 0 for no limit
+SHEETS_RATE_BURST = float(os.getenv("SHEETS_RATE_BURST", "5"))  # Calls allowed back to back before the rate applies
+SHEETS_SPREADSHEET_RATE_LIMIT = float(os.getenv("SHEETS_SPREADSHEET_RATE_LIMIT", "0.5"))  # API calls per second per spreadsheet
+SHEETS_SPREADSHEET_RATE_BURST = float(os.getenv("SHEETS_SPREADSHEET_RATE_BURST", "5"))
+SHEETS_MAX_RETRIES = int(os.getenv("SHEETS_MAX_RETRIES", "5"))  # Retries of throttled (429) or transient (5xx) calls
+SHEETS_BACKOFF_BASE = float(os.getenv("SHEETS_BACKOFF_BASE", "1.0"))  # First retry delay in seconds, doubled per attempt
+SHEETS_BACKOFF_MAX = float(os.getenv("SHEETS_BACKOFF_MAX", "64"))  # Upper bound of the retry delay
+
+# Background sync of locally stored expenses to Google Sheets
+EXPENSE_SYNC_DEBOUNCE = float(os.getenv("EXPENSE_SYNC_DEBOUNCE", "2.0"))  # Quiet seconds after a user's last expense before syncing
+EXPENSE_SYNC_MAX_DELAY = float(os.getenv("EXPENSE_SYNC_MAX_DELAY", "10"))  # Upper bound on how long a user's burst is held back
+EXPENSE_SYNC_INTERVAL = float(os.getenv("EXPENSE_SYNC_INTERVAL", "30"))  # Seconds between sweeps for rows due a retry
+EXPENSE_SYNC_BATCH_SIZE = int(os.getenv("EXPENSE_SYNC_BATCH_SIZE", "500"))  # Maximum rows per user per sweep
+EXPENSE_SYNC_RETRY_BASE = float(os.getenv("EXPENSE_SYNC_RETRY_BASE", "5"))  # First retry delay in seconds, doubled per attempt
+EXPENSE_SYNC_RETRY_MAX = float(os.getenv("EXPENSE_SYNC_RETRY_MAX", "900"))  # Upper bound of the retry delay
+EXPENSE_SYNC_CLAIM_TTL = float(os.getenv("EXPENSE_SYNC_CLAIM_TTL", "300"))  # Seconds a claimed row is reserved for one sync
+
+# Bulk import of CSV exports and bank statements (/import and python -m src.importer)
+IMPORT_CHUNK_ROWS = int(os.getenv("IMPORT_CHUNK_ROWS", "500"))  # Rows parsed and categorized at a time
+IMPORT_LLM_BATCH_SIZE = int(os.getenv("IMPORT_LLM_BATCH_SIZE", "50"))  # Statement lines per LLM categorization request, 0 for local rules only
+IMPORT_APPEND_MAX_ROWS = int(os.getenv("IMPORT_APPEND_MAX_ROWS", "5000"))  # Rows per append_rows; a longer month is written in several
+IMPORT_MAX_OPEN_MONTHS = int(os.getenv("IMPORT_MAX_OPEN_MONTHS", "2"))  # Months buffered at once, for files not sorted by date
+IMPORT_MAX_FILE_BYTES = int(os.getenv("IMPORT_MAX_FILE_BYTES", str(20 * 1024 * 1024)))  # Bot API downloads are capped at 20 MB
+
+# Daily reminder, sent at REMINDER_TIME in each user's own timezone
+REMINDER_TIME = os.getenv("REMINDER_TIME", "20:00")  # Local time of day, HH:MM
+REMINDER_DEFAULT_TIMEZONE = os.getenv("REMINDER_DEFAULT_TIMEZONE", "UTC")  # For users who have not set /timezone
+REMINDER_CHECK_INTERVAL = int(os.getenv("REMINDER_CHECK_INTERVAL", "900"))  # Seconds between checks for timezones that are due
+REMINDER_SEND_WINDOW = int(os.getenv("REMINDER_SEND_WINDOW", "10800"))  # Seconds after REMINDER_TIME a missed reminder is still sent
+REMINDER_RATE_LIMIT = float(os.getenv("REMINDER_RATE_LIMIT", "25"))  # Messages per second, below Telegram's ~30/s bot limit
+REMINDER_CONCURRENCY = int(os.getenv("REMINDER_CONCURRENCY", "32"))  # Sends in flight at once
+REMINDER_CHUNK_SIZE = int(os.getenv("REMINDER_CHUNK_SIZE", "1000"))  # User rows fetched per round trip
+REMINDER_MAX_RETRIES = int(os.getenv("REMINDER_MAX_RETRIES", "3"))  # Resends of one message after RetryAfter
+
+# Matching of category labels (from the LLM or the rule-based parser) to EXPENSE_CATEGORIES
+CATEGORY_FUZZY_CUTOFF = float(os.getenv("CATEGORY_FUZZY_CUTOFF", "0.8"))  # Similarity (0-1) a misspelt label needs, 0 disables fuzzy matching
+CATEGORY_FUZZY_MAX_LENGTH = int(os.getenv("CATEGORY_FUZZY_MAX_LENGTH", "32"))  # Longer labels are not fuzzy matched
 
 # Expense Categories
 EXPENSE_CATEGORIES = [
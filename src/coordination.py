@@ -0,0 +1,214 @@
+import asyncio
+import datetime
+import logging
+import os
+import socket
+import time
+
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from .config import (
+    MULTI_WORKER, WORKER_ID, LEADER_LEASE_TTL, CACHE_INVALIDATION_POLL_INTERVAL, CACHE_INVALIDATION_RETENTION
+)
+from .database import CacheInvalidation, Lease, get_async_db_session
+
+logger = logging.getLogger(__name__)
+
+worker_id = WORKER_ID or f"{socket.gethostname()}:{os.getpid()}"
+
+_LOOKBACK = 10  # Seconds of invalidation events re-read on each poll
+
+
+class LeaderLease:
+    """
+    Leader election among worker processes through a lease row in the shared database.
+
+    The holder renews the lease every ttl/3 seconds. If it stops (crash, lost
+    database connection) another worker takes the lease once it has expired. A
+    worker considers itself leader for 2/3 of the ttl after its last successful
+    renewal, so two workers never both act as leader as long as their clocks agree
+    to within ttl/3. Unlike a Postgres advisory lock this works on SQLite too and
+    does not pin a pooled connection. With multi-worker mode off the process is
+    always the leader.
+    """
+
+    def __init__(self, name: str = "scheduler", holder: str = worker_id, ttl: float = LEADER_LEASE_TTL,
+                 enabled: bool = MULTI_WORKER):
+        self._name = name
+        self._holder = holder
+        self._ttl = ttl
+        self._enabled = enabled
+        self._valid_until = 0.0
+        self._task: asyncio.Task | None = None
+        self._counters = {"acquired": 0, "lost": 0, "renewals": 0, "errors": 0}
+
+    @property
+    def is_leader(self) -> bool:
+        return not self._enabled or time.monotonic() < self._valid_until
+
+    async def try_acquire(self) -> bool:
+        """Takes or renews the lease if it is free, expired or already ours."""
+        started = time.monotonic()
+        now = datetime.datetime.utcnow()
+        expires_at = now + datetime.timedelta(seconds=self._ttl)
+        async with get_async_db_session() as session:
+            result = await session.execute(
+                update(Lease)
+                .where(Lease.name == self._name, or_(Lease.holder == self._holder, Lease.expires_at < now))
+                .values(holder=self._holder, expires_at=expires_at)
+            )
+            acquired = result.rowcount == 1
+            if not acquired:
+                session.add(Lease(name=self._name, holder=self._holder, expires_at=expires_at))
+            try:
+                await session.commit()
+                acquired = True
+            except IntegrityError:
+                await session.rollback()  # Someone else holds the lease
+
+        was_leader = self.is_leader
+        if acquired:
+            self._valid_until = started + self._ttl * 2 / 3
+            self._counters["renewals" if was_leader else "acquired"] += 1
+            if not was_leader:
+                logger.info(f"Worker {self._holder} is now the leader ('{self._name}' lease)")
+        elif was_leader:
+            self._valid_until = 0.0
+            self._counters["lost"] += 1
+            logger.warning(f"Worker {self._holder} lost the '{self._name}' lease")
+        return acquired
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.try_acquire()
+            except Exception as e:
+                self._counters["errors"] += 1
+                logger.error(f"Could not renew the '{self._name}' lease: {e}")
+            await asyncio.sleep(self._ttl / 3)
+
+    async def start(self) -> None:
+        if self._enabled and self._task is None:
+            await self.try_acquire()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stops renewing and hands the lease back so another worker takes over right away."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        if self._valid_until:
+            self._valid_until = 0.0
+            try:
+                async with get_async_db_session() as session:
+                    await session.execute(
+                        update(Lease).where(Lease.name == self._name, Lease.holder == self._holder)
+                        .values(expires_at=datetime.datetime.utcnow())
+                    )
+                    await session.commit()
+            except Exception as e:
+                logger.warning(f"Could not release the '{self._name}' lease: {e}")
+
+    def stats(self) -> dict:
+        return {**self._counters, "leader": self.is_leader}
+
+
+class InvalidationBus:
+    """
+    Broadcasts cache invalidations to the other worker processes through a table.
+
+    A change that other workers may have cached (say a profile after /setsheet)
+    adds an event with publish() in the same transaction as the change itself.
+    Every worker polls for new events every `interval` seconds and passes the key
+    to the callbacks subscribed to that cache; a worker skips its own events. The
+    leader deletes events older than `retention` seconds. With multi-worker mode
+    off, publish() does nothing and no polling happens.
+    """
+
+    def __init__(self, interval: float = CACHE_INVALIDATION_POLL_INTERVAL,
+                 retention: float = CACHE_INVALIDATION_RETENTION, enabled: bool = MULTI_WORKER):
+        self._interval = interval
+        self._retention = retention
+        self._enabled = enabled
+        self._subscribers: dict[str, list] = {}
+        self._since = datetime.datetime.utcnow()
+        self._seen: dict[int, datetime.datetime] = {}  # Events applied within the lookback window
+        self._task: asyncio.Task | None = None
+        self._counters = {"published": 0, "received": 0, "polls": 0, "pruned": 0}
+
+    def subscribe(self, cache: str, callback) -> None:
+        """Calls callback(key) for each event other workers publish for the cache."""
+        self._subscribers.setdefault(cache, []).append(callback)
+
+    def publish(self, session, cache: str, key) -> None:
+        """Adds an invalidation event to the caller's session; it is broadcast once the session commits."""
+        if self._enabled:
+            session.add(CacheInvalidation(cache=cache, key=str(key), origin=worker_id))
+            self._counters["published"] += 1
+
+    async def poll(self) -> int:
+        """Applies the events published since the last poll; returns how many came from other workers."""
+        now = datetime.datetime.utcnow()
+        async with get_async_db_session() as session:
+            events = (await session.execute(
+                select(CacheInvalidation).where(CacheInvalidation.created_at >= self._since)
+                .order_by(CacheInvalidation.id)
+            )).scalars().all()
+        # Re-read a window rather than "id > last seen": a transaction may commit after
+        # one with a higher id, and worker clocks may differ slightly
+        self._since = now - datetime.timedelta(seconds=_LOOKBACK)
+        self._counters["polls"] += 1
+        received = 0
+        for event in events:
+            if event.id in self._seen:
+                continue
+            self._seen[event.id] = event.created_at
+            if event.origin == worker_id:
+                continue
+            received += 1
+            for callback in self._subscribers.get(event.cache, []):
+                callback(event.key)
+        self._seen = {event_id: created for event_id, created in self._seen.items() if created >= self._since}
+        self._counters["received"] += received
+        return received
+
+    async def prune(self) -> None:
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=self._retention)
+        async with get_async_db_session() as session:
+            result = await session.execute(delete(CacheInvalidation).where(CacheInvalidation.created_at < cutoff))
+            await session.commit()
+        self._counters["pruned"] += result.rowcount or 0
+
+    async def _run(self) -> None:
+        last_pruned = time.monotonic()
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                await self.poll()
+                if leader_lease.is_leader and time.monotonic() - last_pruned >= self._retention / 10:
+                    await self.prune()
+                    last_pruned = time.monotonic()
+            except Exception as e:
+                logger.error(f"Cache invalidation poll failed: {e}")
+
+    async def start(self) -> None:
+        if self._enabled and self._task is None:
+            # Events from before this worker started concern caches it does not have
+            self._since = datetime.datetime.utcnow()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict:
+        return dict(self._counters)
+
+
+leader_lease = LeaderLease()
+invalidation_bus = InvalidationBus()
@@ -1,12 +1,54 @@
-from sqlalchemy import create_engine, Column, Integer, String
+import datetime
+
+from sqlalchemy import create_engine, event, inspect, text, Column, Integer, String, Float, Date, DateTime, ForeignKey, Index
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from .config import DATABASE_URL
+from .config import DATABASE_URL, DEFAULT_MONTHLY_LIMIT, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE
+
+_IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+
+def _async_database_url(url: str) -> str:
+    """Maps DATABASE_URL onto the asyncio driver for the same database."""
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    for prefix in ("postgresql+psycopg2:", "postgresql:", "postgres:"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg:" + url[len(prefix):]
+    return url
+
+def _pool_options() -> dict:
+    if _IS_SQLITE and (":memory:" in DATABASE_URL or DATABASE_URL.rstrip("/") == "sqlite:"):
+        return {}  # In-memory databases use a single shared connection
+    options = {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW}
+    if not _IS_SQLITE:
+        # Server connections can be dropped by the database or a proxy while idle
+        options.update(pool_recycle=DB_POOL_RECYCLE, pool_pre_ping=True)
+    return options
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL lets handler reads proceed while a sheet worker thread writes the ledger."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
 
 
-engine = create_engine(DATABASE_URL)
+# Sheet writes touch the database from worker threads, so SQLite connections must be shareable
+_connect_args = {"check_same_thread": False} if _IS_SQLITE else {}
+engine = create_engine(DATABASE_URL, connect_args=_connect_args, **_pool_options())
 SessionFactory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Handlers run on the event loop and use the async engine so queries never block it
+async_engine = create_async_engine(_async_database_url(DATABASE_URL), **_pool_options())
+AsyncSessionFactory = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+if _IS_SQLITE:
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+
 Base = declarative_base()
 
 class User(Base):
@@ -15,9 +57,106 @@ class User(Base):
     id = Column(Integer, primary_key=True)  # Telegram User ID
     first_name = Column(String, nullable=True)
     spreadsheet_id = Column(String, nullable=True)
+    monthly_limit = Column(Float, nullable=False, default=DEFAULT_MONTHLY_LIMIT)
+    timezone = Column(String, nullable=True)  # IANA name set with /timezone; None uses REMINDER_DEFAULT_TIMEZONE
+    last_expense_at = Column(DateTime, nullable=True)  # UTC time the user last logged an expense
+    reminded_on = Column(Date, nullable=True)  # User's local date of the last daily reminder sent
+
+class MonthlyLedger(Base):
+    """Running expense total per user and month, kept in step with the monthly sheet."""
+    __tablename__ = "monthly_ledger"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    month = Column(String, primary_key=True)  # Format: MM-YYYY, same as the worksheet title
+    total = Column(Float, nullable=False, default=0.0)
+    reconciled_at = Column(DateTime, nullable=True)  # Last time total was recomputed from the sheet
+
+class Expense(Base):
+    """
+    Source of truth for recorded expenses; rows are copied to the user's sheet in the background.
+
+    expense_uid is written to the sheet's ExpenseID column, so a retried sync can tell
+    which rows already landed. sync_attempts is incremented before each append.
+    """
+    __tablename__ = "expenses"
+    __table_args__ = (
+        Index("ix_expenses_user_timestamp", "user_id", "timestamp"),
+        Index("ix_expenses_pending", "synced_at", "next_attempt_at"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    expense_uid = Column(String, nullable=False, unique=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    timestamp = Column(DateTime, nullable=False)
+    amount = Column(Float, nullable=False)
+    category = Column(String, nullable=False)
+    description = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=True, default=datetime.datetime.utcnow)
+    synced_at = Column(DateTime, nullable=True)  # None until the row is in the sheet
+    sync_attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=True)  # Backoff after a failed sync, or the end of a claim
+    claimed_by = Column(String, nullable=True)  # Token of the sync currently writing the row
+    last_sync_error = Column(String, nullable=True)
+
+class Lease(Base):
+    """A named lease held by one worker process at a time (leader election for scheduled jobs)."""
+    __tablename__ = "leases"
+
+    name = Column(String, primary_key=True)
+    holder = Column(String, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+class CacheInvalidation(Base):
+    """Cache entries every other worker process must drop, e.g. a profile after /setsheet."""
+    __tablename__ = "cache_invalidations"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    cache = Column(String, nullable=False)
+    key = Column(String, nullable=False)
+    origin = Column(String, nullable=False)  # Worker that published it; it skips its own events
+    created_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow, index=True)
+
+class CategoryMapping(Base):
+    """A term a user files under a category of their choice, taught with /category."""
+    __tablename__ = "category_mappings"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    term = Column(String, primary_key=True)  # Normalized: lowercase words separated by single spaces
+    category = Column(String, nullable=False)
+
+def _add_missing_columns():
+    """Adds columns introduced after a table was first created (no migration tool in use)."""
+    added_columns = {
+        User.__tablename__: {
+            "monthly_limit": f"FLOAT NOT NULL DEFAULT {DEFAULT_MONTHLY_LIMIT}",
+            "timezone": "VARCHAR",
+            "last_expense_at": "TIMESTAMP",
+            "reminded_on": "DATE",
+        },
+        Expense.__tablename__: {
+            "created_at": "TIMESTAMP",
+            "claimed_by": "VARCHAR",
+        },
+    }
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table, columns in added_columns.items():
+            existing = {column["name"] for column in inspector.get_columns(table)}
+            for name, definition in columns.items():
+                if name not in existing:
+                    connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {definition}"))
 
 def init_db():
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
 
 def get_db_session():
-    return SessionFactory()
\ No newline at end of file
+    return SessionFactory()
+
+def get_async_db_session() -> AsyncSession:
+    """Returns a session for use in handlers: `async with get_async_db_session() as session:`."""
+    return AsyncSessionFactory()
+
+async def dispose_async_engine() -> None:
+    """Closes the async engine's pooled connections (call on shutdown)."""
+    await async_engine.dispose()
@@ -0,0 +1,347 @@
+import asyncio
+import datetime
+import logging
+import random
+import uuid
+from itertools import groupby
+
+from sqlalchemy import or_, select, update
+
+from .config import (
+    EXPENSE_SYNC_DEBOUNCE, EXPENSE_SYNC_MAX_DELAY, EXPENSE_SYNC_INTERVAL, EXPENSE_SYNC_BATCH_SIZE,
+    EXPENSE_SYNC_RETRY_BASE, EXPENSE_SYNC_RETRY_MAX, EXPENSE_SYNC_CLAIM_TTL
+)
+from . import ledger
+from .coordination import leader_lease
+from .database import Expense, User, get_db_session, get_async_db_session
+from .sheet_queue import sheet_write_queue
+from .sheets_scheduler import sheets_scheduler, BACKGROUND, INTERACTIVE
+from .sheets_writer import write_expenses_to_sheet, refresh_monthly_stats
+
+logger = logging.getLogger(__name__)
+
+
+def _due_filter(now: datetime.datetime):
+    return (
+        Expense.synced_at.is_(None),
+        or_(Expense.next_attempt_at.is_(None), Expense.next_attempt_at <= now)
+    )
+
+def _retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter, capped at EXPENSE_SYNC_RETRY_MAX seconds."""
+    delay = min(EXPENSE_SYNC_RETRY_BASE * 2 ** max(attempts - 1, 0), EXPENSE_SYNC_RETRY_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+def _expense_dict(expense: Expense) -> dict:
+    return {
+        "expense_id": expense.expense_uid,
+        "user_id": expense.user_id,
+        "amount": expense.amount,
+        "category": expense.category,
+        "description": expense.description,
+        "timestamp": expense.timestamp
+    }
+
+def _claim(session, user_id: int, retries_only: bool) -> tuple[str, list[Expense]]:
+    """
+    Marks the user's due expenses as being written by this call and returns them.
+
+    The claim counts an attempt and pushes next_attempt_at out by
+    EXPENSE_SYNC_CLAIM_TTL in one UPDATE, so another worker process syncing the
+    same user at the same time does not pick the rows up. If the process dies
+    mid-write, the rows become due again once the claim expires.
+    """
+    now = datetime.datetime.utcnow()
+    due = [Expense.user_id == user_id, *_due_filter(now)]
+    if retries_only:
+        # Fresh rows belong to the debounced sync of whichever worker received them
+        stale = now - datetime.timedelta(seconds=EXPENSE_SYNC_MAX_DELAY + EXPENSE_SYNC_INTERVAL)
+        due.append(or_(Expense.sync_attempts > 0, Expense.created_at.is_(None), Expense.created_at <= stale))
+    ids = select(Expense.id).where(*due).order_by(Expense.timestamp).limit(EXPENSE_SYNC_BATCH_SIZE)
+    token = uuid.uuid4().hex
+    session.execute(
+        update(Expense).where(Expense.id.in_(ids), *_due_filter(now)).values(
+            claimed_by=token,
+            next_attempt_at=now + datetime.timedelta(seconds=EXPENSE_SYNC_CLAIM_TTL),
+            sync_attempts=Expense.sync_attempts + 1
+        ).execution_options(synchronize_session=False)
+    )
+    session.commit()
+    claimed = session.query(Expense).filter(Expense.claimed_by == token).order_by(Expense.timestamp).all()
+    return token, claimed
+
+def sync_user_expenses(user_id: int, spreadsheet_id: str, retries_only: bool = False) -> tuple[int, int, bool]:
+    """
+    Copies up to EXPENSE_SYNC_BATCH_SIZE of the user's due, unsynced expenses to
+    their sheet, one append per month.
+
+    The rows are claimed (and the attempt counted) before the append, so if the
+    append fails or the process dies mid-write, the retry reads the sheet's
+    ExpenseIDs and skips rows that already landed. First attempts run at
+    interactive priority since the user just sent them; retries and reconciliation
+    yield quota to them. Runs on a sheets worker thread.
+
+    Args:
+        retries_only: Leave rows alone that are still within their first debounced
+            sync, as the periodic sweep does.
+
+    Returns:
+        (synced, failed, full): how many expenses are now in the sheet, how many
+        are left for a retry, and whether the batch was full, so more due
+        expenses may be waiting.
+    """
+    session = get_db_session()
+    try:
+        _, pending = _claim(session, user_id, retries_only)
+        full = len(pending) >= EXPENSE_SYNC_BATCH_SIZE
+
+        synced = failed = 0
+        for month, group in groupby(pending, key=lambda expense: expense.timestamp.strftime('%m-%Y')):
+            expenses = list(group)
+            retrying = any(expense.sync_attempts > 1 for expense in expenses)
+
+            try:
+                with sheets_scheduler.priority(BACKGROUND if retrying else INTERACTIVE):
+                    written = write_expenses_to_sheet(
+                        [_expense_dict(expense) for expense in expenses],
+                        spreadsheet_id,
+                        skip_existing=retrying
+                    )
+                error = None if written else "sheet write failed"
+            except Exception as e:
+                logger.error(f"Unexpected error syncing expenses of user {user_id}: {e}", exc_info=True)
+                written, error = False, str(e)
+
+            now = datetime.datetime.utcnow()
+            for expense in expenses:
+                expense.claimed_by = None
+                if written:
+                    expense.synced_at = now
+                    expense.next_attempt_at = None
+                    expense.last_sync_error = None
+                else:
+                    expense.next_attempt_at = now + datetime.timedelta(seconds=_retry_delay(expense.sync_attempts))
+                    expense.last_sync_error = error
+            session.commit()
+
+            if not written:
+                failed += len(expenses)
+                logger.warning(f"Sync of {len(expenses)} expense(s) for user {user_id}, month {month} failed; will retry")
+                continue
+            synced += len(expenses)
+            if ledger.needs_reconcile(user_id, month):
+                with sheets_scheduler.priority(BACKGROUND):
+                    refresh_monthly_stats(user_id, spreadsheet_id, month)
+        return synced, failed, full
+    finally:
+        session.close()
+
+def sync_claimed_expenses(user_id: int, spreadsheet_id: str, claim_token: str, expenses: list[dict]) -> bool:
+    """
+    Appends expenses of one month that were stored already claimed by claim_token.
+
+    Used by the bulk import, which stores a month's rows with
+    ledger.add_imported_expenses and writes them here with a single append at
+    background priority. If the append fails the claim is released with a backoff
+    and the periodic sweep retries the rows like any other failed sync, reading the
+    sheet's ExpenseIDs first. Runs on a sheets worker thread.
+
+    Returns:
+        True if the expenses are in the sheet.
+    """
+    try:
+        with sheets_scheduler.priority(BACKGROUND):
+            written = write_expenses_to_sheet(expenses, spreadsheet_id)
+        error = None if written else "sheet write failed"
+    except Exception as e:
+        logger.error(f"Unexpected error writing imported expenses of user {user_id}: {e}", exc_info=True)
+        written, error = False, str(e)
+
+    now = datetime.datetime.utcnow()
+    if written:
+        values = {"claimed_by": None, "synced_at": now, "next_attempt_at": None, "last_sync_error": None}
+    else:
+        values = {
+            "claimed_by": None,
+            "next_attempt_at": now + datetime.timedelta(seconds=_retry_delay(1)),
+            "last_sync_error": error,
+        }
+    session = get_db_session()
+    try:
+        session.execute(
+            update(Expense).where(Expense.claimed_by == claim_token).values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        session.commit()
+    finally:
+        session.close()
+
+    month = expenses[0]["timestamp"].strftime('%m-%Y')
+    if not written:
+        logger.warning(f"Import of {len(expenses)} expense(s) for user {user_id}, month {month} failed; will retry")
+    elif ledger.needs_reconcile(user_id, month):
+        with sheets_scheduler.priority(BACKGROUND):
+            refresh_monthly_stats(user_id, spreadsheet_id, month)
+    return written
+
+
+class _PendingSync:
+    """A user's expenses waiting out the debounce window, and the callers waiting for them."""
+
+    __slots__ = ("spreadsheet_id", "first_notified", "timer", "waiters")
+
+    def __init__(self, spreadsheet_id: str, first_notified: float):
+        self.spreadsheet_id = spreadsheet_id
+        self.first_notified = first_notified
+        self.timer: asyncio.TimerHandle | None = None
+        self.waiters: list[asyncio.Future] = []
+
+
+class ExpenseSyncer:
+    """
+    Copies locally stored expenses to Google Sheets in the background.
+
+    notify() debounces per user: the user's rows are synced once no new expense has
+    arrived for `debounce` seconds (but at most `max_delay` seconds after the first),
+    so a burst of messages becomes one append and at most one stats update. That
+    sync continues in batches of EXPENSE_SYNC_BATCH_SIZE until the user's backlog is
+    empty, so the new rows are in the sheet when the waiters hear True. A periodic
+    sweep every `interval` seconds picks up one batch per user whose retry is due. Each
+    user's rows go through the per-spreadsheet write queue, so they stay ordered with
+    /stats reads of the same sheet.
+    """
+
+    def __init__(
+        self,
+        debounce: float = EXPENSE_SYNC_DEBOUNCE,
+        max_delay: float = EXPENSE_SYNC_MAX_DELAY,
+        interval: float = EXPENSE_SYNC_INTERVAL
+    ):
+        self._debounce = debounce
+        self._max_delay = max_delay
+        self._interval = interval
+        self._pending: dict[int, _PendingSync] = {}
+        self._task: asyncio.Task | None = None
+        self._flushes: set[asyncio.Task] = set()
+        self._counters = {"notifications": 0, "user_flushes": 0, "sweeps": 0, "synced": 0, "failed_users": 0}
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stops background work; unsynced rows stay in the database for the next start."""
+        for pending in self._pending.values():
+            pending.timer.cancel()
+            self._resolve(pending.waiters, False)
+        self._pending.clear()
+        tasks = [task for task in (self._task, *self._flushes) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+
+    def notify(self, user_id: int, spreadsheet_id: str) -> asyncio.Future:
+        """
+        Signals that new expenses were stored for the user.
+
+        Returns:
+            A future that resolves to True once the user's debounced sync has put
+            everything in the sheet, or False if some rows were left for a retry.
+        """
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        pending = self._pending.get(user_id)
+        if pending is None:
+            pending = self._pending[user_id] = _PendingSync(spreadsheet_id, now)
+        else:
+            pending.timer.cancel()
+            pending.spreadsheet_id = spreadsheet_id
+        future = loop.create_future()
+        pending.waiters.append(future)
+        delay = min(self._debounce, pending.first_notified + self._max_delay - now)
+        pending.timer = loop.call_later(max(delay, 0), self._start_flush, user_id)
+        self._counters["notifications"] += 1
+        return future
+
+    def _start_flush(self, user_id: int) -> None:
+        pending = self._pending.pop(user_id, None)
+        if pending is None:
+            return
+        task = asyncio.get_running_loop().create_task(self._flush(user_id, pending))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, user_id: int, pending: _PendingSync) -> None:
+        self._counters["user_flushes"] += 1
+        # The waiters' rows may sit behind a full batch of older ones, so sync until the backlog is empty
+        ok = await self._sync_user(user_id, pending.spreadsheet_id, drain=True)
+        self._resolve(pending.waiters, ok)
+
+    @staticmethod
+    def _resolve(waiters: list[asyncio.Future], ok: bool) -> None:
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(ok)
+
+    async def _sync_user(
+        self, user_id: int, spreadsheet_id: str, retries_only: bool = False, drain: bool = False
+    ) -> bool:
+        """
+        Syncs one batch of the user's due expenses, or with drain, batches until one
+        is not full. Each batch is a separate write queue job, so reads of the sheet
+        are not held up behind a long backlog.
+
+        Returns:
+            True if every claimed expense is in the sheet.
+        """
+        while True:
+            try:
+                synced, failed, full = await sheet_write_queue.submit(
+                    spreadsheet_id, sync_user_expenses, user_id, spreadsheet_id, retries_only
+                )
+            except Exception as e:
+                self._counters["failed_users"] += 1
+                logger.error(f"Expense sync for user {user_id} failed: {e}")
+                return False
+            self._counters["synced"] += synced
+            if failed or not (drain and full):
+                return failed == 0
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                await self.sync_once()
+            except Exception as e:
+                logger.error(f"Expense sync sweep failed: {e}", exc_info=True)
+
+    async def sync_once(self) -> None:
+        """
+        Syncs every user with due expenses once, skipping users inside their debounce window.
+
+        With several worker processes only the leader sweeps; each worker still
+        flushes the debounced syncs of the messages it received.
+        """
+        if not leader_lease.is_leader:
+            return
+        self._counters["sweeps"] += 1
+        async with get_async_db_session() as session:
+            result = await session.execute(
+                select(Expense.user_id, User.spreadsheet_id)
+                .join(User, User.id == Expense.user_id)
+                .where(*_due_filter(datetime.datetime.utcnow()), User.spreadsheet_id.is_not(None))
+                .distinct()
+            )
+            users = [(user_id, spreadsheet_id) for user_id, spreadsheet_id in result.all()
+                     if user_id not in self._pending]
+
+        await asyncio.gather(*(
+            self._sync_user(user_id, spreadsheet_id, retries_only=True) for user_id, spreadsheet_id in users
+        ))
+
+    def stats(self) -> dict:
+        return dict(self._counters)
+
+
+expense_syncer = ExpenseSyncer()
@@ -0,0 +1,107 @@
+import re
+import datetime
+
+from .categories import category_index
+
+_CURRENCY_WORDS = {"usd", "eur", "euro", "euros", "gbp", "uah", "grn", "hrn", "pln", "zl", "dollars", "dollar", "bucks"}
+_FILLER_WORDS = {"for", "on", "at", "in", "the", "a", "an", "spent", "paid", "bought", "of", "to"}
+
+_CURRENCY_SYMBOLS = "$€£₴₽¥₹"
+_AMOUNT_RE = re.compile(
+    rf"(?<![\w.,])[{_CURRENCY_SYMBOLS}]?\s?(\d{{1,3}}(?:,\d{{3}})+(?:\.\d+)?|\d+(?:[.,]\d+)?)(?![\d.,]*\d)\s?[{_CURRENCY_SYMBOLS}]?"
+)
+_ISO_DATE_RE = re.compile(r"\b(\d{4}-\d{2}-\d{2})\b")
+_DAYS_AGO_RE = re.compile(r"\b(\d{1,2})\s+days?\s+ago\b", re.IGNORECASE)
+_RELATIVE_DAYS = [
+    (re.compile(r"\bday before yesterday\b", re.IGNORECASE), 2),
+    (re.compile(r"\byesterday\b", re.IGNORECASE), 1),
+    (re.compile(r"\btoday\b", re.IGNORECASE), 0),
+]
+_WORD_RE = re.compile(r"[^\W\d_]+", re.UNICODE)
+# Separators that usually mean several expenses in one message
+_MULTI_ITEM_RE = re.compile(r"[;\n]|\band\b|\bplus\b|,\s*\D", re.IGNORECASE)
+
+_MAX_DESCRIPTION_WORDS = 4
+
+
+def _extract_date(text: str, today: datetime.date) -> tuple[str | None, str]:
+    """Finds an ISO or relative date, returning it as YYYY-MM-DD and the text without it."""
+    match = _ISO_DATE_RE.search(text)
+    if match:
+        return match.group(1), text[:match.start()] + text[match.end():]
+
+    match = _DAYS_AGO_RE.search(text)
+    if match:
+        date = today - datetime.timedelta(days=int(match.group(1)))
+        return date.isoformat(), text[:match.start()] + text[match.end():]
+
+    for pattern, days_back in _RELATIVE_DAYS:
+        match = pattern.search(text)
+        if match:
+            date = today - datetime.timedelta(days=days_back)
+            return date.isoformat(), text[:match.start()] + text[match.end():]
+    return None, text
+
+def _parse_amount(raw: str) -> float:
+    if "," in raw and "." not in raw and len(raw.rsplit(",", 1)[1]) != 3:
+        raw = raw.replace(",", ".")  # Decimal comma, e.g. "12,5"
+    return float(raw.replace(",", ""))
+
+def parse_simple_expense(text: str, today: datetime.date | None = None, user_id: int | None = None) -> tuple[list[dict], float]:
+    """
+    Parses a single simple expense like "Lunch $15" or "taxi 12.5 yesterday" without an LLM.
+
+    Args:
+        text: The user's message.
+        today: Reference date for relative dates, defaults to the current UTC date.
+        user_id: Telegram user ID whose learned category mappings apply, if loaded.
+
+    Returns:
+        A tuple (items, confidence). items holds at most one raw expense with the keys
+        "amount", "category", "description" and "date" (the shape the LLM returns, to be
+        passed through _validate_expense_item). confidence is in [0, 1]; callers should
+        fall back to the LLM when it is below their threshold.
+    """
+    if not text or len(text) > 120:
+        return [], 0.0
+    today = today or datetime.datetime.utcnow().date()
+
+    date, remainder = _extract_date(text.strip(), today)
+    if _MULTI_ITEM_RE.search(remainder):
+        return [], 0.0
+
+    amounts = list(_AMOUNT_RE.finditer(remainder))
+    if len(amounts) != 1:
+        return [], 0.0
+    amount_match = amounts[0]
+    amount = _parse_amount(amount_match.group(1))
+    if amount <= 0:
+        return [], 0.0
+    remainder = remainder[:amount_match.start()] + " " + remainder[amount_match.end():]
+
+    words = [word for word in _WORD_RE.findall(remainder) if word.lower() not in _CURRENCY_WORDS]
+    category = None
+    for word in words:
+        category = category_index.lookup_word(word, user_id)
+        if category:
+            break
+
+    description_words = [word for word in words if word.lower() not in _FILLER_WORDS]
+    if not description_words:
+        return [], 0.0
+
+    confidence = 1.0
+    if category is None:
+        # Unknown vocabulary: the LLM is better at guessing the category
+        category = "Other"
+        confidence = 0.5
+    if len(description_words) > _MAX_DESCRIPTION_WORDS:
+        confidence = min(confidence, 0.6)
+
+    item = {
+        "amount": amount,
+        "category": category,
+        "description": " ".join(description_words),
+        "date": date,
+    }
+    return [item], confidence
@@ -1,29 +1,94 @@
+import asyncio
 import logging
+import os
 import re
 import json
+import datetime
+import tempfile
+import time
 import telegram
 from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
-from .llm_parser import parse_expense_data, parse_expense_image_data
-from .sheets_writer import write_expenses_to_sheet
-from .database import User, get_db_session
-from .config import GOOGLE_SERVICE_ACCOUNT_CREDENTIALS_PATH
+from .llm_parser import (
+    parse_expense_data, parse_expense_image_data, parse_expense_image_data_stream, StreamInterruptedError
+)
+from .image_preprocessing import select_photo_size
+from .sheet_queue import refresh_monthly_stats_async
+from .expense_sync import expense_syncer
+from . import ledger
+from .database import User, get_async_db_session
+from .user_cache import user_cache, profile_from_user, PROFILE_CACHE
+from .coordination import invalidation_bus
+from .categories import category_index, CATEGORY_MAPPINGS_CACHE, MAX_TERM_LENGTH, MAX_TERMS_PER_USER
+from .metrics import stage_latency, api_errors
+from .reminders import parse_timezone
+from .importer import statement_importer
+from .config import (
+    GOOGLE_SERVICE_ACCOUNT_CREDENTIALS_PATH, LLM_STREAMING_ENABLED, STREAM_EDIT_INTERVAL,
+    REMINDER_TIME, REMINDER_DEFAULT_TIMEZONE, EXPENSE_CATEGORIES, IMPORT_MAX_FILE_BYTES
+)
 
 logger = logging.getLogger(__name__)
 
 
-async def _ensure_user_exists(user: telegram.User) -> None:
-    session = get_db_session()
+async def _load_user_profile(user_id: int) -> dict | None:
+    """Returns the user's cached profile, reading it from the database on a cache miss."""
+    found, profile = user_cache.lookup(user_id)
+    if found:
+        return profile
+    with stage_latency.time("db_lookup"):
+        async with get_async_db_session() as session:
+            user_record = await session.get(User, user_id)
+            profile = profile_from_user(user_record) if user_record else None
+    user_cache.put(user_id, profile)
+    return profile
+
+async def _ensure_user_exists(user: telegram.User) -> dict:
+    profile = await _load_user_profile(user.id)
+    if profile is not None:
+        return profile
+    async with get_async_db_session() as session:
+        new_user = User(id=user.id, first_name=user.first_name)
+        session.add(new_user)
+        # Other workers may have cached that this user is not registered
+        invalidation_bus.publish(session, PROFILE_CACHE, user.id)
+        await session.commit()
+        profile = profile_from_user(new_user)
+    user_cache.put(user.id, profile)
+    logger.info(f"Added new user: {user.id} ({user.first_name})")
+    return profile
+
+async def _get_spreadsheet_id(user_id: int) -> str | None:
+    """Looks up the user's spreadsheet ID from the profile cache, loading it with the async session on a miss."""
+    profile = await _load_user_profile(user_id)
+    return profile["spreadsheet_id"] if profile else None
+
+def _format_details(expense_dicts: list[dict]) -> str:
+    return "\n".join(
+        f"• {e['amount']:.2f} in '{e['category']}'" + (f" ({e['description']})" if e.get('description') else "")
+        for e in expense_dicts
+    )
+
+def _format_stats(stats: dict) -> str:
+    return f"📊 Monthly Status:\n  Total: {stats.get('total', 'N/A')}\n  Limit: {stats.get('limit', 'N/A')}\n  Left:  {stats.get('left', 'N/A')}"
+
+async def _confirm_sheet_write(reply: telegram.Message, text: str, synced: asyncio.Future) -> None:
+    """Edits a confirmation once the (possibly merged) sheet write for its expenses lands."""
+    if await synced:
+        status = "☁️ Saved to Google Sheet."
+    else:
+        status = "⚠️ Google Sheet not updated yet, it will be retried automatically."
     try:
-        existing_user = session.query(User).filter(User.id == user.id).first()
-        if not existing_user:
-            new_user = User(id=user.id, first_name=user.first_name)
-            session.add(new_user)
-            session.commit()
-            logger.info(f"Added new user: {user.id} ({user.first_name})")
-    finally:
-        session.close()
+        await reply.edit_text(f"{text}\n\n{status}")
+    except telegram.error.TelegramError as e:
+        logger.warning(f"Could not update confirmation message: {e}")
+
+async def _reply_added(message: telegram.Message, context: ContextTypes.DEFAULT_TYPE, text: str, synced: asyncio.Future) -> None:
+    with stage_latency.time("reply_send"):
+        reply = await message.reply_text(f"{text}\n\n⏳ Saving to Google Sheet...")
+    # Not awaited here: the handler finishes while the user's burst is still being collected
+    context.application.create_task(_confirm_sheet_write(reply, text, synced))
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Sends explanation on how to use the bot."""
@@ -80,6 +145,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     After setup, you can:
     \- Send text expenses like "Lunch $15"
     \- Or send receipt photos 📸
+    \- Get the daily reminder in your own timezone: `/timezone Europe/Berlin`
+    \- Teach the bot your own words: `/category starbucks Food`
+    \- Import past expenses from a CSV or bank statement: `/import`
 
     Let's get started\! 💰
 """
@@ -99,76 +167,97 @@ async def _process_text_message(update: Update, context: ContextTypes.DEFAULT_TY
 
     expense_dicts = [e if isinstance(e, dict) else e.__dict__ for e in expenses]
     
-    session = get_db_session()
-    try:
-        user_record = session.query(User).filter(User.id == user.id).first()
-        if not user_record or not user_record.spreadsheet_id:
-            await message.reply_text("❌ Error: Please set your Google Sheet ID first using the /setsheet command.")
-            logger.error(f"No spreadsheet_id set for user {user.id}")
-            return
-            
-        # Try writing expenses and get stats
-        stats = write_expenses_to_sheet(expense_dicts, spreadsheet_id=user_record.spreadsheet_id)
-        if stats is None:
-            await message.reply_text("❌ Error: Could not save expenses to Google Sheet. Please check configuration and sheet access.")
-            return
-    finally:
-        session.close()
+    spreadsheet_id = await _get_spreadsheet_id(user.id)
+    if not spreadsheet_id:
+        await message.reply_text("❌ Error: Please set your Google Sheet ID first using the /setsheet command.")
+        logger.error(f"No spreadsheet_id set for user {user.id}")
+        return
 
-    details = "\n".join(
-        f"• {e['amount']:.2f} in '{e['category']}'" + (f" ({e['description']})" if e.get('description') else "")
-        for e in expense_dicts
-    )
+    # Store expenses locally; the syncer copies them to the sheet in the background
+    stats = await ledger.add_expenses(user.id, expense_dicts)
+    if stats is None:
+        await message.reply_text("❌ Error: Could not save expenses. Please try again.")
+        return
+    synced = expense_syncer.notify(user.id, spreadsheet_id)
+
+    details = _format_details(expense_dicts)
     
     # Prepare stats message
-    stats_message = f"\n\n📊 Monthly Status:\n  Total: {stats.get('total', 'N/A')}\n  Limit: {stats.get('limit', 'N/A')}\n  Left:  {stats.get('left', 'N/A')}"
+    stats_message = f"\n\n{_format_stats(stats)}"
 
-    await message.reply_text(f"✅ Added {len(expense_dicts)} expense(s) to Google Sheet:\n{details}{stats_message}")
+    await _reply_added(message, context, f"✅ Added {len(expense_dicts)} expense(s):\n{details}{stats_message}", synced)
+
+async def _collect_streamed_expenses(progress_message: telegram.Message, image_bytes: bytearray, user_id: int) -> list[dict]:
+    """
+    Collects expenses streamed from the LLM, editing the progress message as they arrive.
+
+    If the stream breaks off, the expenses received so far are dropped rather than
+    saved as the whole receipt, and the image is parsed again without streaming.
+    """
+    expenses = []
+    last_edit = time.monotonic()
+    try:
+        async for expense in parse_expense_image_data_stream(image_bytes, user_id):
+            expenses.append(expense)
+            if time.monotonic() - last_edit < STREAM_EDIT_INTERVAL:
+                continue
+            last_edit = time.monotonic()
+            try:
+                await progress_message.edit_text(f"⏳ Found {len(expenses)} expense(s) so far:\n{_format_details(expenses)}")
+            except telegram.error.TelegramError as e:
+                logger.warning(f"Could not update progress message: {e}")
+    except StreamInterruptedError as e:
+        logger.warning(f"Receipt stream for user {user_id} broke off after {len(expenses)} expense(s) ({e}), parsing it again")
+        try:
+            await progress_message.edit_text("⏳ The answer was cut off, analyzing the image again...")
+        except telegram.error.TelegramError as edit_error:
+            logger.warning(f"Could not update progress message: {edit_error}")
+        return await parse_expense_image_data(image_bytes=image_bytes, user_id=user_id)
+    return expenses
 
 async def _process_photo_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Processes photo messages containing receipt images."""
     message = update.message
     user = message.from_user
     logger.info(f"Received photo message from {user.id}")
-    await message.reply_text("⏳ Analyzing image for expenses...")
+    progress_message = await message.reply_text("⏳ Analyzing image for expenses...")
 
     try:
-        photo = message.photo[-1]
-        file = await context.bot.get_file(photo.file_id)
-        image_bytes = await file.download_as_bytearray()
+        # The smallest size that is still readable keeps the download and upload small
+        photo = select_photo_size(message.photo)
+        with stage_latency.time("file_download"):
+            file = await context.bot.get_file(photo.file_id)
+            image_bytes = await file.download_as_bytearray()
 
-        expenses = await parse_expense_image_data(image_bytes=image_bytes, user_id=user.id)
+        if LLM_STREAMING_ENABLED:
+            expenses = await _collect_streamed_expenses(progress_message, image_bytes, user.id)
+        else:
+            expenses = await parse_expense_image_data(image_bytes=image_bytes, user_id=user.id)
         if not expenses:
             await message.reply_text("❌ Error: Could not extract expenses from the image. Please ensure it's clear.")
             return
 
         expense_dicts = [e if isinstance(e, dict) else e.__dict__ for e in expenses]
         
-        session = get_db_session()
-        try:
-            user_record = session.query(User).filter(User.id == user.id).first()
-            if not user_record or not user_record.spreadsheet_id:
-                await message.reply_text("❌ Error: Please set your Google Sheet ID first using the /setsheet command.")
-                logger.error(f"No spreadsheet_id set for user {user.id}")
-                return
-                
-            # Try writing expenses and get stats
-            stats = write_expenses_to_sheet(expense_dicts, spreadsheet_id=user_record.spreadsheet_id)
-            if stats is None:
-                await message.reply_text("❌ Error: Could not save expenses to Google Sheet. Please check configuration and sheet access.")
-                return
-        finally:
-            session.close()
+        spreadsheet_id = await _get_spreadsheet_id(user.id)
+        if not spreadsheet_id:
+            await message.reply_text("❌ Error: Please set your Google Sheet ID first using the /setsheet command.")
+            logger.error(f"No spreadsheet_id set for user {user.id}")
+            return
 
-        details = "\n".join(
-            f"• {e['amount']:.2f} in '{e['category']}'" + (f" ({e['description']})" if e.get('description') else "")
-            for e in expense_dicts
-        )
+        # Store expenses locally; the syncer copies them to the sheet in the background
+        stats = await ledger.add_expenses(user.id, expense_dicts)
+        if stats is None:
+            await message.reply_text("❌ Error: Could not save expenses. Please try again.")
+            return
+        synced = expense_syncer.notify(user.id, spreadsheet_id)
+
+        details = _format_details(expense_dicts)
         
         # Prepare stats message
-        stats_message = f"\n\n📊 Monthly Status:\n  Total: {stats.get('total', 'N/A')}\n  Limit: {stats.get('limit', 'N/A')}\n  Left:  {stats.get('left', 'N/A')}"
+        stats_message = f"\n\n{_format_stats(stats)}"
 
-        await message.reply_text(f"✅ Added {len(expense_dicts)} expense(s) from the image to Google Sheet:\n{details}{stats_message}")
+        await _reply_added(message, context, f"✅ Added {len(expense_dicts)} expense(s) from the image:\n{details}{stats_message}", synced)
     except Exception as e:
         logger.error(f"Error processing photo message: {e}", exc_info=True)
         await message.reply_text("❌ An error occurred while processing the image.")
@@ -180,19 +269,24 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     
     # Check if user exists in database, create if not
     await _ensure_user_exists(user)
+    await category_index.load_user(user.id)
 
     logger.info(f"Received message from {user.first_name}")
 
     if message.text:
-        await _process_text_message(update, context)
+        with stage_latency.time("text_message"):
+            await _process_text_message(update, context)
     elif message.photo:
-        await _process_photo_message(update, context)
+        with stage_latency.time("photo_message"):
+            await _process_photo_message(update, context)
     else:
         logger.info("Received non-text/non-photo message.")
         await message.reply_text("Sorry, I can only process text and photo messages for now.")
 
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Log Errors caused by Updates."""
+    api_errors.inc("telegram" if isinstance(context.error, telegram.error.TelegramError) else "handler",
+                   type(context.error).__name__)
     logger.error(msg="Exception while handling an update:", exc_info=context.error)
 
 async def set_spreadsheet_id(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -208,20 +302,245 @@ async def set_spreadsheet_id(update: Update, context: ContextTypes.DEFAULT_TYPE)
     # Check if input is a Google Sheet URL and extract ID if so
     match = re.search(r"/spreadsheets/d/([a-zA-Z0-9-_]+)", input_value)
     spreadsheet_id = match.group(1) if match else input_value
-    session = get_db_session()
     try:
-        db_user = session.query(User).filter(User.id == user.id).first()
-        if not db_user:
-            await update.message.reply_text("❌ Error: Could not find your user record. Please send any message first to register.")
-            logger.error(f"User {user.id} not found in database")
-            return
-            
-        db_user.spreadsheet_id = spreadsheet_id
-        session.commit()
+        async with get_async_db_session() as session:
+            db_user = await session.get(User, user.id)
+            if not db_user:
+                await update.message.reply_text("❌ Error: Could not find your user record. Please send any message first to register.")
+                logger.error(f"User {user.id} not found in database")
+                return
+
+            db_user.spreadsheet_id = spreadsheet_id
+            invalidation_bus.publish(session, PROFILE_CACHE, user.id)
+            await session.commit()
+            user_cache.put(user.id, profile_from_user(db_user))
         await update.message.reply_text("✅ Spreadsheet ID updated successfully!")
         logger.info(f"Updated spreadsheet_id for user {user.id}")
     except Exception as e:
+        user_cache.invalidate(user.id)
         await update.message.reply_text("❌ Error: Could not update spreadsheet ID. Please try again.")
         logger.error(f"Error updating spreadsheet_id for user {user.id}: {e}", exc_info=True)
+
+async def set_monthly_limit(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handles /limit command to update user's monthly spending limit."""
+    user = update.effective_user
+    logger.info(f"Received /limit command from {user.id}")
+
+    if not context.args or len(context.args) != 1:
+        await update.message.reply_text("Usage: /limit <amount>")
+        return
+
+    try:
+        limit = abs(float(context.args[0].replace(",", ".")))
+    except ValueError:
+        await update.message.reply_text("❌ Error: The limit must be a number, e.g. /limit 1500")
+        return
+
+    try:
+        async with get_async_db_session() as session:
+            db_user = await session.get(User, user.id)
+            if not db_user:
+                await update.message.reply_text("❌ Error: Could not find your user record. Please send any message first to register.")
+                logger.error(f"User {user.id} not found in database")
+                return
+
+            db_user.monthly_limit = limit
+            invalidation_bus.publish(session, PROFILE_CACHE, user.id)
+            await session.commit()
+            user_cache.put(user.id, profile_from_user(db_user))
+        await update.message.reply_text(f"✅ Monthly limit set to {limit:.2f}")
+        logger.info(f"Updated monthly_limit for user {user.id}")
+    except Exception as e:
+        user_cache.invalidate(user.id)
+        await update.message.reply_text("❌ Error: Could not update monthly limit. Please try again.")
+        logger.error(f"Error updating monthly_limit for user {user.id}: {e}", exc_info=True)
+
+async def set_timezone(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handles /timezone command: shows or sets the timezone used for the user's daily reminder."""
+    user = update.effective_user
+    logger.info(f"Received /timezone command from {user.id}")
+
+    if not context.args:
+        profile = await _load_user_profile(user.id)
+        current = (profile or {}).get("timezone") or REMINDER_DEFAULT_TIMEZONE
+        await update.message.reply_text(
+            f"🕗 Your timezone is {current}; the daily reminder arrives at {REMINDER_TIME} your time.\n"
+            "Usage: /timezone <Area/City>, e.g. /timezone Europe/Berlin"
+        )
+        return
+
+    timezone = context.args[0]
+    if len(context.args) != 1 or parse_timezone(timezone) is None:
+        await update.message.reply_text("❌ Error: Unknown timezone. Use a name like Europe/Berlin or America/New_York.")
+        return
+
+    try:
+        async with get_async_db_session() as session:
+            db_user = await session.get(User, user.id)
+            if not db_user:
+                await update.message.reply_text("❌ Error: Could not find your user record. Please send any message first to register.")
+                logger.error(f"User {user.id} not found in database")
+                return
+
+            db_user.timezone = timezone
+            invalidation_bus.publish(session, PROFILE_CACHE, user.id)
+            await session.commit()
+            user_cache.put(user.id, profile_from_user(db_user))
+        await update.message.reply_text(f"✅ Timezone set to {timezone}. The daily reminder arrives at {REMINDER_TIME} your time.")
+        logger.info(f"Updated timezone for user {user.id}")
+    except Exception as e:
+        user_cache.invalidate(user.id)
+        await update.message.reply_text("❌ Error: Could not update timezone. Please try again.")
+        logger.error(f"Error updating timezone for user {user.id}: {e}", exc_info=True)
+
+async def show_monthly_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handles /stats command: reconciles this month's total with the sheet and shows it."""
+    user = update.effective_user
+    logger.info(f"Received /stats command from {user.id}")
+
+    spreadsheet_id = await _get_spreadsheet_id(user.id)
+    if not spreadsheet_id:
+        await update.message.reply_text("❌ Error: Please set your Google Sheet ID first using the /setsheet command.")
+        return
+
+    month = datetime.datetime.utcnow().strftime('%m-%Y')
+    stats = await refresh_monthly_stats_async(user.id, spreadsheet_id, month)
+    if stats is None:
+        await update.message.reply_text("❌ Error: Could not read your Google Sheet. Please check configuration and sheet access.")
+        return
+    await update.message.reply_text(_format_stats(stats))
+
+async def set_category_mapping(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handles /category command: lists the user's own terms or files a term under a category."""
+    user = update.effective_user
+    logger.info(f"Received /category command from {user.id}")
+    usage = (f"Usage: /category <word or words> <category>, e.g. /category starbucks Food\n"
+             f"Categories: {', '.join(EXPENSE_CATEGORIES)}")
+
+    if not context.args:
+        await category_index.load_user(user.id)
+        mappings = category_index.mappings(user.id)
+        listing = "\n".join(f"• {term} → {category}" for term, category in sorted(mappings.items()))
+        await update.message.reply_text(f"🏷 Your terms:\n{listing}\n\n{usage}" if listing else usage)
+        return
+
+    category = category_index.canonical(context.args[-1])
+    term = " ".join(context.args[:-1])
+    if len(context.args) < 2 or category is None:
+        await update.message.reply_text(f"❌ Error: Unknown category or missing term.\n{usage}")
+        return
+
+    profile = await _load_user_profile(user.id)
+    if profile is None:
+        await update.message.reply_text("❌ Error: Could not find your user record. Please send any message first to register.")
+        return
+
+    try:
+        learned = await category_index.learn(
+            user.id, term, category,
+            publish=lambda session: invalidation_bus.publish(session, CATEGORY_MAPPINGS_CACHE, user.id)
+        )
+    except Exception as e:
+        category_index.forget_user(user.id)
+        await update.message.reply_text("❌ Error: Could not save the category. Please try again.")
+        logger.error(f"Error saving category mapping for user {user.id}: {e}", exc_info=True)
+        return
+    if not learned:
+        await update.message.reply_text(
+            f"❌ Error: Terms can be up to {MAX_TERM_LENGTH} characters long and you can keep up to "
+            f"{MAX_TERMS_PER_USER} of them; file an existing term under another category instead."
+        )
+        return
+    await update.message.reply_text(f"✅ Expenses mentioning '{term}' will be filed under {category}.")
+    logger.info(f"Updated category mapping for user {user.id}")
+
+IMPORT_USAGE = (
+    "📥 Send a CSV export or bank statement as a file to import past expenses.\n"
+    "It needs a date column and an amount column (or debit and credit columns); a description "
+    "or payee column and a category column are used when present. In statements with signed "
+    "amounts only negative amounts are imported, income is skipped. Expenses already imported "
+    "from the same or an overlapping statement (e.g. January-March, then February-April) are "
+    "not added twice."
+)
+
+async def import_statement_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handles /import command: explains how to send a file for a bulk import."""
+    logger.info(f"Received /import command from {update.effective_user.id}")
+    await update.message.reply_text(IMPORT_USAGE)
+
+def _format_import_summary(summary: dict) -> str:
+    lines = [f"✅ Imported {summary['imported']} expense(s) into {summary['months']} monthly sheet(s)."]
+    if summary["categorized_by_llm"] or summary["uncategorized"]:
+        lines.append(f"🏷 {summary['categorized_by_llm']} categorized by the LLM, {summary['uncategorized']} left as Other.")
+    skipped = [f"{summary[key]} {label}" for key, label in (
+        ("duplicates", "already imported"), ("income", "income"), ("invalid", "unreadable")
+    ) if summary[key]]
+    if skipped:
+        lines.append(f"Skipped rows: {', '.join(skipped)}.")
+    if summary["retrying"]:
+        lines.append(f"⚠️ {summary['retrying']} expense(s) are not in the Google Sheet yet; they will be retried automatically.")
+    if summary["failed"]:
+        lines.append(f"❌ {summary['failed']} expense(s) could not be saved. Send the file again to retry them.")
+    return "\n".join(lines)
+
+async def _run_import(document: telegram.Document, progress_message: telegram.Message,
+                      context: ContextTypes.DEFAULT_TYPE, user_id: int, spreadsheet_id: str) -> None:
+    """Downloads the file to disk and streams it into the user's expenses, editing the progress message."""
+    fd, path = tempfile.mkstemp(prefix="import-", suffix=".csv")
+    os.close(fd)
+    last_edit = time.monotonic()
+
+    async def progress(summary: dict) -> None:
+        nonlocal last_edit
+        if time.monotonic() - last_edit < STREAM_EDIT_INTERVAL:
+            return
+        last_edit = time.monotonic()
+        await progress_message.edit_text(f"⏳ Importing... {summary['written']} expense(s) written so far.")
+
+    try:
+        with stage_latency.time("file_download"):
+            file = await context.bot.get_file(document.file_id)
+            await file.download_to_drive(path)
+        with open(path, encoding="utf-8-sig", errors="replace", newline="") as lines:
+            summary = await statement_importer.run(lines, user_id, spreadsheet_id, progress)
+        if summary.get("error"):
+            text = f"❌ Error: Could not import the file: {summary['error']}.\n\n{IMPORT_USAGE}"
+        else:
+            text = _format_import_summary(summary)
+    except Exception as e:
+        logger.error(f"Error importing file for user {user_id}: {e}", exc_info=True)
+        text = "❌ An error occurred while importing the file."
     finally:
-        session.close()
\ No newline at end of file
+        os.remove(path)
+    try:
+        await progress_message.edit_text(text)
+    except telegram.error.TelegramError as e:
+        logger.warning(f"Could not update import message: {e}")
+
+async def handle_import_document(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handles documents: a CSV file is imported in the background, other files are refused."""
+    message = update.message
+    user = message.from_user
+    document = message.document
+    logger.info(f"Received document from {user.id}: {document.file_name} ({document.file_size} bytes)")
+    await _ensure_user_exists(user)
+
+    name = (document.file_name or "").lower()
+    if not (name.endswith((".csv", ".txt")) or (document.mime_type or "").startswith("text/")):
+        await message.reply_text(f"❌ Error: Only CSV files can be imported.\n\n{IMPORT_USAGE}")
+        return
+    if document.file_size and document.file_size > IMPORT_MAX_FILE_BYTES:
+        await message.reply_text(f"❌ Error: The file is too large; split it into files of up to "
+                                 f"{IMPORT_MAX_FILE_BYTES // (1024 * 1024)} MB.")
+        return
+    spreadsheet_id = await _get_spreadsheet_id(user.id)
+    if not spreadsheet_id:
+        await message.reply_text("❌ Error: Please set your Google Sheet ID first using the /setsheet command.")
+        return
+    if statement_importer.running(user.id):
+        await message.reply_text("⏳ Your previous import is still running; send the file again once it is done.")
+        return
+
+    progress_message = await message.reply_text("⏳ Importing...")
+    # Not awaited: a long import must not hold up the other updates on this user's shard
+    context.application.create_task(_run_import(document, progress_message, context, user.id, spreadsheet_id))
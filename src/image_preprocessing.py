@@ -0,0 +1,86 @@
+import io
+import base64
+import logging
+
+from .config import IMAGE_MIN_SIDE, IMAGE_MAX_SIDE, IMAGE_TARGET_BYTES, IMAGE_GRAYSCALE, IMAGE_JPEG_QUALITY
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional: without it images are sent as downloaded
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+_MIN_JPEG_QUALITY = 40
+_BASE64_CHUNK_BYTES = 3 * 16 * 1024  # Multiple of 3, so chunks encode without padding
+
+
+def select_photo_size(photo_sizes: list):
+    """
+    Picks the smallest Telegram PhotoSize whose longer side is at least IMAGE_MIN_SIDE.
+
+    Args:
+        photo_sizes: message.photo, ordered from smallest to largest as Telegram sends it.
+
+    Returns:
+        The chosen PhotoSize, or the largest one if none is big enough.
+    """
+    for photo_size in photo_sizes:
+        if max(photo_size.width, photo_size.height) >= IMAGE_MIN_SIDE:
+            return photo_size
+    return photo_sizes[-1]
+
+def _encode_jpeg(image, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue()
+
+def prepare_image(image_bytes: bytes | bytearray) -> bytes:
+    """
+    Downscales, optionally grayscales and re-encodes an image as JPEG within
+    IMAGE_MAX_SIDE pixels and, where possible, IMAGE_TARGET_BYTES bytes.
+
+    Returns:
+        The re-encoded JPEG, or the original bytes if Pillow is unavailable, the image
+        cannot be decoded, or re-encoding would not make it smaller.
+    """
+    if Image is None:
+        return bytes(image_bytes)
+
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as source:
+            image = ImageOps.exif_transpose(source)
+            image = image.convert("L" if IMAGE_GRAYSCALE else "RGB")
+    except Exception as e:
+        logger.warning(f"Could not decode image for preprocessing, sending original: {e}")
+        return bytes(image_bytes)
+
+    image.thumbnail((IMAGE_MAX_SIDE, IMAGE_MAX_SIDE), Image.LANCZOS)
+
+    quality = IMAGE_JPEG_QUALITY
+    encoded = _encode_jpeg(image, quality)
+    while len(encoded) > IMAGE_TARGET_BYTES:
+        if quality - 10 >= _MIN_JPEG_QUALITY:
+            quality -= 10
+        elif min(image.size) > 512:
+            # Quality alone is not enough: shrink further and start over
+            image = image.resize((image.width * 3 // 4, image.height * 3 // 4), Image.LANCZOS)
+            quality = IMAGE_JPEG_QUALITY
+        else:
+            break
+        encoded = _encode_jpeg(image, quality)
+
+    if len(encoded) >= len(image_bytes):
+        return bytes(image_bytes)
+    logger.info(f"Preprocessed image: {len(image_bytes)} -> {len(encoded)} bytes, {image.width}x{image.height}, quality {quality}")
+    return encoded
+
+def base64_encoded_length(byte_count: int) -> int:
+    """Length of the padded base64 encoding of byte_count bytes."""
+    return 4 * ((byte_count + 2) // 3)
+
+def iter_base64_chunks(data: bytes | bytearray):
+    """Yields the base64 encoding of data in chunks, never holding the full encoded copy."""
+    view = memoryview(data)
+    for start in range(0, len(view), _BASE64_CHUNK_BYTES):
+        yield base64.b64encode(view[start:start + _BASE64_CHUNK_BYTES])
@@ -0,0 +1,343 @@
+import argparse
+import asyncio
+import datetime
+import hashlib
+import itertools
+import logging
+import re
+import sys
+import uuid
+from collections import Counter, OrderedDict
+from typing import Awaitable, Callable, Iterable, Iterator
+
+from .config import (
+    IMPORT_CHUNK_ROWS, IMPORT_LLM_BATCH_SIZE, IMPORT_APPEND_MAX_ROWS, IMPORT_MAX_OPEN_MONTHS
+)
+from . import ledger
+from .categories import OTHER, category_index, normalize_term
+from .database import User, init_db, get_db_session, dispose_async_engine
+from .expense_sync import sync_claimed_expenses
+from .llm_parser import categorize_descriptions, close_http_client
+from .sheet_queue import sheet_write_queue
+from .statement_parser import StatementReader
+
+logger = logging.getLogger(__name__)
+
+_DIGITS_RE = re.compile(r"\d+")
+_MEMO_SIZE = 10_000  # Categories remembered per import for lines that differ only in digits
+_OCCURRENCE_DATES = 62  # Dates whose row counts are kept; a statement sorted by date needs one
+
+
+def _chunks(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+def _row_content(expense: dict) -> str:
+    return f"{expense['timestamp'].isoformat()}|{expense['amount']:.2f}|{expense.get('description') or ''}"
+
+def import_expense_id(user_id: int, expense: dict, occurrence: int | None) -> str:
+    """
+    ExpenseID of an imported row, derived from its content.
+
+    Two coffees at the same price on the same day are told apart by occurrence,
+    how many rows with that content the file has had so far. An export that
+    overlaps an earlier one (January-March, then February-April) has the same
+    rows on the shared days, so they get the same IDs and are recognized as
+    already stored. With occurrence None, the row's line number is used instead;
+    the row is then only recognized when the same file is imported again.
+    """
+    marker = occurrence if occurrence is not None else f"line {expense['line']}"
+    key = f"{user_id}|{_row_content(expense)}|{marker}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+class _Occurrences:
+    """
+    Counts how often each row content has occurred so far in a file, per date.
+
+    Only the counts of the last _OCCURRENCE_DATES dates are kept, so memory does not
+    grow with the file. A row dated on a day whose counts were dropped (a file far
+    from sorted) gets None; counting from one again would give it the ID of an
+    earlier row and drop it as a duplicate.
+    """
+
+    __slots__ = ("_counts", "_dropped")
+
+    def __init__(self):
+        self._counts: OrderedDict[datetime.date, Counter] = OrderedDict()
+        self._dropped: set[datetime.date] = set()
+
+    def next(self, expense: dict) -> int | None:
+        date = expense["timestamp"].date()
+        if date in self._dropped:
+            return None
+        counts = self._counts.get(date)
+        if counts is None:
+            counts = self._counts[date] = Counter()
+            if len(self._counts) > _OCCURRENCE_DATES:
+                self._dropped.add(self._counts.popitem(last=False)[0])
+        else:
+            self._counts.move_to_end(date)
+        content = _row_content(expense)
+        counts[content] += 1
+        return counts[content]
+
+
+class _ImportRun:
+    """State of one import: month buffers, the sheet write in flight and the summary."""
+
+    __slots__ = (
+        "user_id", "spreadsheet_id", "buffers", "write", "write_rows", "memo", "occurrences", "months", "summary"
+    )
+
+    def __init__(self, user_id: int, spreadsheet_id: str):
+        self.user_id = user_id
+        self.spreadsheet_id = spreadsheet_id
+        self.buffers: OrderedDict[str, list[dict]] = OrderedDict()  # Month -> rows, least recently added first
+        self.write: asyncio.Future | None = None
+        self.write_rows = 0
+        self.memo: dict[str, str] = {}
+        self.occurrences = _Occurrences()
+        self.months: set[str] = set()
+        self.summary = {
+            "rows": 0, "imported": 0, "written": 0, "retrying": 0, "duplicates": 0, "income": 0, "invalid": 0,
+            "failed": 0, "categorized_by_llm": 0, "uncategorized": 0, "months": 0, "appends": 0, "error": None,
+        }
+
+
+class StatementImporter:
+    """
+    Streams a CSV export or bank statement into a user's ledger and monthly sheets.
+
+    Rows are read with StatementReader and handled chunk_rows at a time. Each chunk
+    is categorized with the local rules first (the file's own category label, the
+    user's /category terms, synonyms in the description); the lines those leave in
+    "Other" go to the LLM, llm_batch_size distinct lines per request.
+
+    Categorized rows are buffered per MM-YYYY month. A month is flushed, i.e. stored
+    with ledger.add_imported_expenses and written with a single append_rows, once
+    more than max_open_months months are open; bank statements are sorted by date,
+    so each month is written once. A month buffer never holds more than
+    append_max_rows rows, so memory stays flat whatever the file size; an unsorted
+    file only costs extra appends. While one month is being written to the sheet
+    the next chunks are read and categorized.
+    """
+
+    def __init__(
+        self,
+        chunk_rows: int = IMPORT_CHUNK_ROWS,
+        llm_batch_size: int = IMPORT_LLM_BATCH_SIZE,
+        append_max_rows: int = IMPORT_APPEND_MAX_ROWS,
+        max_open_months: int = IMPORT_MAX_OPEN_MONTHS
+    ):
+        self._chunk_rows = chunk_rows
+        self._llm_batch_size = llm_batch_size
+        self._append_max_rows = append_max_rows
+        self._max_open_months = max(1, max_open_months)
+        self._running: set[int] = set()
+        self._counters = {"imports": 0, "rows": 0, "imported": 0, "duplicates": 0, "llm_requests": 0, "appends": 0}
+
+    def running(self, user_id: int) -> bool:
+        """True while an import for the user is in progress."""
+        return user_id in self._running
+
+    async def run(
+        self,
+        lines: Iterable[str],
+        user_id: int,
+        spreadsheet_id: str,
+        progress: Callable[[dict], Awaitable] | None = None
+    ) -> dict:
+        """
+        Imports the expenses in lines (a text file opened with newline="", or any iterable of lines).
+
+        Args:
+            lines: The CSV file's lines.
+            user_id: Telegram user ID the expenses belong to.
+            spreadsheet_id: The user's Google Sheet ID.
+            progress: Optional coroutine function called with the summary after each month is written.
+
+        Returns:
+            The summary: rows read, imported, written to the sheet, left for a retry,
+            skipped as duplicates, income or unreadable, months, appends, and an
+            "error" message if the file could not be read.
+        """
+        if user_id in self._running:
+            return {"error": "An import is already running"}
+        self._running.add(user_id)
+        self._counters["imports"] += 1
+        state = _ImportRun(user_id, spreadsheet_id)
+        reader = StatementReader(lines)
+        try:
+            await category_index.load_user(user_id)
+            for chunk in _chunks(reader, self._chunk_rows):
+                await self._categorize(state, chunk)
+                for expense in chunk:
+                    expense["user_id"] = user_id
+                    expense["expense_id"] = import_expense_id(user_id, expense, state.occurrences.next(expense))
+                    month = expense["timestamp"].strftime('%m-%Y')
+                    buffer = state.buffers.get(month)
+                    if buffer is None:
+                        buffer = state.buffers[month] = []
+                    state.buffers.move_to_end(month)
+                    buffer.append(expense)
+                    if len(buffer) >= self._append_max_rows:
+                        await self._flush(state, month, progress)
+                while len(state.buffers) > self._max_open_months:
+                    await self._flush(state, next(iter(state.buffers)), progress)
+                await asyncio.sleep(0)  # A chunk that needed no I/O still lets other updates run
+            while state.buffers:
+                await self._flush(state, next(iter(state.buffers)), progress)
+        except ValueError as e:
+            state.summary["error"] = str(e)
+        except Exception as e:
+            logger.error(f"Import for user {user_id} failed: {e}", exc_info=True)
+            state.summary["error"] = "Unexpected error while importing"
+        finally:
+            await self._finish_write(state, progress)
+            self._running.discard(user_id)
+
+        summary = state.summary
+        summary.update(rows=reader.rows, income=reader.income, invalid=reader.invalid, months=len(state.months))
+        self._counters["rows"] += reader.rows
+        logger.info(f"Import for user {user_id} finished: {summary}")
+        return summary
+
+    async def _categorize(self, state: _ImportRun, chunk: list[dict]) -> None:
+        """Maps each row's label or description to a category, asking the LLM about the rest in batches."""
+        unknown: dict[str, list[dict]] = {}
+        for expense in chunk:
+            description = expense["description"]
+            expense["category"] = category_index.resolve(expense["category"], state.user_id, description)
+            if expense["category"] != OTHER or not description or not self._llm_batch_size:
+                continue
+            # "CARD 4411 TESCO 0312" and "CARD 5102 TESCO 0419" are one question for the LLM
+            key = normalize_term(_DIGITS_RE.sub(" ", description))
+            if key in state.memo:
+                expense["category"] = state.memo[key]
+                state.summary["categorized_by_llm"] += expense["category"] != OTHER
+            elif key:
+                unknown.setdefault(key, []).append(expense)
+
+        if unknown:
+            keys = list(unknown)
+            batches = [keys[start:start + self._llm_batch_size] for start in range(0, len(keys), self._llm_batch_size)]
+            self._counters["llm_requests"] += len(batches)
+            answers = await asyncio.gather(*(
+                categorize_descriptions({str(n): unknown[key][0]["description"] for n, key in enumerate(batch)})
+                for batch in batches
+            ))
+            if len(state.memo) + len(keys) > _MEMO_SIZE:
+                state.memo.clear()
+            for batch, answer in zip(batches, answers):
+                for n, key in enumerate(batch):
+                    label = answer.get(str(n))
+                    if label is None:
+                        continue  # Not answered; a later chunk asks again
+                    category = category_index.resolve(label, state.user_id)
+                    state.memo[key] = category
+                    for expense in unknown[key]:
+                        expense["category"] = category
+                    if category != OTHER:
+                        state.summary["categorized_by_llm"] += len(unknown[key])
+
+        state.summary["uncategorized"] += sum(1 for expense in chunk if expense["category"] == OTHER)
+
+    async def _flush(self, state: _ImportRun, month: str, progress) -> None:
+        """Stores a month's buffered rows and starts their sheet write once the previous one is done."""
+        expenses = state.buffers.pop(month)
+        claim_token = uuid.uuid4().hex
+        stored = await ledger.add_imported_expenses(state.user_id, expenses, claim_token)
+        if stored is None:
+            state.summary["failed"] += len(expenses)
+            return
+        state.summary["duplicates"] += len(expenses) - len(stored)
+        self._counters["duplicates"] += len(expenses) - len(stored)
+        if not stored:
+            return
+        state.summary["imported"] += len(stored)
+        self._counters["imported"] += len(stored)
+        state.months.add(month)
+
+        await self._finish_write(state, progress)
+        state.write = asyncio.ensure_future(sheet_write_queue.submit(
+            state.spreadsheet_id, sync_claimed_expenses, state.user_id, state.spreadsheet_id, claim_token, stored
+        ))
+        state.write_rows = len(stored)
+        state.summary["appends"] += 1
+        self._counters["appends"] += 1
+
+    async def _finish_write(self, state: _ImportRun, progress) -> None:
+        """Waits for the sheet write in flight, if any, and reports progress."""
+        if state.write is None:
+            return
+        try:
+            written = await state.write
+        except Exception as e:
+            logger.error(f"Sheet write of imported expenses for user {state.user_id} failed: {e}")
+            written = False
+        state.summary["written" if written else "retrying"] += state.write_rows
+        state.write = None
+        if progress is not None:
+            try:
+                await progress(state.summary)
+            except Exception as e:
+                logger.warning(f"Import progress callback failed: {e}")
+
+    def stats(self) -> dict:
+        return {**self._counters, "running": len(self._running)}
+
+
+statement_importer = StatementImporter()
+
+
+async def _import_file(args) -> int:
+    session = get_db_session()
+    try:
+        user = session.get(User, args.user)
+        if user is None and args.spreadsheet:
+            user = User(id=args.user, spreadsheet_id=args.spreadsheet)
+            session.add(user)
+            session.commit()
+        spreadsheet_id = args.spreadsheet or (user.spreadsheet_id if user else None)
+    finally:
+        session.close()
+    if not spreadsheet_id:
+        print(f"ERROR: User {args.user} has no spreadsheet; pass --spreadsheet")
+        return 1
+
+    importer = StatementImporter(llm_batch_size=0 if args.no_llm else IMPORT_LLM_BATCH_SIZE)
+
+    async def progress(summary: dict) -> None:
+        print(f"{summary['written']} written, {summary['retrying']} left for a retry, "
+              f"{summary['duplicates']} duplicates so far")
+
+    try:
+        with open(args.path, encoding=args.encoding, errors="replace", newline="") as lines:
+            summary = await importer.run(lines, args.user, spreadsheet_id, progress)
+    finally:
+        await close_http_client()
+        sheet_write_queue.shutdown()
+        await dispose_async_engine()
+    print(summary)
+    return 1 if summary.get("error") else 0
+
+def main():
+    """Import a CSV export or bank statement from the command line (beside the bot's own main)."""
+    parser = argparse.ArgumentParser(
+        description="Import a CSV export or bank statement into a user's expenses and Google Sheet."
+    )
+    parser.add_argument("path", help="CSV file")
+    parser.add_argument("--user", type=int, required=True, help="Telegram user ID the expenses belong to")
+    parser.add_argument("--spreadsheet", help="Google Sheet ID, if not the user's own or the user is not registered")
+    parser.add_argument("--no-llm", action="store_true", help="Categorize with local rules only")
+    parser.add_argument("--encoding", default="utf-8-sig", help="File encoding, e.g. cp1252 for some bank exports")
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    init_db()
+    sys.exit(asyncio.run(_import_file(args)))
+
+if __name__ == "__main__":
+    main()
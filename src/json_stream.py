@@ -0,0 +1,79 @@
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class JSONArrayStreamParser:
+    """
+    Incrementally extracts the objects of a JSON array from streamed LLM output.
+
+    Text before the first '[' (markdown code fences, prose) is skipped, and each
+    top-level object of the array is returned by feed() as soon as its closing
+    brace arrives. Anything after the array's closing bracket is ignored.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._position = 0  # Next character of _buffer to scan
+        self._depth = 0  # Bracket/brace nesting; 1 means directly inside the array
+        self._in_string = False
+        self._escaped = False
+        self._object_start = None
+        self.done = False
+
+    def feed(self, chunk: str) -> list:
+        """Adds a chunk of output and returns the array elements completed by it."""
+        if self.done or not chunk:
+            return []
+        self._buffer += chunk
+        completed = []
+
+        while self._position < len(self._buffer):
+            char = self._buffer[self._position]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif self._depth == 0:
+                if char == "[":
+                    self._depth = 1
+            elif char == '"':
+                self._in_string = True
+            elif char in "[{":
+                if self._depth == 1 and char == "{":
+                    self._object_start = self._position
+                self._depth += 1
+            elif char in "]}":
+                self._depth -= 1
+                if self._depth == 1 and char == "}" and self._object_start is not None:
+                    element = self._decode(self._buffer[self._object_start:self._position + 1])
+                    if element is not None:
+                        completed.append(element)
+                    self._object_start = None
+                elif self._depth == 0:
+                    self.done = True
+                    break
+            self._position += 1
+
+        self._compact()
+        return completed
+
+    def _decode(self, text: str):
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            logger.warning(f"Skipping malformed element in streamed LLM response: {text}")
+            return None
+
+    def _compact(self) -> None:
+        """Drops scanned text that no pending element needs."""
+        keep_from = self._object_start if self._object_start is not None else self._position
+        if keep_from > 0:
+            self._buffer = self._buffer[keep_from:]
+            self._position -= keep_from
+            if self._object_start is not None:
+                self._object_start = 0
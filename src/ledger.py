@@ -0,0 +1,213 @@
+import logging
+import datetime
+import uuid
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from .config import DEFAULT_MONTHLY_LIMIT, LEDGER_RECONCILE_INTERVAL, EXPENSE_SYNC_CLAIM_TTL
+from .database import Expense, MonthlyLedger, User, engine, get_db_session, get_async_db_session
+from .user_cache import user_cache
+
+logger = logging.getLogger(__name__)
+
+
+def format_stats(total: float, limit: float) -> dict:
+    """Builds the stats dictionary shown to users {'total': ..., 'limit': ..., 'left': ...}."""
+    return {
+        'total': f"{total:.2f}",
+        'limit': f"{limit:.2f}",
+        'left': f"{limit - total:.2f}"
+    }
+
+def _limit_of(user: User | None) -> float:
+    return user.monthly_limit if user and user.monthly_limit is not None else DEFAULT_MONTHLY_LIMIT
+
+def _month_bounds(month: str) -> tuple[datetime.datetime, datetime.datetime]:
+    """Returns the [start, end) timestamps of a month given in MM-YYYY format."""
+    start = datetime.datetime.strptime(month, '%m-%Y')
+    end = (start + datetime.timedelta(days=32)).replace(day=1)
+    return start, end
+
+def _is_stale(entry: MonthlyLedger | None, now: datetime.datetime) -> bool:
+    if entry is None or entry.reconciled_at is None:
+        return True
+    return (now - entry.reconciled_at).total_seconds() >= LEDGER_RECONCILE_INTERVAL
+
+def _pending_amount(user_id: int, month: str):
+    """Scalar subquery: sum of the user's expenses for the month that are not in the sheet yet."""
+    start, end = _month_bounds(month)
+    return select(func.coalesce(func.sum(Expense.amount), 0.0)).where(
+        Expense.user_id == user_id,
+        Expense.timestamp >= start,
+        Expense.timestamp < end,
+        Expense.synced_at.is_(None)
+    ).scalar_subquery()
+
+def _upsert_total(user_id: int, month: str, total, add: bool, **values):
+    """
+    INSERT ... ON CONFLICT DO UPDATE of a month's ledger row, returning the new total.
+
+    With add, total is added to the stored total, otherwise it replaces it. Either
+    way it is one statement, so concurrent handlers, the sheets worker reconciling
+    the month and other worker processes cannot overwrite each other's changes, and
+    two first expenses of a month cannot both try to insert the row.
+    """
+    insert_ = postgresql.insert if engine.dialect.name == "postgresql" else sqlite.insert
+    statement = insert_(MonthlyLedger).values(user_id=user_id, month=month, total=total, **values)
+    new_total = MonthlyLedger.total + statement.excluded.total if add else statement.excluded.total
+    return statement.on_conflict_do_update(
+        index_elements=[MonthlyLedger.user_id, MonthlyLedger.month],
+        set_={"total": new_total, **{name: getattr(statement.excluded, name) for name in values}}
+    ).returning(MonthlyLedger.total)
+
+async def add_expenses(user_id: int, expenses: list[dict]) -> dict | None:
+    """
+    Stores expenses locally and adds them to the user's running monthly totals.
+
+    The rows and the totals are committed in one transaction; copying the rows to
+    the user's sheet is left to the background syncer.
+
+    Args:
+        user_id: Telegram user ID.
+        expenses: Validated expense dictionaries with a datetime 'timestamp'.
+
+    Returns:
+        The stats dictionary {'total': ..., 'limit': ..., 'left': ...} for the month of
+        the first expense, or None if the expenses could not be stored.
+    """
+    try:
+        async with get_async_db_session() as session:
+            amounts_by_month: dict[str, float] = {}
+            for expense in expenses:
+                session.add(Expense(
+                    expense_uid=uuid.uuid4().hex,
+                    user_id=user_id,
+                    timestamp=expense["timestamp"],
+                    amount=float(expense["amount"]),
+                    category=expense["category"],
+                    description=expense.get("description")
+                ))
+                month = expense["timestamp"].strftime('%m-%Y')
+                amounts_by_month[month] = amounts_by_month.get(month, 0.0) + float(expense["amount"])
+
+            totals = {}
+            for month, amount in amounts_by_month.items():
+                totals[month] = (await session.execute(_upsert_total(user_id, month, amount, add=True))).scalar_one()
+
+            # Lets the daily reminder skip users who already logged something today
+            await session.execute(
+                update(User).where(User.id == user_id).values(last_expense_at=datetime.datetime.utcnow())
+            )
+
+            found, profile = user_cache.lookup(user_id)
+            if found and profile is not None and profile["monthly_limit"] is not None:
+                limit = profile["monthly_limit"]
+            else:
+                limit = _limit_of(await session.get(User, user_id))
+            await session.commit()
+
+            first_month = expenses[0]["timestamp"].strftime('%m-%Y')
+            return format_stats(totals[first_month], limit)
+    except Exception as e:
+        logger.error(f"Failed to store expenses for user {user_id}: {e}", exc_info=True)
+        return None
+
+async def add_imported_expenses(user_id: int, expenses: list[dict], claim_token: str) -> list[dict] | None:
+    """
+    Stores a batch of imported expenses locally, claimed for an immediate sheet write.
+
+    Unlike add_expenses, the rows go in with one bulk INSERT, rows whose
+    'expense_id' is already stored (a statement imported twice) are left out, and
+    last_expense_at stays as it is, since old expenses say nothing about today.
+    The rows are inserted claimed by claim_token, as the syncer would claim them,
+    so the periodic sweep leaves them to the importer's own write.
+
+    Args:
+        user_id: Telegram user ID.
+        expenses: Validated expense dictionaries with a datetime 'timestamp' and an 'expense_id'.
+        claim_token: Token the rows are claimed with.
+
+    Returns:
+        The expenses that were new and stored, or None if they could not be stored.
+    """
+    try:
+        async with get_async_db_session() as session:
+            existing = set()
+            for start in range(0, len(expenses), 500):
+                chunk = [expense["expense_id"] for expense in expenses[start:start + 500]]
+                existing.update((await session.execute(
+                    select(Expense.expense_uid).where(Expense.expense_uid.in_(chunk))
+                )).scalars())
+            new = [expense for expense in expenses if expense["expense_id"] not in existing]
+            if not new:
+                return new
+
+            now = datetime.datetime.utcnow()
+            await session.execute(insert(Expense), [{
+                "expense_uid": expense["expense_id"],
+                "user_id": user_id,
+                "timestamp": expense["timestamp"],
+                "amount": float(expense["amount"]),
+                "category": expense["category"],
+                "description": expense.get("description"),
+                "created_at": now,
+                "sync_attempts": 1,
+                "claimed_by": claim_token,
+                "next_attempt_at": now + datetime.timedelta(seconds=EXPENSE_SYNC_CLAIM_TTL),
+            } for expense in new])
+
+            amounts_by_month: dict[str, float] = {}
+            for expense in new:
+                month = expense["timestamp"].strftime('%m-%Y')
+                amounts_by_month[month] = amounts_by_month.get(month, 0.0) + float(expense["amount"])
+            for month, amount in amounts_by_month.items():
+                await session.execute(_upsert_total(user_id, month, amount, add=True))
+            await session.commit()
+            return new
+    except Exception as e:
+        logger.error(f"Failed to store imported expenses for user {user_id}: {e}", exc_info=True)
+        return None
+
+def needs_reconcile(user_id: int, month: str) -> bool:
+    """True if the month's total is new or was last reconciled over LEDGER_RECONCILE_INTERVAL ago."""
+    session = get_db_session()
+    try:
+        entry = session.get(MonthlyLedger, (user_id, month))
+        return _is_stale(entry, datetime.datetime.utcnow())
+    finally:
+        session.close()
+
+def reconcile_month(user_id: int, month: str, sheet_total: float) -> dict:
+    """
+    Replaces the running total with the value computed from the sheet, plus the
+    user's expenses for the month that have not been synced to the sheet yet.
+
+    Returns:
+        The stats dictionary {'total': ..., 'limit': ..., 'left': ...}.
+    """
+    session = get_db_session()
+    try:
+        # The pending sum is taken in the same statement that writes the total
+        total = session.execute(_upsert_total(
+            user_id, month, sheet_total + _pending_amount(user_id, month), add=False,
+            reconciled_at=datetime.datetime.utcnow()
+        )).scalar_one()
+
+        user = session.get(User, user_id)
+        session.commit()
+        logger.info(f"Reconciled ledger for user {user_id}, month {month}: {total:.2f}")
+        return format_stats(total, _limit_of(user))
+    finally:
+        session.close()
+
+def get_monthly_limit(user_id: int) -> float:
+    """Returns the user's monthly limit, or DEFAULT_MONTHLY_LIMIT if unknown."""
+    found, profile = user_cache.lookup(user_id)
+    if found and profile is not None and profile["monthly_limit"] is not None:
+        return profile["monthly_limit"]
+    session = get_db_session()
+    try:
+        return _limit_of(session.get(User, user_id))
+    finally:
+        session.close()
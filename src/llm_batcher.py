@@ -0,0 +1,64 @@
+import asyncio
+import itertools
+import logging
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Collects concurrent requests for a short window and resolves them with one call.
+
+    send_batch receives {request_id: request} and returns {request_id: result}. A
+    request whose id is missing from the result (or the whole batch failing) resolves
+    to None, so the caller can fall back to an individual request.
+    """
+
+    def __init__(
+        self,
+        send_batch: Callable[[dict[str, str]], Awaitable[dict]],
+        window: float,
+        max_size: int
+    ):
+        self._send_batch = send_batch
+        self._window = window
+        self._max_size = max_size
+        self._pending: list[tuple[str, str, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._ids = itertools.count(1)
+        self._tasks: set[asyncio.Task] = set()
+
+    async def submit(self, request: str):
+        """Queues a request for the next batch and waits for its result (or None)."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((str(next(self._ids)), request, future))
+
+        if len(self._pending) >= self._max_size:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self._window, self._start_flush)
+        return await future
+
+    def _start_flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.get_running_loop().create_task(self._flush(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self, batch: list[tuple[str, str, asyncio.Future]]) -> None:
+        try:
+            results = await self._send_batch({request_id: request for request_id, request, _ in batch})
+        except Exception as e:
+            logger.error(f"Batched request of {len(batch)} failed: {e}", exc_info=True)
+            results = {}
+
+        for request_id, _, future in batch:
+            if not future.done():
+                future.set_result(results.get(request_id))
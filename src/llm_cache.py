@@ -0,0 +1,174 @@
+import asyncio
+import json
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from .config import LLM_CACHE_MAX_ENTRIES, LLM_CACHE_MAX_BYTES, LLM_CACHE_TTL, LLM_CACHE_DISK_PATH, LLM_CACHE_DISK_MAX_ENTRIES
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(model: str, prompt_version: str, kind: str, data: str | bytes) -> str:
+    """
+    Builds a content-addressed key for an LLM request.
+
+    Args:
+        model: The models that may answer, e.g. llm_router.route("text"). A hedged or
+            fallback answer is stored under the same key as the primary model's, so
+            the key names the whole route rather than the model that answered.
+        prompt_version: Version of the prompt template, so template changes miss the cache.
+        kind: "text" or "image".
+        data: The user's text (whitespace is normalized) or the raw image bytes.
+    """
+    if isinstance(data, str):
+        data = " ".join(data.split()).encode("utf-8")
+    digest = hashlib.sha256()
+    for part in (model.encode("utf-8"), prompt_version.encode("utf-8"), kind.encode("utf-8")):
+        digest.update(part)
+        digest.update(b"\0")
+    digest.update(data)
+    return digest.hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Caches parsed LLM item lists (before validation) by content hash.
+
+    Entries live in an in-memory LRU bounded by entry count and total size, with an
+    optional SQLite tier on disk that survives restarts. Both tiers expire entries
+    after ttl seconds. Disk reads and writes run in a worker thread so they do not
+    block the event loop.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES,
+        max_bytes: int = LLM_CACHE_MAX_BYTES,
+        ttl: float = LLM_CACHE_TTL,
+        disk_path: str = LLM_CACHE_DISK_PATH,
+        disk_max_entries: int = LLM_CACHE_DISK_MAX_ENTRIES
+    ):
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._ttl = ttl
+        self._disk_max_entries = disk_max_entries
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()  # Serializes use of the shared sqlite3 connection
+        self._counters = {"hits": 0, "misses": 0, "disk_hits": 0, "evictions": 0, "expired": 0}
+        self._disk = self._open_disk(disk_path) if disk_path else None
+        self._disk_puts = 0
+
+    def _open_disk(self, path: str) -> sqlite3.Connection | None:
+        try:
+            connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            return connection
+        except sqlite3.Error as e:
+            logger.error(f"Could not open LLM cache database at {path}, disk tier disabled: {e}")
+            return None
+
+    async def get(self, key: str) -> list | None:
+        """Returns the cached item list, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._counters["hits"] += 1
+                    return json.loads(value)
+                self._remove(key)
+                self._counters["expired"] += 1
+
+        row = await asyncio.to_thread(self._get_disk, key) if self._disk is not None else None
+        with self._lock:
+            if row and row[1] > now:
+                self._store(key, row[0], row[1])
+                self._counters["hits"] += 1
+                self._counters["disk_hits"] += 1
+                return json.loads(row[0])
+            self._counters["misses"] += 1
+            return None
+
+    async def put(self, key: str, items: list) -> None:
+        """Stores a parsed item list in memory and, if enabled, on disk."""
+        value = json.dumps(items)
+        expires_at = time.time() + self._ttl
+        with self._lock:
+            self._store(key, value, expires_at)
+        if self._disk is not None:
+            await asyncio.to_thread(self._put_disk, key, value, expires_at)
+
+    def _store(self, key: str, value: str, expires_at: float) -> None:
+        if len(value) > self._max_bytes:
+            return
+        self._remove(key)
+        self._entries[key] = (value, expires_at)
+        self._bytes += len(value)
+        while len(self._entries) > self._max_entries or self._bytes > self._max_bytes:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self._counters["evictions"] += 1
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[0])
+
+    def _get_disk(self, key: str) -> tuple[str, float] | None:
+        try:
+            with self._disk_lock:
+                return self._disk.execute(
+                    "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to read LLM cache entry from disk: {e}")
+            return None
+
+    def _put_disk(self, key: str, value: str, expires_at: float) -> None:
+        try:
+            with self._disk_lock:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, value, expires_at)
+                )
+                self._disk_puts += 1
+                if self._disk_puts % 100 == 0:
+                    self._prune_disk()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to write LLM cache entry to disk: {e}")
+
+    def _prune_disk(self) -> None:
+        """Drops expired entries, then the soonest-expiring ones above the size cap."""
+        self._disk.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+        self._disk.execute(
+            "DELETE FROM llm_cache WHERE key IN ("
+            "SELECT key FROM llm_cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self._disk_max_entries,)
+        )
+
+    def stats(self) -> dict:
+        """Returns hit/miss/eviction counters and the current memory footprint."""
+        with self._lock:
+            return {**self._counters, "entries": len(self._entries), "bytes": self._bytes}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self._disk is not None:
+            with self._disk_lock:
+                self._disk.execute("DELETE FROM llm_cache")
+
+
+response_cache = LLMResponseCache()
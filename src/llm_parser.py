@@ -1,13 +1,34 @@
 import json
-import base64
+import asyncio
 import httpx
 import logging
 import datetime
-
-from .config import OPENROUTER_API_KEY, OPENROUTER_API_URL, LLM_MODEL, YOUR_SITE_URL, YOUR_SITE_NAME, EXPENSE_CATEGORIES
+import time
+
+from .config import OPENROUTER_API_KEY, OPENROUTER_API_URL, YOUR_SITE_URL, YOUR_SITE_NAME
+from .config import FAST_PARSER_ENABLED, FAST_PARSER_MIN_CONFIDENCE
+from .config import LLM_HTTP_MAX_CONNECTIONS, LLM_HTTP_MAX_KEEPALIVE, LLM_HTTP_KEEPALIVE_EXPIRY, LLM_HTTP2, LLM_MAX_CONCURRENCY
+from .config import LLM_CACHE_ENABLED, IMAGE_PREPROCESSING_ENABLED
+from .config import LLM_BATCH_ENABLED, LLM_BATCH_WINDOW_MS, LLM_BATCH_MAX_SIZE
+from .fast_parser import parse_simple_expense
+from .categories import category_index
+from . import prompts
+from .prompts import PROMPT_VERSION
+from .llm_cache import make_cache_key, response_cache
+from .llm_batcher import MicroBatcher
+from .llm_router import llm_router
+from .json_stream import JSONArrayStreamParser
+from .image_preprocessing import prepare_image, base64_encoded_length, iter_base64_chunks
+from .metrics import stage_latency, llm_tokens, llm_request_tokens, api_errors
 
 logger = logging.getLogger(__name__)
 
+# Stands in for the image data URL in payloads; replaced while the request body is streamed
+IMAGE_URL_PLACEHOLDER = "__IMAGE_DATA_URL__"
+
+_http_client: httpx.AsyncClient | None = None
+_request_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
 def _validate_api_key() -> bool:
     """Validate the OpenRouter API key."""
     if not OPENROUTER_API_KEY or OPENROUTER_API_KEY == "YOUR_OPENROUTER_API_KEY":
@@ -24,49 +45,185 @@ def _get_headers() -> dict:
         "Content-Type": "application/json"
     }
 
-async def _make_llm_request(headers: dict, payload: dict, timeout: int = 15) -> dict:
-    """Make a request to the OpenRouter API with error handling."""
+def _create_http_client() -> httpx.AsyncClient:
+    """Create the pooled client shared by all OpenRouter requests."""
+    http2 = LLM_HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("LLM_HTTP2 is enabled but the 'h2' package is not installed, using HTTP/1.1.")
+            http2 = False
+
+    limits = httpx.Limits(
+        max_connections=LLM_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY
+    )
+    return httpx.AsyncClient(limits=limits, http2=http2)
+
+def _get_http_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it on first use."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = _create_http_client()
+    return _http_client
+
+async def start_http_client() -> None:
+    """Create the shared OpenRouter client. Call once at application startup."""
+    _get_http_client()
+
+async def close_http_client() -> None:
+    """Close the shared OpenRouter client and its pooled connections."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+def _stream_image_body(payload: dict, image_bytes: bytes) -> tuple[int, object]:
+    """
+    Serializes payload with the base64 data URL of image_bytes streamed in place of
+    IMAGE_URL_PLACEHOLDER, so the encoded image is never held in memory as a whole.
+
+    Returns:
+        A tuple (content_length, async_iterator_of_bytes).
+    """
+    prefix, suffix = json.dumps(payload).split(json.dumps(IMAGE_URL_PLACEHOLDER), 1)
+    prefix = (prefix + '"data:image/jpeg;base64,').encode("utf-8")
+    suffix = ('"' + suffix).encode("utf-8")
+    content_length = len(prefix) + base64_encoded_length(len(image_bytes)) + len(suffix)
+
+    async def body():
+        yield prefix
+        for chunk in iter_base64_chunks(image_bytes):
+            yield chunk
+        yield suffix
+
+    return content_length, body()
+
+def _count_tokens(usage: dict | None, request: str) -> None:
+    """Records the token usage reported with a completion of a request kind (text, batch, image)."""
+    if usage:
+        prompt_tokens = usage.get("prompt_tokens") or 0
+        completion_tokens = usage.get("completion_tokens") or 0
+        llm_tokens.inc("prompt", amount=prompt_tokens)
+        llm_tokens.inc("completion", amount=completion_tokens)
+        # Prompt tokens the provider served from its prefix cache, where it reports them
+        llm_tokens.inc("cached", amount=(usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0)
+        llm_request_tokens.observe(prompt_tokens, request, "prompt")
+        llm_request_tokens.observe(completion_tokens, request, "completion")
+
+def _request_kwargs(headers: dict, payload: dict, image_bytes: bytes | None) -> dict:
+    """Build the httpx request arguments, streaming the image body if there is one."""
+    if image_bytes is not None:
+        content_length, body = _stream_image_body(payload, image_bytes)
+        return {"headers": {**headers, "Content-Length": str(content_length)}, "content": body}
+    return {"headers": headers, "json": payload}
+
+async def _make_llm_request(headers: dict, payload: dict, timeout: int = 15, image_bytes: bytes | None = None,
+                            request: str = "text") -> dict:
+    """
+    Make a request to the OpenRouter API with error handling.
+
+    If image_bytes is given, payload must contain IMAGE_URL_PLACEHOLDER where the
+    image data URL belongs; the image is base64-encoded while the body is sent.
+    """
     try:
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            response = await client.post(
-                OPENROUTER_API_URL,
-                headers=headers,
-                json=payload
-            )
-            response.raise_for_status()
-            return response.json()
+        request_kwargs = _request_kwargs(headers, payload, image_bytes)
+        async with _request_semaphore:
+            with stage_latency.time("llm_request"):
+                response = await _get_http_client().post(
+                    OPENROUTER_API_URL,
+                    timeout=timeout,
+                    **request_kwargs
+                )
+                response.raise_for_status()
+                result = response.json()
+        _count_tokens(result.get("usage"), request)
+        return result
     except httpx.RequestError as e:
+        api_errors.inc("openrouter", type(e).__name__)
         logger.error(f"HTTP request failed: {e}", exc_info=True)
         return None
     except httpx.HTTPStatusError as e:
+        api_errors.inc("openrouter", str(e.response.status_code))
         logger.error(f"HTTP error response: {e}", exc_info=True)
         return None
     except Exception as e:
+        api_errors.inc("openrouter", "unexpected")
         logger.error(f"Unexpected error during LLM request: {e}", exc_info=True)
         return None
 
-def _parse_llm_response(response_content: str) -> list:
-    """Parse and clean the LLM response content."""
+async def _stream_llm_request(headers: dict, payload: dict, timeout: int = 30, image_bytes: bytes | None = None,
+                              request: str = "image"):
+    """Stream a completion from the OpenRouter API (SSE), yielding content deltas as they arrive."""
+    request_kwargs = _request_kwargs(headers, {**payload, "stream": True}, image_bytes)
+    try:
+        async with _request_semaphore:
+            started = time.perf_counter()
+            async with _get_http_client().stream("POST", OPENROUTER_API_URL, timeout=timeout, **request_kwargs) as response:
+                # Until the response headers arrive; the total depends on how much the model writes
+                stage_latency.observe(time.perf_counter() - started, "llm_stream_first_byte")
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    # Skip blank separators and SSE comments such as ": OPENROUTER PROCESSING"
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        event = json.loads(data)
+                    except json.JSONDecodeError:
+                        logger.warning(f"Skipping undecodable stream event: {data}")
+                        continue
+                    if "error" in event:
+                        api_errors.inc("openrouter", "stream_error")
+                        logger.error(f"LLM stream returned an error: {event['error']}")
+                        break
+                    _count_tokens(event.get("usage"), request)  # Sent with the last chunk
+                    delta = (event.get("choices") or [{}])[0].get("delta", {}).get("content")
+                    if delta:
+                        yield delta
+            stage_latency.observe(time.perf_counter() - started, "llm_stream")
+    except httpx.RequestError as e:
+        api_errors.inc("openrouter", type(e).__name__)
+        logger.error(f"HTTP stream request failed: {e}", exc_info=True)
+    except httpx.HTTPStatusError as e:
+        api_errors.inc("openrouter", str(e.response.status_code))
+        logger.error(f"HTTP error response: {e}", exc_info=True)
+
+def _decode_llm_json(response_content: str):
+    """Strip markdown code fences from the LLM response and decode it. Returns None on failure."""
     if not response_content:
         logger.error("LLM returned empty content")
-        return []
+        return None
 
     try:
-        # Clean potential markdown code blocks
+        # Clean potential markdown code blocks, also with structured output: models and
+        # proxies that ignore response_format still wrap their answer in them
         content = response_content.strip()
         if content.startswith("```json"):
             content = content[7:-3].strip()
         elif content.startswith("```"):
             content = content[3:-3].strip()
 
-        parsed_json = json.loads(content)
+        with stage_latency.time("json_parse"):
+            return json.loads(content)
     except json.JSONDecodeError:
+        api_errors.inc("openrouter", "invalid_json")
         logger.error(f"Failed to decode JSON from LLM response: {response_content}")
-        return []
+        return None
+
+def _parse_llm_response(response_content: str) -> list | None:
+    """Parse and clean the LLM response content. Returns None if it is not a list of expenses."""
+    parsed_json = prompts.unwrap_expenses(_decode_llm_json(response_content))
+    if parsed_json is None:
+        return None
 
     if not isinstance(parsed_json, list):
         logger.warning(f"Expected a list of expenses but got: {parsed_json}")
-        return []
+        return None
 
     return parsed_json
 
@@ -84,13 +241,8 @@ def _validate_expense_item(item: dict, user_id: int) -> dict:
         logger.warning(f"Skipping expense with invalid amount: {item}")
         return None
 
-    # Validate category
-    if not isinstance(category, str) or not category.strip():
-        category = "Other"
-    else:
-        # Map to known categories (case-insensitive)
-        matched = next((c for c in EXPENSE_CATEGORIES if c.lower() == category.lower().strip()), None)
-        category = matched if matched else "Other"
+    # Map to a known category (synonyms, the user's own terms, typos)
+    category = category_index.resolve(category, user_id, description)
 
     # Parse date if provided
     timestamp = datetime.datetime.utcnow()
@@ -108,41 +260,129 @@ def _validate_expense_item(item: dict, user_id: int) -> dict:
         "timestamp": timestamp
     }
 
-async def parse_expense_data(text: str, user_id: int) -> list[dict]:
-    """Parses potentially multiple expenses from text using an LLM. Returns a list of Expense objects."""
-    if not _validate_api_key():
-        return []
+def _build_payload(messages: list[dict], response_kind: str, **options) -> dict:
+    """
+    Chat completion payload for prompt messages, with the response_format of structured
+    output mode. The model is set per attempt by the router.
+    """
+    payload = {"messages": messages, "temperature": 0.1, **options}
+    response_format = prompts.response_format(response_kind)
+    if response_format:
+        payload["response_format"] = response_format
+    return payload
 
-    prompt = f"""
-    Analyze the following text which may contain multiple expense entries. Extract each expense with the following details:
-    - "amount": number (float or integer)
-    - "category": a relevant category word or phrase
-    - "description": optional brief description or null
-    - "date": optional date string in ISO format (YYYY-MM-DD), or null if not specified
+def _get_content(api_result: dict) -> str:
+    return api_result.get("choices", [{}])[0].get("message", {}).get("content", "")
 
-    Return ONLY a JSON array of objects, each with keys: "amount", "category", "description", "date".
-    Valid categories include: {', '.join(EXPENSE_CATEGORIES)}.
-    If the category is not recognized, use "Other".
-    If you cannot extract any expenses, return an empty JSON array [].
+async def _request_text_items(text: str) -> list:
+    """Asks the LLM for the raw expense items in a single text."""
+    headers = _get_headers()
+    payload = _build_payload(prompts.text_messages(text), "expenses")
 
-    Text to analyze: "{text}"
+    async def attempt(model: str) -> list | None:
+        api_result = await _make_llm_request(headers, {**payload, "model": model})
+        if not api_result:
+            return None
+        return _parse_llm_response(_get_content(api_result))
 
-    JSON Output:
+    return await llm_router.run("text", attempt) or []
+
+async def _request_batch_items(texts: dict[str, str]) -> dict[str, list]:
+    """
+    Asks the LLM for the raw expense items of several texts in one prompt.
+
+    Returns:
+        {request_id: items} for every id the LLM answered with a list. Ids that are
+        missing are retried individually by the caller.
     """
+    if len(texts) == 1:
+        # Nothing to batch with, the plain prompt is cheaper and more reliable
+        request_id, text = next(iter(texts.items()))
+        return {request_id: await _request_text_items(text)}
 
     headers = _get_headers()
-    payload = {
-        "model": LLM_MODEL,
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": 0.1
-    }
+    payload = _build_payload(prompts.batch_messages(texts), "batch")
+
+    async def attempt(model: str) -> dict | None:
+        api_result = await _make_llm_request(headers, {**payload, "model": model}, timeout=30, request="batch")
+        if not api_result:
+            return None
+
+        parsed_json = prompts.unwrap_batch(_decode_llm_json(_get_content(api_result)))
+        if not isinstance(parsed_json, dict):
+            logger.warning(f"Expected an object keyed by request id but got: {parsed_json}")
+            return None
+        return {request_id: items for request_id, items in parsed_json.items() if isinstance(items, list)}
+
+    results = await llm_router.run("text", attempt)
+    if results is None:
+        return {}
+    logger.info(f"Batched LLM request answered {len(results)} of {len(texts)} texts.")
+    return results
+
+async def categorize_descriptions(descriptions: dict[str, str]) -> dict[str, str]:
+    """
+    Asks the LLM for the category of several bank statement lines in one prompt.
 
-    api_result = await _make_llm_request(headers, payload)
-    if not api_result:
+    Args:
+        descriptions: {id: statement line}.
+
+    Returns:
+        {id: category label} for every id the LLM answered; the labels still need
+        mapping onto the configured categories.
+    """
+    if not descriptions or not _validate_api_key():
+        return {}
+
+    headers = _get_headers()
+    payload = _build_payload(prompts.categorize_messages(descriptions), "categories")
+
+    async def attempt(model: str) -> dict | None:
+        api_result = await _make_llm_request(headers, {**payload, "model": model}, timeout=30, request="categorize")
+        if not api_result:
+            return None
+
+        parsed_json = prompts.unwrap_categories(_decode_llm_json(_get_content(api_result)))
+        if not isinstance(parsed_json, dict):
+            logger.warning(f"Expected an object keyed by id but got: {parsed_json}")
+            return None
+        return {str(key): label for key, label in parsed_json.items() if isinstance(label, str)}
+
+    return await llm_router.run("text", attempt) or {}
+
+_text_batcher = MicroBatcher(_request_batch_items, window=LLM_BATCH_WINDOW_MS / 1000, max_size=LLM_BATCH_MAX_SIZE)
+
+async def parse_expense_data(text: str, user_id: int) -> list[dict]:
+    """Parses potentially multiple expenses from text using an LLM. Returns a list of Expense objects."""
+    # Simple single-expense messages are handled locally without an LLM round trip
+    if FAST_PARSER_ENABLED:
+        fast_items, confidence = parse_simple_expense(text, user_id=user_id)
+        if fast_items and confidence >= FAST_PARSER_MIN_CONFIDENCE:
+            expenses = [e for e in (_validate_expense_item(item, user_id) for item in fast_items) if e]
+            if expenses:
+                logger.info(f"Fast path parsed {len(expenses)} expenses without LLM.")
+                return expenses
+
+    if not _validate_api_key():
         return []
 
-    llm_response_content = api_result.get("choices", [{}])[0].get("message", {}).get("content", "")
-    parsed_items = _parse_llm_response(llm_response_content)
+    cache_key = make_cache_key(llm_router.route("text"), PROMPT_VERSION, "text", text) if LLM_CACHE_ENABLED else None
+    cached_items = await response_cache.get(cache_key) if cache_key else None
+    if cached_items is not None:
+        expenses = [e for e in (_validate_expense_item(item, user_id) for item in cached_items) if e]
+        logger.info(f"Cache hit: {len(expenses)} expenses from input.")
+        return expenses
+
+    if LLM_BATCH_ENABLED:
+        parsed_items = await _text_batcher.submit(text)
+        if parsed_items is None:
+            logger.info("Text missing from batched LLM response, retrying individually.")
+            parsed_items = await _request_text_items(text)
+    else:
+        parsed_items = await _request_text_items(text)
+
+    if cache_key and parsed_items:
+        await response_cache.put(cache_key, parsed_items)
 
     expenses = []
     for item in parsed_items:
@@ -153,52 +393,43 @@ async def parse_expense_data(text: str, user_id: int) -> list[dict]:
     logger.info(f"LLM parsed {len(expenses)} expenses from input.")
     return expenses
 
+def _build_image_payload() -> dict:
+    """Build the image parsing payload; the image itself is IMAGE_URL_PLACEHOLDER."""
+    return _build_payload(prompts.image_messages(IMAGE_URL_PLACEHOLDER), "expenses", max_tokens=1000)
+
+def _image_attempt(headers: dict, payload: dict, image_bytes: bytes):
+    """The llm_router attempt that parses an image with one model, without streaming."""
+    async def attempt(model: str) -> list | None:
+        api_result = await _make_llm_request(
+            headers, {**payload, "model": model}, timeout=30, image_bytes=image_bytes, request="image"
+        )
+        if not api_result:
+            return None
+        return _parse_llm_response(_get_content(api_result))
+    return attempt
+
 async def parse_expense_image_data(image_bytes: bytearray, user_id: int) -> list[dict]:
     """Parses potentially multiple expenses from an image using an LLM. Returns a list of Expense objects."""
     if not _validate_api_key():
         return []
 
     try:
-        base64_image = base64.b64encode(image_bytes).decode('utf-8')
-        base64_string = f"data:image/jpeg;base64,{base64_image}"
-
-        prompt = f"""
-        Analyze the attached image, which may contain multiple expense entries (e.g., a photo of a receipt). Extract each expense with the following details:
-        - "amount": number (float or integer)
-        - "category": a relevant category word or phrase
-        - "description": optional brief description or null
-        - "date": optional date string in ISO format (YYYY-MM-DD), or null if not specified
-
-        Return ONLY a JSON array of objects, each with keys: "amount", "category", "description", "date".
-        Valid categories include: {', '.join(EXPENSE_CATEGORIES)}.
-        If the category is not recognized, use "Other".
-        If you cannot extract any expenses, return an empty JSON array [].
-
-        JSON Output:
-        """
-
-        headers = _get_headers()
-        payload = {
-            "model": LLM_MODEL,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {"type": "image_url", "image_url": {"url": base64_string}}
-                    ]
-                }
-            ],
-            "max_tokens": 1000,
-            "temperature": 0.1
-        }
-
-        api_result = await _make_llm_request(headers, payload, timeout=30)
-        if not api_result:
+        cache_key = make_cache_key(llm_router.route("image"), PROMPT_VERSION, "image", bytes(image_bytes)) if LLM_CACHE_ENABLED else None
+        cached_items = await response_cache.get(cache_key) if cache_key else None
+        if cached_items is not None:
+            expenses = [e for e in (_validate_expense_item(item, user_id) for item in cached_items) if e]
+            logger.info(f"Cache hit: {len(expenses)} expenses from image for user {user_id}.")
+            return expenses
+
+        if IMAGE_PREPROCESSING_ENABLED:
+            # Pillow work is CPU-bound, keep it off the event loop
+            image_bytes = await asyncio.to_thread(prepare_image, image_bytes)
+
+        parsed_items = await llm_router.run("image", _image_attempt(_get_headers(), _build_image_payload(), image_bytes))
+        if parsed_items is None:
             return []
-
-        llm_response_content = api_result.get("choices", [{}])[0].get("message", {}).get("content", "")
-        parsed_items = _parse_llm_response(llm_response_content)
+        if cache_key and parsed_items:
+            await response_cache.put(cache_key, parsed_items)
 
         expenses = []
         for item in parsed_items:
@@ -211,4 +442,81 @@ async def parse_expense_image_data(image_bytes: bytearray, user_id: int) -> list
 
     except Exception as e:
         logger.error(f"Error processing image: {e}", exc_info=True)
-        return []
\ No newline at end of file
+        return []
+
+class StreamInterruptedError(Exception):
+    """A streamed answer ended before its JSON array was complete, so the expenses yielded so far may be partial."""
+
+async def parse_expense_image_data_stream(image_bytes: bytearray, user_id: int):
+    """
+    Streams expenses from an image using an LLM. Yields each validated expense dict
+    as soon as the model has finished generating it.
+
+    Raises:
+        StreamInterruptedError: The stream failed or was cut off; the caller should
+            discard the expenses it has received and not save them.
+    """
+    if not _validate_api_key():
+        return
+
+    try:
+        cache_key = make_cache_key(llm_router.route("image"), PROMPT_VERSION, "image", bytes(image_bytes)) if LLM_CACHE_ENABLED else None
+        cached_items = await response_cache.get(cache_key) if cache_key else None
+        if cached_items is not None:
+            logger.info(f"Cache hit: {len(cached_items)} items from image for user {user_id}.")
+            for item in cached_items:
+                expense = _validate_expense_item(item, user_id)
+                if expense:
+                    yield expense
+            return
+
+        if IMAGE_PREPROCESSING_ENABLED:
+            image_bytes = await asyncio.to_thread(prepare_image, image_bytes)
+
+        headers = _get_headers()
+        payload = _build_image_payload()
+
+        # Expenses are shown as they stream in, so a stream is not hedged; the router
+        # still picks a model with a closed breaker and learns its latency. A stream
+        # that fails before showing anything is retried through the router below.
+        model = llm_router.candidates("image")[0]
+        stream_parser = JSONArrayStreamParser()
+        parsed_items = []
+        expense_count = 0
+        llm_router.started(model)
+        started = time.perf_counter()
+        outcome = "cancelled"  # Unless the stream ends on its own
+        try:
+            async for delta in _stream_llm_request(headers, {**payload, "model": model}, timeout=30, image_bytes=image_bytes):
+                for item in stream_parser.feed(delta):
+                    parsed_items.append(item)
+                    expense = _validate_expense_item(item, user_id)
+                    if expense:
+                        expense_count += 1
+                        yield expense
+            outcome = "ok" if stream_parser.done else "failed"
+        finally:
+            llm_router.record(model, outcome, time.perf_counter() - started)
+        if not stream_parser.done and not expense_count:
+            logger.warning(f"Image stream from {model} failed before any expense, retrying with the other models")
+            parsed_items = await llm_router.run("image", _image_attempt(headers, payload, image_bytes), exclude=(model,))
+            if parsed_items is None:
+                raise StreamInterruptedError(f"Stream from {model} and the retry both failed")
+            for item in parsed_items:
+                expense = _validate_expense_item(item, user_id)
+                if expense:
+                    expense_count += 1
+                    yield expense
+        elif not stream_parser.done:
+            raise StreamInterruptedError(f"Stream from {model} ended after {len(parsed_items)} items")
+
+        # Only a fully received array is worth caching
+        if cache_key and parsed_items:
+            await response_cache.put(cache_key, parsed_items)
+        logger.info(f"LLM streamed {expense_count} expenses from image for user {user_id}.")
+
+    except StreamInterruptedError:
+        raise
+    except Exception as e:
+        logger.error(f"Error streaming image expenses: {e}", exc_info=True)
+        raise StreamInterruptedError(str(e)) from e
@@ -0,0 +1,235 @@
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Awaitable, Callable
+
+from .config import (
+    LLM_TEXT_MODELS, LLM_IMAGE_MODELS, LLM_HEDGE_ENABLED, LLM_HEDGE_QUANTILE, LLM_HEDGE_MIN_DELAY,
+    LLM_HEDGE_MAX_DELAY, LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN
+)
+from .metrics import llm_model_latency
+
+logger = logging.getLogger(__name__)
+
+_LATENCY_WINDOW = 200  # Recent latencies per model the hedge delay is computed from
+_MIN_SAMPLES = 20  # Until a model has this many, hedges wait max_hedge_delay
+
+
+class _ModelHealth:
+    """Recent latencies and circuit breaker state of one model."""
+
+    __slots__ = ("latencies", "failures", "open_until", "probing", "counters")
+
+    def __init__(self):
+        self.latencies: deque[float] = deque(maxlen=_LATENCY_WINDOW)
+        self.failures = 0  # Consecutive failed requests
+        self.open_until = 0.0  # Monotonic time the breaker lets a trial request through again
+        self.probing = False  # A trial request is in flight while half-open
+        self.counters = {"requests": 0, "ok": 0, "failed": 0, "cancelled": 0, "breaker_opened": 0}
+
+    def quantile(self, q: float) -> float | None:
+        if len(self.latencies) < _MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+
+class LLMRouter:
+    """
+    Sends each LLM request to an ordered list of models with hedging and circuit breaking.
+
+    A request goes to the first model whose breaker is closed. If no valid answer
+    has arrived after that model's recent p95 latency (clamped to
+    [min_hedge_delay, max_hedge_delay]), a hedged request goes to the next model;
+    the first valid answer wins and the other request is cancelled. A model that
+    fails outright (HTTP error, timeout, unparsable answer) is replaced by the next
+    one at once. After breaker_failures consecutive failures a model's breaker opens
+    and it is skipped for breaker_cooldown seconds; then a single trial request
+    decides whether it closes again.
+    """
+
+    def __init__(
+        self,
+        models: dict[str, list[str]] | None = None,
+        hedge: bool = LLM_HEDGE_ENABLED,
+        hedge_quantile: float = LLM_HEDGE_QUANTILE,
+        min_hedge_delay: float = LLM_HEDGE_MIN_DELAY,
+        max_hedge_delay: float = LLM_HEDGE_MAX_DELAY,
+        breaker_failures: int = LLM_BREAKER_FAILURES,
+        breaker_cooldown: float = LLM_BREAKER_COOLDOWN
+    ):
+        self._models = models or {"text": LLM_TEXT_MODELS, "image": LLM_IMAGE_MODELS}
+        self._hedge = hedge
+        self._hedge_quantile = hedge_quantile
+        self._min_hedge_delay = min_hedge_delay
+        self._max_hedge_delay = max_hedge_delay
+        self._breaker_failures = breaker_failures
+        self._breaker_cooldown = breaker_cooldown
+        self._health: dict[str, _ModelHealth] = {}
+        self._counters = {"requests": 0, "hedged": 0, "fallback_answers": 0, "failovers": 0, "exhausted": 0}
+
+    def _health_of(self, model: str) -> _ModelHealth:
+        health = self._health.get(model)
+        if health is None:
+            health = self._health[model] = _ModelHealth()
+        return health
+
+    def primary(self, modality: str) -> str:
+        """The first configured model for "text" or "image" requests."""
+        return self._models[modality][0]
+
+    def route(self, modality: str) -> str:
+        """All configured models for "text" or "image" requests, in order, as one string."""
+        return ",".join(self._models[modality])
+
+    def _available(self, model: str, now: float) -> bool:
+        health = self._health_of(model)
+        if health.failures < self._breaker_failures:
+            return True
+        # Open: skipped until the cooldown ends, then half-open for one trial request
+        return now >= health.open_until and not health.probing
+
+    def candidates(self, modality: str) -> list[str]:
+        """Models to try in order, skipping those with an open breaker."""
+        now = time.monotonic()
+        models = self._models[modality]
+        available = [model for model in models if self._available(model, now)]
+        if available:
+            return available
+        # Every breaker is open: try the model that is due a trial soonest rather than fail outright
+        return [min(models, key=lambda model: self._health_of(model).open_until)]
+
+    def hedge_delay(self, model: str) -> float:
+        """Seconds to wait for model before sending a hedged request to the next one."""
+        observed = self._health_of(model).quantile(self._hedge_quantile)
+        if observed is None:
+            return self._max_hedge_delay
+        return min(self._max_hedge_delay, max(self._min_hedge_delay, observed))
+
+    def started(self, model: str) -> None:
+        health = self._health_of(model)
+        health.counters["requests"] += 1
+        if health.failures >= self._breaker_failures:
+            health.probing = True
+
+    def record(self, model: str, outcome: str, seconds: float) -> None:
+        """
+        Records how a request to model ended.
+
+        Args:
+            model: The model the request went to.
+            outcome: "ok", "failed", or "cancelled" (lost a hedge race).
+            seconds: Time from sending the request to the outcome.
+        """
+        health = self._health_of(model)
+        health.counters[outcome] += 1
+        health.probing = False
+        llm_model_latency.observe(seconds, model, outcome)
+        if outcome == "failed":
+            health.failures += 1
+            if health.failures >= self._breaker_failures:
+                # Opens, or stays open after a failed trial request
+                health.open_until = time.monotonic() + self._breaker_cooldown
+                if health.failures == self._breaker_failures:
+                    health.counters["breaker_opened"] += 1
+                    logger.warning(f"LLM model {model} failed {health.failures} times in a row, "
+                                   f"skipping it for {self._breaker_cooldown:.0f}s")
+            return
+        # A cancelled request took at least this long, so it still counts toward the tail
+        health.latencies.append(seconds)
+        if outcome == "ok":
+            if health.failures >= self._breaker_failures:
+                logger.info(f"LLM model {model} answered again, closing its circuit breaker")
+            health.failures = 0
+
+    async def run(self, modality: str, attempt: Callable[[str], Awaitable], exclude: tuple = ()):
+        """
+        Runs attempt(model) against the models for modality until one returns a valid result.
+
+        Args:
+            modality: "text" or "image".
+            attempt: Coroutine function sending the request to a model; it returns None
+                if the request failed or the answer could not be parsed.
+            exclude: Models to skip, e.g. one that just failed outside the router;
+                ignored if no other model is left.
+
+        Returns:
+            The first valid result, or None if every model failed.
+        """
+        self._counters["requests"] += 1
+        loop = asyncio.get_running_loop()
+        candidates = self.candidates(modality)
+        primary = candidates[0]  # An answer from any other model counts as a fallback answer
+        remaining = [model for model in candidates if model not in exclude] or candidates
+        pending: dict[asyncio.Task, tuple[str, float]] = {}
+
+        def launch() -> str:
+            model = remaining.pop(0)
+            self.started(model)
+            pending[loop.create_task(attempt(model))] = (model, loop.time())
+            return model
+
+        launched = launch()
+        hedge_at = loop.time() + self.hedge_delay(launched) if self._hedge and remaining else None
+        try:
+            while pending:
+                timeout = None if hedge_at is None else max(0.0, hedge_at - loop.time())
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedge_at = None
+                    self._counters["hedged"] += 1
+                    launch()
+                    continue
+                for task in done:
+                    model, started = pending.pop(task)
+                    result = None
+                    if task.cancelled():
+                        pass
+                    elif task.exception():
+                        logger.error(f"LLM request to {model} raised: {task.exception()}")
+                    else:
+                        result = task.result()
+                    if result is not None:
+                        self.record(model, "ok", loop.time() - started)
+                        if model != primary:
+                            self._counters["fallback_answers"] += 1  # Hedge or failover answered
+                        return result
+                    self.record(model, "failed", loop.time() - started)
+                if not pending and remaining:
+                    self._counters["failovers"] += 1
+                    # The next hedge waits for the model now in flight, not the one that failed
+                    launched = launch()
+                    hedge_at = loop.time() + self.hedge_delay(launched) if self._hedge and remaining else None
+            self._counters["exhausted"] += 1
+            return None
+        finally:
+            for task, (model, started) in pending.items():
+                task.cancel()
+                self.record(model, "cancelled", loop.time() - started)
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        open_breakers = sum(
+            1 for health in self._health.values()
+            if health.failures >= self._breaker_failures and now < health.open_until
+        )
+        return {**self._counters, "open_breakers": open_breakers}
+
+    def model_stats(self) -> dict:
+        """Counters, p50/p95 latency and breaker state per model, for logs and benchmarks."""
+        stats = {}
+        for model, health in self._health.items():
+            stats[model] = {
+                **health.counters,
+                "p50": health.quantile(0.5),
+                "p95": health.quantile(0.95),
+                "breaker_open": health.failures >= self._breaker_failures,
+            }
+        return stats
+
+
+llm_router = LLMRouter()
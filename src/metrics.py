@@ -0,0 +1,287 @@
+import asyncio
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from .config import METRICS_ENABLED, METRICS_LISTEN, METRICS_PORT, METRICS_PORT_RANGE
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "expense_bot"
+# Upper bounds in seconds; covers a local cache lookup up to a slow receipt parse
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Upper bounds in tokens; a one-line text prompt up to a large receipt image
+TOKEN_BUCKETS = (50, 100, 200, 400, 800, 1600, 3200, 6400)
+
+_enabled = METRICS_ENABLED
+_metrics: list = []
+_stats_sources: dict = {}
+
+
+def set_enabled(enabled: bool) -> None:
+    """Turns recording on or off at runtime; when off, every recording call returns at once."""
+    global _enabled
+    _enabled = enabled
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """A monotonically increasing count per label combination. Safe to use from worker threads."""
+
+    def __init__(self, name: str, description: str, labelnames: tuple = ()):
+        self.name = f"{PREFIX}_{name}"
+        self.description = description
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        if not _enabled:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_format_labels(self.labelnames, labels)} {value}" for labels, value in values]
+        return lines
+
+
+class _Series:
+    __slots__ = ("buckets", "sum", "count")
+
+    def __init__(self, size: int):
+        self.buckets = [0] * size  # Observations per bucket, the last one for values above every bound
+        self.sum = 0.0
+        self.count = 0
+
+
+class _Timer:
+    """Context manager that observes the seconds spent inside its block."""
+
+    __slots__ = ("_histogram", "_labels", "_started")
+
+    def __init__(self, histogram: "Histogram", labels: tuple):
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._histogram.observe(time.perf_counter() - self._started, *self._labels)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Histogram:
+    """
+    Latency distribution per label combination with fixed bucket bounds.
+
+    observe() costs a binary search and a few additions under a lock; time() returns
+    a context manager for timing a block. Rendered in the Prometheus text format,
+    so quantiles are computed by the scraper.
+    """
+
+    def __init__(self, name: str, description: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = f"{PREFIX}_{name}"
+        self.description = description
+        self.labelnames = labelnames
+        self._bounds = tuple(buckets)
+        self._series: dict[tuple, _Series] = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def observe(self, seconds: float, *labels) -> None:
+        if not _enabled:
+            return
+        index = bisect_left(self._bounds, seconds)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = _Series(len(self._bounds) + 1)
+            series.buckets[index] += 1
+            series.sum += seconds
+            series.count += 1
+
+    def time(self, *labels):
+        """Times the block: `with histogram.time("llm_request"): ...`."""
+        return _Timer(self, labels) if _enabled else _NULL_TIMER
+
+    def snapshot(self, *labels) -> dict:
+        """Returns count, sum and approximate p50/p95/p99 (bucket upper bounds) of one series."""
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                return {"count": 0, "sum": 0.0}
+            buckets, total, count = list(series.buckets), series.sum, series.count
+        result = {"count": count, "sum": round(total, 6)}
+        for name, quantile in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99)):
+            rank, seen = quantile * count, 0
+            for bound, observed in zip(self._bounds + (float("inf"),), buckets):
+                seen += observed
+                if seen >= rank:
+                    result[name] = bound
+                    break
+        return result
+
+    def render(self) -> list[str]:
+        with self._lock:
+            series = sorted((labels, list(s.buckets), s.sum, s.count) for labels, s in self._series.items())
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for labels, buckets, total, count in series:
+            cumulative = 0
+            for bound, observed in zip(self._bounds + ("+Inf",), buckets):
+                cumulative += observed
+                bucket_labels = _format_labels(self.labelnames, labels, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            plain_labels = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{plain_labels} {total}")
+            lines.append(f"{self.name}_count{plain_labels} {count}")
+        return lines
+
+
+def register_stats(name: str, stats) -> None:
+    """
+    Exposes the numeric values of an existing stats() method as metrics.
+
+    The values are read when /metrics is scraped, so components that already keep
+    counters (caches, queues, the syncer) cost nothing extra on their hot path.
+    """
+    _stats_sources[name] = stats
+
+def _render_stats() -> list[str]:
+    lines = []
+    for source, stats in _stats_sources.items():
+        try:
+            values = stats()
+        except Exception as e:
+            logger.warning(f"Could not collect '{source}' stats for metrics: {e}")
+            continue
+        for key, value in values.items():
+            if isinstance(value, bool):
+                value = int(value)
+            if not isinstance(value, (int, float)):
+                continue
+            name = f"{PREFIX}_{source}_{key}"
+            lines += [f"# TYPE {name} untyped", f"{name} {value}"]
+    return lines
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _metrics:
+        lines += metric.render()
+    lines += _render_stats()
+    return "\n".join(lines) + "\n"
+
+
+# Latency of each stage of handling an expense message
+stage_latency = Histogram(
+    "stage_seconds", "Latency of message handling stages in seconds", ("stage",)
+)
+# Latency of each Google Sheets API call, by gspread method
+sheets_call_latency = Histogram(
+    "sheets_call_seconds", "Latency of Google Sheets API calls in seconds (excluding quota waits)", ("method",)
+)
+# Latency of each request to an LLM model, by how it ended (ok, failed, cancelled after losing a hedge)
+llm_model_latency = Histogram(
+    "llm_model_seconds", "Latency of LLM requests per model in seconds", ("model", "outcome")
+)
+llm_tokens = Counter("llm_tokens_total", "Tokens reported by the LLM API", ("kind",))
+# Tokens of each LLM request by request kind (text, batch, image) and direction (prompt, completion)
+llm_request_tokens = Histogram(
+    "llm_request_tokens", "Tokens per LLM request as reported by the API", ("request", "direction"), TOKEN_BUCKETS
+)
+api_errors = Counter("api_errors_total", "Failed calls to external APIs", ("api", "reason"))
+
+
+async def _handle_scrape(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        request_line = (await reader.readuntil(b"\r\n\r\n")).split(b"\r\n", 1)[0].decode("latin-1")
+        method, path = (request_line.split(" ") + ["", ""])[:2]
+        if method == "GET" and path.split("?", 1)[0] == "/metrics":
+            status, body = "200 OK", render().encode()
+        else:
+            status, body = "404 Not Found", b"Not Found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+class MetricsServer:
+    """
+    Serves GET /metrics on a local port. A scrape renders everything in one pass on the event loop.
+
+    The server listens on the first free port of port .. port + port_range - 1, so
+    worker processes started with the same settings get one port each (9464,
+    9465, ...); `port` tells which one this process got.
+    """
+
+    def __init__(self, host: str = METRICS_LISTEN, port: int = METRICS_PORT, port_range: int = METRICS_PORT_RANGE):
+        self._host = host
+        self._first_port = port
+        self._port_range = max(1, port_range)
+        self._server: asyncio.AbstractServer | None = None
+        self.port: int | None = None
+
+    async def start(self) -> None:
+        if not _enabled or not self._first_port or self._server is not None:
+            return
+        last_port = self._first_port + self._port_range - 1
+        for port in range(self._first_port, last_port + 1):
+            try:
+                self._server = await asyncio.start_server(_handle_scrape, self._host, port)
+            except OSError as e:
+                error = e
+                continue
+            self.port = port
+            logger.info(f"Serving metrics on http://{self._host}:{port}/metrics")
+            return
+        ports = f"{self._first_port}-{last_port}" if last_port > self._first_port else str(self._first_port)
+        logger.error(f"Could not start the metrics server on {self._host}:{ports}: {error}")
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            self.port = None
+
+
+metrics_server = MetricsServer()
@@ -0,0 +1,196 @@
+import json
+
+from .config import EXPENSE_CATEGORIES, LLM_INPUT_MAX_TOKENS, LLM_STRUCTURED_OUTPUT
+
+# Bump whenever the prompts change so cached responses from older prompts are not reused
+PROMPT_VERSION = "2"
+
+# The same for every request, text or image, so providers can cache the prompt prefix
+SYSTEM_PROMPT = (
+    "You extract expenses from messages and receipt photos. Each expense is an object "
+    '{"amount": number, "category": string, "description": short string or null, '
+    '"date": "YYYY-MM-DD" or null}. '
+    f"category is one of: {', '.join(EXPENSE_CATEGORIES)}; use \"Other\" if none fits. "
+    "Answer with JSON only, without prose or code fences."
+)
+
+# Shape of the answer per request kind; with structured output the schema enforces it instead
+_TEXT_INSTRUCTION = "Expenses in this text, as a JSON array ([] if none):\n"
+_BATCH_INSTRUCTION = (
+    "This JSON object maps ids to texts. Answer with a JSON object mapping every id "
+    "to the JSON array of expenses in its text ([] if none):\n"
+)
+_IMAGE_INSTRUCTION = "Expenses on this receipt, as a JSON array ([] if none)."
+_CATEGORIZE_INSTRUCTION = (
+    "This JSON object maps ids to bank statement lines, each one expense. Answer with a "
+    "JSON object mapping every id to the category of its expense:\n"
+)
+_TEXT_INSTRUCTION_STRUCTURED = "Expenses in this text:\n"
+_BATCH_INSTRUCTION_STRUCTURED = "This JSON object maps ids to texts. List the expenses of every id:\n"
+_IMAGE_INSTRUCTION_STRUCTURED = "Expenses on this receipt."
+_CATEGORIZE_INSTRUCTION_STRUCTURED = (
+    "This JSON object maps ids to bank statement lines, each one expense. Give the category of every id:\n"
+)
+
+_BYTES_PER_TOKEN = 4
+
+_EXPENSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "amount": {"type": "number"},
+        "category": {"type": "string", "enum": list(EXPENSE_CATEGORIES)},
+        "description": {"type": ["string", "null"]},
+        "date": {"type": ["string", "null"], "description": "YYYY-MM-DD"},
+    },
+    "required": ["amount", "category", "description", "date"],
+    "additionalProperties": False,
+}
+_EXPENSE_LIST_SCHEMA = {"type": "array", "items": _EXPENSE_SCHEMA}
+# Strict JSON schema mode needs an object at the top level, so arrays are wrapped
+_RESPONSE_FORMATS = {
+    "expenses": {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "expenses",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {"expenses": _EXPENSE_LIST_SCHEMA},
+                "required": ["expenses"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "batch": {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "batch_expenses",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "results": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {"id": {"type": "string"}, "expenses": _EXPENSE_LIST_SCHEMA},
+                            "required": ["id", "expenses"],
+                            "additionalProperties": False,
+                        },
+                    },
+                },
+                "required": ["results"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "categories": {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "categories",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "results": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "id": {"type": "string"},
+                                "category": _EXPENSE_SCHEMA["properties"]["category"],
+                            },
+                            "required": ["id", "category"],
+                            "additionalProperties": False,
+                        },
+                    },
+                },
+                "required": ["results"],
+                "additionalProperties": False,
+            },
+        },
+    },
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count of text: one token per four bytes of UTF-8.
+
+    Close enough for English and Latin-script text; Cyrillic and other scripts
+    take two bytes per character and come out at about two characters per token.
+    """
+    return -(-len(text.encode("utf-8")) // _BYTES_PER_TOKEN)
+
+def truncate_to_budget(text: str, max_tokens: int = LLM_INPUT_MAX_TOKENS) -> str:
+    """Cuts text to about max_tokens tokens at a word boundary; 0 disables the limit."""
+    if not max_tokens or estimate_tokens(text) <= max_tokens:
+        return text
+    cut = text.encode("utf-8")[:max_tokens * _BYTES_PER_TOKEN].decode("utf-8", errors="ignore")
+    head, space, _ = cut.rpartition(" ")
+    return head if space and head else cut
+
+def text_messages(text: str, structured: bool = LLM_STRUCTURED_OUTPUT) -> list[dict]:
+    """Chat messages asking for the expenses in one text."""
+    instruction = _TEXT_INSTRUCTION_STRUCTURED if structured else _TEXT_INSTRUCTION
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": instruction + truncate_to_budget(text)},
+    ]
+
+def batch_messages(texts: dict[str, str], structured: bool = LLM_STRUCTURED_OUTPUT) -> list[dict]:
+    """Chat messages asking for the expenses of several texts keyed by request id."""
+    instruction = _BATCH_INSTRUCTION_STRUCTURED if structured else _BATCH_INSTRUCTION
+    truncated = {request_id: truncate_to_budget(text) for request_id, text in texts.items()}
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": instruction + json.dumps(truncated, ensure_ascii=False, separators=(",", ":"))},
+    ]
+
+def categorize_messages(descriptions: dict[str, str], structured: bool = LLM_STRUCTURED_OUTPUT) -> list[dict]:
+    """Chat messages asking for the category of each bank statement line, keyed by id."""
+    instruction = _CATEGORIZE_INSTRUCTION_STRUCTURED if structured else _CATEGORIZE_INSTRUCTION
+    truncated = {key: truncate_to_budget(text) for key, text in descriptions.items()}
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": instruction + json.dumps(truncated, ensure_ascii=False, separators=(",", ":"))},
+    ]
+
+def image_messages(image_url: str, structured: bool = LLM_STRUCTURED_OUTPUT) -> list[dict]:
+    """Chat messages asking for the expenses on a receipt image."""
+    instruction = _IMAGE_INSTRUCTION_STRUCTURED if structured else _IMAGE_INSTRUCTION
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": [
+            {"type": "text", "text": instruction},
+            {"type": "image_url", "image_url": {"url": image_url}},
+        ]},
+    ]
+
+def response_format(kind: str, structured: bool = LLM_STRUCTURED_OUTPUT) -> dict | None:
+    """The response_format for a request ("expenses", "batch" or "categories"), or None without structured output."""
+    return _RESPONSE_FORMATS[kind] if structured else None
+
+def unwrap_expenses(parsed):
+    """The expense list of an answer, whether it came wrapped by the schema or as a bare array."""
+    if isinstance(parsed, dict) and isinstance(parsed.get("expenses"), list):
+        return parsed["expenses"]
+    return parsed
+
+def unwrap_batch(parsed):
+    """{id: expenses} of a batch answer, whether it came as schema results or as a plain object."""
+    if isinstance(parsed, dict) and isinstance(parsed.get("results"), list):
+        return {
+            str(result.get("id")): result.get("expenses")
+            for result in parsed["results"] if isinstance(result, dict)
+        }
+    return parsed
+
+def unwrap_categories(parsed):
+    """{id: category} of a categorization answer, whether it came as schema results or as a plain object."""
+    if isinstance(parsed, dict) and isinstance(parsed.get("results"), list):
+        return {
+            str(result.get("id")): result.get("category")
+            for result in parsed["results"] if isinstance(result, dict)
+        }
+    return parsed
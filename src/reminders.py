@@ -0,0 +1,204 @@
+import asyncio
+import datetime
+import logging
+from collections import Counter
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import telegram
+from sqlalchemy import or_, select, update
+
+from .config import (
+    REMINDER_TIME, REMINDER_DEFAULT_TIMEZONE, REMINDER_SEND_WINDOW, REMINDER_RATE_LIMIT,
+    REMINDER_CONCURRENCY, REMINDER_CHUNK_SIZE, REMINDER_MAX_RETRIES
+)
+from .database import User, get_async_db_session
+
+logger = logging.getLogger(__name__)
+
+REMINDER_TEXT = "Remember to add your expenses for today!"
+
+
+def parse_timezone(name: str) -> ZoneInfo | None:
+    """Returns the zone for an IANA name such as 'Europe/Berlin', or None if it is unknown."""
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+
+def _retry_after_seconds(error: telegram.error.RetryAfter) -> float:
+    retry_after = error.retry_after
+    if isinstance(retry_after, datetime.timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+class _SendPacer:
+    """Hands out send slots 1/rate seconds apart; pause() holds every sender back after a RetryAfter."""
+
+    def __init__(self, rate: float):
+        self._interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_slot = 0.0
+        self._paused_until = 0.0
+
+    async def wait(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            slot = max(now, self._next_slot, self._paused_until)
+            self._next_slot = slot + self._interval
+            if slot > now:
+                await asyncio.sleep(slot - now)
+            # A pause that started while this sender slept moves it behind the pause
+            if loop.time() >= self._paused_until:
+                return
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, asyncio.get_running_loop().time() + seconds)
+
+
+class ReminderDispatcher:
+    """
+    Sends the daily reminder to every user whose local reminder time has come.
+
+    Meant to run every few minutes. Each run finds the timezones (users' own, or the
+    default) where the local time is within `window` seconds after `at`, and pages
+    through those users by ID in chunks of `chunk_size` rows, skipping users who were
+    already reminded or already logged an expense that local day. Each chunk is read
+    in its own short transaction, so no reader stays open during the paced sends
+    (on SQLite it would keep the WAL from being checkpointed). Sends run concurrently
+    but are paced to `rate` messages per second overall; a RetryAfter from Telegram
+    pauses all senders for the requested time and the message is sent again.
+    Users are marked as reminded chunk by chunk, so an interrupted run resumes
+    where it stopped on the next check.
+    """
+
+    def __init__(
+        self,
+        at: str = REMINDER_TIME,
+        default_timezone: str = REMINDER_DEFAULT_TIMEZONE,
+        window: float = REMINDER_SEND_WINDOW,
+        rate: float = REMINDER_RATE_LIMIT,
+        concurrency: int = REMINDER_CONCURRENCY,
+        chunk_size: int = REMINDER_CHUNK_SIZE,
+        max_retries: int = REMINDER_MAX_RETRIES
+    ):
+        self._at = datetime.time.fromisoformat(at)
+        self._default_timezone = default_timezone
+        self._window = datetime.timedelta(seconds=window)
+        self._rate = rate
+        self._concurrency = concurrency
+        self._chunk_size = chunk_size
+        self._max_retries = max_retries
+        self._lock = asyncio.Lock()
+        self._counters = Counter()
+
+    def _due_day(self, zone: ZoneInfo, now: datetime.datetime) -> datetime.date | None:
+        """The local date whose reminder is due in the zone at `now`, or None outside the send window."""
+        local_now = now.astimezone(zone)
+        for day in (local_now.date(), local_now.date() - datetime.timedelta(days=1)):
+            due_at = datetime.datetime.combine(day, self._at, tzinfo=zone)
+            if due_at <= local_now < due_at + self._window:
+                return day
+        return None
+
+    async def _due_zones(self, now: datetime.datetime) -> list[tuple[str | None, datetime.date, datetime.datetime]]:
+        """Returns (stored timezone, local date, start of that date in UTC) for each zone that is due."""
+        async with get_async_db_session() as session:
+            names = (await session.execute(select(User.timezone).distinct())).scalars().all()
+
+        due = []
+        for name in names:
+            zone = parse_timezone(name or self._default_timezone)
+            if zone is None:
+                logger.warning(f"Skipping reminders for unknown timezone '{name or self._default_timezone}'")
+                continue
+            day = self._due_day(zone, now)
+            if day is not None:
+                day_start = datetime.datetime.combine(day, datetime.time.min, tzinfo=zone)
+                due.append((name, day, day_start.astimezone(datetime.timezone.utc).replace(tzinfo=None)))
+        return due
+
+    async def _send(self, bot: telegram.Bot, user_id: int, pacer: _SendPacer, semaphore: asyncio.Semaphore) -> str:
+        async with semaphore:
+            for _ in range(self._max_retries + 1):
+                await pacer.wait()
+                try:
+                    await bot.send_message(chat_id=user_id, text=REMINDER_TEXT)
+                    return "sent"
+                except telegram.error.RetryAfter as e:
+                    self._counters["retry_after"] += 1
+                    pacer.pause(_retry_after_seconds(e))
+                except (telegram.error.Forbidden, telegram.error.BadRequest) as e:
+                    # Blocked the bot or deleted the account: retrying today will not help
+                    logger.info(f"Reminder to user {user_id} undeliverable: {e}")
+                    return "undeliverable"
+                except Exception as e:
+                    logger.warning(f"Failed to send reminder to user {user_id}: {e}")
+                    return "failed"
+            return "failed"
+
+    async def _due_user_ids(self, name: str | None, day: datetime.date, day_start: datetime.datetime,
+                            after: int | None) -> list[int]:
+        """The next chunk of IDs, in ID order, of the zone's users who are due a reminder."""
+        query = select(User.id).where(
+            User.timezone.is_(None) if name is None else User.timezone == name,
+            or_(User.reminded_on.is_(None), User.reminded_on < day),
+            or_(User.last_expense_at.is_(None), User.last_expense_at < day_start)
+        )
+        if after is not None:
+            query = query.where(User.id > after)
+        async with get_async_db_session() as session:
+            result = await session.execute(query.order_by(User.id).limit(self._chunk_size))
+            return list(result.scalars())
+
+    async def _mark_reminded(self, user_ids: list[int], day: datetime.date) -> None:
+        if not user_ids:
+            return
+        async with get_async_db_session() as session:
+            await session.execute(update(User).where(User.id.in_(user_ids)).values(reminded_on=day))
+            await session.commit()
+
+    async def run(self, bot: telegram.Bot, now: datetime.datetime | None = None) -> dict:
+        """
+        Sends the reminders that are due.
+
+        Args:
+            bot: The bot used to send the messages.
+            now: Aware current time, for tests and benchmarks; defaults to the clock.
+
+        Returns:
+            How many reminders were sent, undeliverable or failed in this run.
+        """
+        if self._lock.locked():
+            logger.warning("Previous reminder run still in progress, skipping this check")
+            return {}
+
+        async with self._lock:
+            now = now or datetime.datetime.now(datetime.timezone.utc)
+            pacer = _SendPacer(self._rate)
+            semaphore = asyncio.Semaphore(self._concurrency)
+            outcomes = Counter()
+            for name, day, day_start in await self._due_zones(now):
+                last_id = None
+                while user_ids := await self._due_user_ids(name, day, day_start, last_id):
+                    results = await asyncio.gather(
+                        *(self._send(bot, user_id, pacer, semaphore) for user_id in user_ids)
+                    )
+                    outcomes.update(results)
+                    # Failed sends stay unmarked and are retried on the next check
+                    await self._mark_reminded(
+                        [user_id for user_id, outcome in zip(user_ids, results) if outcome != "failed"], day
+                    )
+                    last_id = user_ids[-1]
+
+            self._counters["runs"] += 1
+            self._counters.update(outcomes)
+            if outcomes:
+                logger.info(f"Daily reminder run: {dict(outcomes)}")
+            return dict(outcomes)
+
+    def stats(self) -> dict:
+        return dict(self._counters)
+
+
+reminder_dispatcher = ReminderDispatcher()
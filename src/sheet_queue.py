@@ -0,0 +1,96 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from .config import SHEETS_MAX_WORKERS
+from .sheets_writer import refresh_monthly_stats
+
+logger = logging.getLogger(__name__)
+
+
+class SheetWriteQueue:
+    """
+    Runs blocking gspread work on a bounded thread pool without blocking the event loop.
+
+    Jobs are queued per spreadsheet ID and executed one at a time for that spreadsheet,
+    so writes to the same sheet keep their submission order while different
+    spreadsheets are written concurrently (up to max_workers at once).
+    """
+
+    def __init__(self, max_workers: int = SHEETS_MAX_WORKERS):
+        self._max_workers = max_workers
+        self._executor: ThreadPoolExecutor | None = None
+        self._queues: dict[str, asyncio.Queue] = {}
+        self._drainers: dict[str, asyncio.Task] = {}
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._max_workers,
+                thread_name_prefix="sheets-writer"
+            )
+        return self._executor
+
+    async def submit(self, spreadsheet_id: str, func, *args, **kwargs):
+        """
+        Queues a blocking call for the given spreadsheet and waits for its result.
+
+        Args:
+            spreadsheet_id: The Google Sheet ID the call operates on (ordering key).
+            func: The blocking callable to run on the worker pool.
+
+        Returns:
+            Whatever func returns. Exceptions raised by func are re-raised here.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        queue = self._queues.get(spreadsheet_id)
+        if queue is None:
+            queue = self._queues[spreadsheet_id] = asyncio.Queue()
+        queue.put_nowait((future, functools.partial(func, *args, **kwargs)))
+
+        if spreadsheet_id not in self._drainers:
+            self._drainers[spreadsheet_id] = asyncio.create_task(self._drain(spreadsheet_id, queue))
+
+        # Shield the job so a cancelled handler does not abandon an accepted write
+        return await asyncio.shield(future)
+
+    async def _drain(self, spreadsheet_id: str, queue: asyncio.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while not queue.empty():
+                future, call = queue.get_nowait()
+                try:
+                    result = await loop.run_in_executor(self._get_executor(), call)
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                    else:
+                        logger.error(f"Sheet job for '{spreadsheet_id}' failed after caller went away: {e}")
+                else:
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            # Nothing awaits between the empty() check and here, so no job can slip in unseen
+            self._drainers.pop(spreadsheet_id, None)
+            self._queues.pop(spreadsheet_id, None)
+
+    def pending(self) -> int:
+        """Returns the number of queued jobs that have not started yet."""
+        return sum(queue.qsize() for queue in self._queues.values())
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stops the worker pool. Call once the application is shutting down."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+sheet_write_queue = SheetWriteQueue()
+
+
+async def refresh_monthly_stats_async(user_id: int, spreadsheet_id: str, month: str) -> dict | None:
+    """Non-blocking wrapper around refresh_monthly_stats, ordered with the sheet's writes."""
+    return await sheet_write_queue.submit(spreadsheet_id, refresh_monthly_stats, user_id, spreadsheet_id, month)
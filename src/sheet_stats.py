@@ -2,59 +2,117 @@ import logging
 import gspread
 from gspread.exceptions import APIError
 
+from .sheets_scheduler import sheets_scheduler
+
 # Set up logging
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-STATS_WRITE_RANGE = "G2:H5"
-STATS_READ_RANGE = "H3:H5" # Range to read Total, Limit, Left values
-STATS_DATA = [
-    ["Stats", ""],
-    ["Total", "=SUM(C2:C)"],
-    ["Limit", 1800],  # Hardcoded limit for now
-    ["Left", "=H4-H3"]
-]
+# Column G stays empty: Sheets appends after the table around A1, and a block right
+# next to the data (A:F) would join it, so appends to a short month would skip rows
+STATS_WRITE_RANGE = "H2:I5"
+LEGACY_STATS_RANGE = "G2:H5"  # Where the block was before ExpenseID took column F
+EXPENSE_VALUES_RANGE = "B2:C"  # UserID and Amount columns, used for reconciliation
+
+def build_stats_data(limit: float) -> list:
+    """Returns the stats block (labels and formulas) for the given monthly limit."""
+    return [
+        ["Stats", ""],
+        ["Total", "=SUM(C2:C)"],
+        ["Limit", limit],
+        ["Left", "=I4-I3"]
+    ]
+
+def is_stats_block(values: list) -> bool:
+    """True if values, the rows of a 4x2 range, carry the stats block's labels whatever their numbers."""
+    labels = [str(row[0]) if row else "" for row in values]
+    return labels == [row[0] for row in build_stats_data(0)]
+
+def _normalize_rows(rows: list) -> list:
+    """Stringifies cells and drops trailing empty cells, as the Sheets API omits them."""
+    normalized = []
+    for row in rows:
+        cells = [str(cell) for cell in row]
+        while cells and cells[-1] == "":
+            cells.pop()
+        normalized.append(cells)
+    return normalized
 
-def update_monthly_stats(worksheet: gspread.Worksheet) -> dict | None:
+def stats_block_limit(values: list) -> float | None:
+    """
+    Returns the limit stored in a stats block read with valueRenderOption=FORMULA,
+    or None if the block is missing or its labels/formulas do not match.
+
+    Args:
+        values: The rows of STATS_WRITE_RANGE as returned by the Sheets API.
     """
-    Updates the statistics block (Total, Limit, Left) in the given worksheet
-    and reads the calculated values back.
+    try:
+        limit = float(values[2][1])
+    except (IndexError, TypeError, ValueError):
+        return None
+    if _normalize_rows(values) != _normalize_rows(build_stats_data(values[2][1])):
+        return None
+    return limit
+
+def update_monthly_stats(worksheet: gspread.Worksheet, limit: float) -> bool:
+    """
+    Writes the statistics block (Total, Limit, Left) in the given worksheet.
+
+    The block is only kept for people looking at the sheet; the bot takes its
+    numbers from the local ledger, so nothing is read back.
 
     Args:
         worksheet: The gspread Worksheet object to update.
-    
+        limit: The monthly limit to show in the block.
+
     Returns:
-        A dictionary containing the stats {'total': ..., 'limit': ..., 'left': ...}
-        or None if an error occurred.
+        True if the block was written, False if an error occurred.
     """
     try:
-        # Write the stats headers and formulas
-        worksheet.update(
-            STATS_WRITE_RANGE,
-            STATS_DATA,
+        sheets_scheduler.call(
+            worksheet.spreadsheet_id,
+            worksheet.update,
+            range_name=STATS_WRITE_RANGE,
+            values=build_stats_data(limit),
             value_input_option='USER_ENTERED' # Important for formulas
         )
         logger.info(f"Successfully updated stats structure in worksheet '{worksheet.title}'.")
+        return True
+    except APIError as e:
+        logger.error(f"API error during stats update in worksheet '{worksheet.title}': {e}")
+        return False
+    except Exception as e:
+        logger.error(f"Unexpected error during stats update in worksheet '{worksheet.title}': {e}")
+        return False
 
-        # Read the calculated values back
-        # Use value_render_option='FORMATTED_VALUE' to get numbers as seen in sheet
-        stats_values = worksheet.get(STATS_READ_RANGE, value_render_option='FORMATTED_VALUE')
-        
-        if len(stats_values) == 3: # Should be [[Total], [Limit], [Left]]
-            stats_dict = {
-                'total': stats_values[0][0] if stats_values[0] else 'N/A',
-                'limit': stats_values[1][0] if stats_values[1] else 'N/A',
-                'left': stats_values[2][0] if stats_values[2] else 'N/A'
-            }
-            logger.info(f"Successfully read stats values: {stats_dict}")
-            return stats_dict
-        else:
-            logger.error(f"Read unexpected number of rows for stats: {len(stats_values)}")
-            return None
+def read_user_total(worksheet: gspread.Worksheet, user_id: int) -> float | None:
+    """
+    Sums the Amount column of the rows belonging to user_id.
+
+    Args:
+        worksheet: The gspread Worksheet object to read.
+        user_id: Telegram user ID stored in the UserID column.
 
+    Returns:
+        The total, or None if the sheet could not be read.
+    """
+    try:
+        rows = sheets_scheduler.call(
+            worksheet.spreadsheet_id, worksheet.get, EXPENSE_VALUES_RANGE, value_render_option='UNFORMATTED_VALUE'
+        )
     except APIError as e:
-        logger.error(f"API error during stats update/read in worksheet '{worksheet.title}': {e}")
+        logger.error(f"API error while reading expenses from worksheet '{worksheet.title}': {e}")
         return None
     except Exception as e:
-        logger.error(f"Unexpected error during stats update/read in worksheet '{worksheet.title}': {e}")
-        return None 
\ No newline at end of file
+        logger.error(f"Unexpected error while reading expenses from worksheet '{worksheet.title}': {e}")
+        return None
+
+    total = 0.0
+    for row in rows:
+        if len(row) < 2 or str(row[0]) != str(user_id):
+            continue
+        try:
+            total += float(row[1])
+        except (TypeError, ValueError):
+            continue
+    return total
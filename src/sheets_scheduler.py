@@ -0,0 +1,203 @@
+import contextlib
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+
+from gspread.exceptions import APIError
+
+from .config import (
+    SHEETS_RATE_LIMIT, SHEETS_RATE_BURST, SHEETS_SPREADSHEET_RATE_LIMIT, SHEETS_SPREADSHEET_RATE_BURST,
+    SHEETS_MAX_RETRIES, SHEETS_BACKOFF_BASE, SHEETS_BACKOFF_MAX
+)
+
+from .metrics import sheets_call_latency, api_errors
+
+logger = logging.getLogger(__name__)
+
+# Call priorities: lower values get quota first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+_RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def _status_of(error: APIError) -> int:
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else error.code
+
+def _retry_after(error: APIError) -> float | None:
+    """Seconds from the Retry-After header of a throttled response, if present."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class _TokenBucket:
+    """Refills `rate` tokens per second up to `capacity`. Not thread-safe on its own."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0  # Set from Retry-After: no tokens are handed out before then
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token is available (0 if one is available now)."""
+        # A Retry-After pause holds even when the rate is unlimited
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.rate <= 0:
+            return 0.0
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        if self.rate > 0:
+            self.tokens -= 1
+
+
+class SheetsScheduler:
+    """
+    Gatekeeper for every Google Sheets API call.
+
+    A call takes a token from its spreadsheet's bucket and then from the global bucket
+    (the service account's quota). Waiters for the global bucket are served by
+    priority, so interactive calls overtake queued background work. Throttled (429)
+    and transient 5xx responses are retried with jittered exponential backoff; a
+    Retry-After header pauses the global bucket for everyone. Calls that are not
+    idempotent (appends, row inserts) are only retried on 429, where the request is
+    known to have been rejected.
+
+    call() blocks, so it is meant for the sheets worker threads.
+    """
+
+    def __init__(
+        self,
+        rate: float = SHEETS_RATE_LIMIT,
+        burst: float = SHEETS_RATE_BURST,
+        spreadsheet_rate: float = SHEETS_SPREADSHEET_RATE_LIMIT,
+        spreadsheet_burst: float = SHEETS_SPREADSHEET_RATE_BURST,
+        max_retries: int = SHEETS_MAX_RETRIES,
+        backoff_base: float = SHEETS_BACKOFF_BASE,
+        backoff_max: float = SHEETS_BACKOFF_MAX
+    ):
+        self._global = _TokenBucket(rate, burst)
+        self._spreadsheet_rate = spreadsheet_rate
+        self._spreadsheet_burst = spreadsheet_burst
+        self._buckets: dict[str, _TokenBucket] = {}
+        self._max_retries = max_retries
+        self._backoff_base = backoff_base
+        self._backoff_max = backoff_max
+        self._condition = threading.Condition()
+        self._waiters: list[tuple[int, int]] = []  # Heap of (priority, ticket) for the global bucket
+        self._tickets = itertools.count()
+        self._local = threading.local()
+        self._counters = {"calls": 0, "throttled": 0, "retries": 0, "failures": 0, "wait_seconds": 0.0}
+
+    @contextlib.contextmanager
+    def priority(self, priority: int):
+        """Runs the calls made by this thread inside the block at the given priority."""
+        previous = getattr(self._local, "priority", INTERACTIVE)
+        self._local.priority = priority
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+
+    def _bucket(self, spreadsheet_id: str) -> _TokenBucket:
+        bucket = self._buckets.get(spreadsheet_id)
+        if bucket is None:
+            bucket = self._buckets[spreadsheet_id] = _TokenBucket(self._spreadsheet_rate, self._spreadsheet_burst)
+            if len(self._buckets) > 4096:
+                # Drop buckets that have refilled completely; they carry no state
+                now = time.monotonic()
+                for key in [k for k, b in self._buckets.items() if b.wait_time(now) == 0 and b.tokens >= b.capacity]:
+                    del self._buckets[key]
+                self._buckets[spreadsheet_id] = bucket
+        return bucket
+
+    def _acquire(self, spreadsheet_id: str, priority: int) -> None:
+        started = time.monotonic()
+        with self._condition:
+            bucket = self._bucket(spreadsheet_id)
+            while (delay := bucket.wait_time(time.monotonic())) > 0:
+                self._condition.wait(delay)
+            bucket.take()
+
+            waiter = (priority, next(self._tickets))
+            heapq.heappush(self._waiters, waiter)
+            try:
+                while True:
+                    delay = self._global.wait_time(time.monotonic())
+                    if self._waiters[0] == waiter and delay == 0:
+                        break
+                    self._condition.wait(delay or None)
+                self._global.take()
+            finally:
+                self._waiters.remove(waiter)
+                heapq.heapify(self._waiters)
+                self._condition.notify_all()
+            self._counters["wait_seconds"] += time.monotonic() - started
+
+    def _pause(self, seconds: float) -> None:
+        with self._condition:
+            self._global.blocked_until = max(self._global.blocked_until, time.monotonic() + seconds)
+
+    def _backoff(self, attempt: int) -> float:
+        return min(self._backoff_base * 2 ** attempt, self._backoff_max) * random.uniform(0.5, 1.0)
+
+    def call(self, spreadsheet_id: str, func, *args, idempotent: bool = True, **kwargs):
+        """
+        Runs func(*args, **kwargs) once quota allows, retrying throttled or transient failures.
+
+        Args:
+            spreadsheet_id: The spreadsheet the call operates on (per-spreadsheet bucket).
+            func: The gspread method to call.
+            idempotent: False for calls that must not be repeated if they may have landed.
+
+        Returns:
+            Whatever func returns. The last APIError is re-raised once retries run out.
+        """
+        priority = getattr(self._local, "priority", INTERACTIVE)
+        method = getattr(func, "__name__", "call")
+        for attempt in range(self._max_retries + 1):
+            self._acquire(spreadsheet_id, priority)
+            with self._condition:
+                self._counters["calls"] += 1
+            try:
+                with sheets_call_latency.time(method):
+                    return func(*args, **kwargs)
+            except APIError as e:
+                status = _status_of(e)
+                api_errors.inc("sheets", str(status))
+                retryable = status == 429 or (idempotent and status in _RETRYABLE_STATUS)
+                if not retryable or attempt == self._max_retries:
+                    with self._condition:
+                        self._counters["failures"] += 1
+                    raise
+                delay = self._backoff(attempt)
+                if status == 429:
+                    retry_after = _retry_after(e)
+                    if retry_after is not None:
+                        delay = max(delay, retry_after)
+                    # The quota is shared by the whole service account, so everyone waits
+                    self._pause(delay)
+                with self._condition:
+                    self._counters["throttled" if status == 429 else "retries"] += 1
+                logger.warning(f"Sheets API returned {status} for '{spreadsheet_id}', retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def stats(self) -> dict:
+        """Returns call, throttle and retry counters and the total time spent waiting for quota."""
+        with self._condition:
+            return {**self._counters, "wait_seconds": round(self._counters["wait_seconds"], 3)}
+
+
+sheets_scheduler = SheetsScheduler()
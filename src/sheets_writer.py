@@ -1,20 +1,79 @@
 import logging
 import datetime
+import threading
+import time
+from collections import OrderedDict
 
 import gspread
 from google.oauth2 import service_account
 from gspread.exceptions import SpreadsheetNotFound, WorksheetNotFound, APIError
+from gspread.utils import absolute_range_name
 
-from .config import GOOGLE_SERVICE_ACCOUNT_CREDENTIALS_PATH
-from .sheet_stats import update_monthly_stats
+from .config import GOOGLE_SERVICE_ACCOUNT_CREDENTIALS_PATH, SHEETS_HANDLE_CACHE_SIZE, SHEETS_HANDLE_CACHE_TTL
+from . import ledger
+from .sheets_scheduler import sheets_scheduler
+from .sheet_stats import (
+    STATS_WRITE_RANGE, LEGACY_STATS_RANGE, is_stats_block, read_user_total, stats_block_limit, update_monthly_stats
+)
 
 # Set up logging
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-HEADERS = ["Timestamp", "UserID", "Amount", "Category", "Description"]
+HEADERS = ["Timestamp", "UserID", "Amount", "Category", "Description", "ExpenseID"]
+HEADERS_RANGE = "A1:F1"
+EXPENSE_ID_RANGE = "F2:F"  # Idempotency markers, read back before retrying a sync
 
-def _get_gspread_client():
+
+class _HandleCache:
+    """
+    Thread-safe LRU cache with a per-entry TTL for gspread Spreadsheet/Worksheet handles.
+
+    Keys are (spreadsheet_id, sheet_name) tuples; spreadsheet handles use sheet_name=None.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: tuple, value) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self._ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def drop_spreadsheet(self, spreadsheet_id: str) -> None:
+        """Drops the spreadsheet handle and all of its worksheet handles."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == spreadsheet_id]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_handle_cache = _HandleCache(SHEETS_HANDLE_CACHE_SIZE, SHEETS_HANDLE_CACHE_TTL)
+_client = None
+_client_lock = threading.Lock()
+
+
+def _authorize_gspread_client():
     scopes = ['https://www.googleapis.com/auth/spreadsheets']
     try:
         credentials = service_account.Credentials.from_service_account_file(
@@ -29,110 +88,222 @@ def _get_gspread_client():
         logger.error(f"Failed to authenticate with Google Sheets API: {e}")
     return None
 
-def write_expenses_to_sheet(expenses: list[dict], spreadsheet_id: str) -> dict | None:
-    """
-    Writes expenses to the appropriate monthly sheet and returns the updated stats.
+def _get_gspread_client():
+    """Returns the long-lived authorized client, authorizing on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = _authorize_gspread_client()
+        return _client
 
-    Args:
-        expenses: A list of expense dictionaries.
-        spreadsheet_id: The Google Sheet ID.
+def _get_spreadsheet(client, spreadsheet_id: str):
+    key = (spreadsheet_id, None)
+    spreadsheet = _handle_cache.get(key)
+    if spreadsheet is None:
+        spreadsheet = sheets_scheduler.call(spreadsheet_id, client.open_by_key, spreadsheet_id)
+        _handle_cache.put(key, spreadsheet)
+    return spreadsheet
 
-    Returns:
-        A dictionary containing the updated stats {'total': ..., 'limit': ..., 'left': ...}
-        or None if an error occurred.
+class _MonthlySheet:
+    """A cached worksheet handle plus what is already known about its layout."""
+
+    __slots__ = ("worksheet", "layout_verified", "needs_headers", "stats_limit")
+
+    def __init__(self, worksheet, layout_verified: bool = False, needs_headers: bool = False):
+        self.worksheet = worksheet
+        self.layout_verified = layout_verified
+        self.needs_headers = needs_headers
+        self.stats_limit = None  # Limit shown in the stats block, None if missing or unknown
+
+def _get_monthly_sheet(spreadsheet, spreadsheet_id: str, sheet_name: str) -> _MonthlySheet:
+    key = (spreadsheet_id, sheet_name)
+    monthly_sheet = _handle_cache.get(key)
+    if monthly_sheet is not None:
+        return monthly_sheet
+
+    try:
+        monthly_sheet = _MonthlySheet(sheets_scheduler.call(spreadsheet_id, spreadsheet.worksheet, sheet_name))
+    except WorksheetNotFound:
+        logger.info(f"Worksheet '{sheet_name}' not found. Creating new monthly sheet.")
+        worksheet = sheets_scheduler.call(
+            spreadsheet_id, spreadsheet.add_worksheet, title=sheet_name, rows="100", cols="10", idempotent=False
+        )
+        # A fresh sheet is known to be empty: headers go out with the first append
+        monthly_sheet = _MonthlySheet(worksheet, layout_verified=True, needs_headers=True)
+    _handle_cache.put(key, monthly_sheet)
+    return monthly_sheet
+
+def _verify_layout(spreadsheet, monthly_sheet: _MonthlySheet, sheet_name: str) -> None:
+    """Checks the header row and stats block with a single batched read."""
+    ranges = [
+        absolute_range_name(sheet_name, HEADERS_RANGE),
+        absolute_range_name(sheet_name, STATS_WRITE_RANGE),
+        absolute_range_name(sheet_name, LEGACY_STATS_RANGE)
+    ]
+    response = sheets_scheduler.call(
+        spreadsheet.id, spreadsheet.values_batch_get, ranges, params={"valueRenderOption": "FORMULA"}
+    )
+    value_ranges = response.get("valueRanges", [])
+    header_values = value_ranges[0].get("values", []) if len(value_ranges) > 0 else []
+    stats_values = value_ranges[1].get("values", []) if len(value_ranges) > 1 else []
+    legacy_stats_values = value_ranges[2].get("values", []) if len(value_ranges) > 2 else []
+
+    existing_headers = header_values[0] if header_values else []
+    monthly_sheet.stats_limit = stats_block_limit(stats_values)
+    if is_stats_block(legacy_stats_values):
+        # Cleared before any header row is inserted, while the old block is still at G2:H5;
+        # the block is rewritten at its new place after the next append
+        sheets_scheduler.call(spreadsheet.id, monthly_sheet.worksheet.batch_clear, [LEGACY_STATS_RANGE])
+        logger.info(f"Removed stats block from {LEGACY_STATS_RANGE} of worksheet '{sheet_name}'.")
+    if existing_headers != HEADERS:
+        if not existing_headers:
+            sheets_scheduler.call(spreadsheet.id, monthly_sheet.worksheet.update, range_name=HEADERS_RANGE, values=[HEADERS])
+            logger.info("Inserted headers into empty worksheet.")
+        elif existing_headers == HEADERS[:len(existing_headers)]:
+            # Sheet from before a column was added: extend the header row in place
+            sheets_scheduler.call(spreadsheet.id, monthly_sheet.worksheet.update, range_name=HEADERS_RANGE, values=[HEADERS])
+            logger.info("Extended headers of worksheet.")
+        else:
+            sheets_scheduler.call(spreadsheet.id, monthly_sheet.worksheet.insert_row, HEADERS, 1, idempotent=False)
+            # Inserting a row shifts the stats block down, so it has to be rewritten
+            monthly_sheet.stats_limit = None
+            logger.info("Prepended headers to worksheet.")
+    monthly_sheet.layout_verified = True
+
+def _prepare_worksheet(spreadsheet_id: str, sheet_name: str) -> _MonthlySheet | None:
     """
-    if not expenses:
-        logger.warning("No expenses to write to sheet")
-        return None
+    Resolves the monthly worksheet through the handle cache and verifies its layout
+    the first time it is seen.
 
+    A failure on cached handles drops them and retries once with freshly fetched
+    handles, so deleted or renamed sheets are rebuilt transparently.
+    """
     client = _get_gspread_client()
     if not client:
         logger.error("Google Sheets client authentication failed.")
         return None
 
-    try:
-        spreadsheet = client.open_by_key(spreadsheet_id)
-    except SpreadsheetNotFound:
-        logger.error(f"Spreadsheet with ID '{spreadsheet_id}' not found.")
-        return None
-    except APIError as e:
-        logger.error(f"API error when accessing spreadsheet: {e}")
-        return None
+    for attempt in range(2):
+        try:
+            spreadsheet = _get_spreadsheet(client, spreadsheet_id)
+            monthly_sheet = _get_monthly_sheet(spreadsheet, spreadsheet_id, sheet_name)
+            if not monthly_sheet.layout_verified:
+                _verify_layout(spreadsheet, monthly_sheet, sheet_name)
+            return monthly_sheet
+        except (SpreadsheetNotFound, WorksheetNotFound, APIError) as e:
+            _handle_cache.drop_spreadsheet(spreadsheet_id)
+            if attempt == 0:
+                logger.info(f"Dropped cached handles for spreadsheet '{spreadsheet_id}' after error: {e}")
+                continue
+            if isinstance(e, SpreadsheetNotFound):
+                logger.error(f"Spreadsheet with ID '{spreadsheet_id}' not found.")
+            else:
+                logger.error(f"API error when preparing worksheet '{sheet_name}': {e}")
+    return None
+
+def _read_expense_ids(worksheet) -> set[str]:
+    """Returns the ExpenseID markers already present in the worksheet."""
+    rows = sheets_scheduler.call(worksheet.spreadsheet_id, worksheet.get, EXPENSE_ID_RANGE)
+    return {str(row[0]) for row in rows if row}
+
+def write_expenses_to_sheet(expenses: list[dict], spreadsheet_id: str, skip_existing: bool = False) -> bool:
+    """
+    Appends expenses of one month to that month's sheet.
+
+    Once a monthly sheet's layout is known, a write is a single API call: the row
+    append. The sheet's stats block is only rewritten when it is missing or shows a
+    different limit.
+
+    Args:
+        expenses: Expense dictionaries from the same month, each with an 'expense_id'.
+        spreadsheet_id: The Google Sheet ID.
+        skip_existing: Read the sheet's ExpenseID column first and leave out rows that
+            are already there (used when retrying a write that may have landed).
+
+    Returns:
+        True if every expense is in the sheet afterwards, False if an error occurred.
+    """
+    if not expenses:
+        logger.warning("No expenses to write to sheet")
+        return False
 
     # Get month and year from first expense's timestamp
     first_expense = expenses[0]
     timestamp = first_expense.get("timestamp")
     if not isinstance(timestamp, datetime.datetime):
         logger.error("First expense timestamp is not a datetime object")
-        return None
-        
+        return False
+
     sheet_name = timestamp.strftime('%m-%Y')  # Format: MM-YYYY
 
-    try:
-        worksheet = spreadsheet.worksheet(sheet_name)
-    except WorksheetNotFound:
-        logger.info(f"Worksheet '{sheet_name}' not found. Creating new monthly sheet.")
-        try:
-            worksheet = spreadsheet.add_worksheet(title=sheet_name, rows="100", cols="10")
-            worksheet.append_row(HEADERS)
-        except APIError as e:
-            logger.error(f"Failed to create worksheet '{sheet_name}': {e}")
-            return None
-    except APIError as e:
-        logger.error(f"API error when accessing worksheet: {e}")
-        return None
+    monthly_sheet = _prepare_worksheet(spreadsheet_id, sheet_name)
+    if monthly_sheet is None:
+        return False
+    worksheet = monthly_sheet.worksheet
 
-    # Check headers
     try:
-        existing_headers = worksheet.row_values(1)
-    except APIError as e:
-        logger.error(f"API error when reading headers: {e}")
-        return None
-    except Exception:
-        existing_headers = []
+        if skip_existing and not monthly_sheet.needs_headers:
+            existing_ids = _read_expense_ids(worksheet)
+            expenses = [expense for expense in expenses if str(expense.get("expense_id")) not in existing_ids]
+            if not expenses:
+                logger.info(f"All expenses for sheet '{sheet_name}' were already written.")
+                return True
 
-    if existing_headers != HEADERS:
-        if not existing_headers:
-            try:
-                worksheet.append_row(HEADERS)
-                logger.info("Inserted headers into empty worksheet.")
-            except APIError as e:
-                logger.error(f"Failed to insert headers: {e}")
-                return None
-        else:
-            try:
-                worksheet.insert_row(HEADERS, 1)
-                logger.info("Prepended headers to worksheet.")
-            except APIError as e:
-                logger.error(f"Failed to prepend headers: {e}")
-                return None
+        # Prepare data rows
+        formatted_data = []
+        for expense in expenses:
+            timestamp = expense.get("timestamp")
+            if isinstance(timestamp, datetime.datetime):
+                timestamp_str = timestamp.strftime('%d/%m/%Y %H:%M:%S')
+            else:
+                timestamp_str = str(timestamp) if timestamp is not None else ""
 
-    # Prepare data rows
-    formatted_data = []
-    for expense in expenses:
-        timestamp = expense.get("timestamp")
-        if isinstance(timestamp, datetime.datetime):
-            timestamp_str = timestamp.strftime('%d/%m/%Y %H:%M:%S')
-        else:
-            timestamp_str = str(timestamp) if timestamp is not None else ""
-
-        row = [
-            timestamp_str,
-            str(expense.get("user_id", "")),
-            expense.get("amount", ""),
-            expense.get("category", ""),
-            expense.get("description", "")
-        ]
-        formatted_data.append(row)
+            row = [
+                timestamp_str,
+                str(expense.get("user_id", "")),
+                expense.get("amount", ""),
+                expense.get("category", ""),
+                expense.get("description", ""),
+                expense.get("expense_id", "")
+            ]
+            formatted_data.append(row)
 
-    try:
-        worksheet.append_rows(formatted_data, value_input_option='USER_ENTERED')
+        rows = [HEADERS] + formatted_data if monthly_sheet.needs_headers else formatted_data
+        sheets_scheduler.call(
+            spreadsheet_id, worksheet.append_rows, rows, value_input_option='USER_ENTERED', idempotent=False
+        )
+        monthly_sheet.needs_headers = False
         logger.info(f"Successfully appended {len(formatted_data)} expense records to sheet '{sheet_name}'.")
-        
-        # Update stats after appending data and get the results
-        stats = update_monthly_stats(worksheet)
 
-        return stats # Return the stats dictionary
+        limit = ledger.get_monthly_limit(first_expense.get("user_id"))
+        if monthly_sheet.stats_limit != limit and update_monthly_stats(worksheet, limit):
+            monthly_sheet.stats_limit = limit
+        return True
     except APIError as e:
+        # Not retried here: the append may have landed, so the retry checks ExpenseIDs first
+        _handle_cache.drop_spreadsheet(spreadsheet_id)
         logger.error(f"Failed to append expenses to sheet: {e}")
-        return None
\ No newline at end of file
+        return False
+
+def refresh_monthly_stats(user_id: int, spreadsheet_id: str, month: str) -> dict | None:
+    """
+    Reconciles the user's ledger total for a month with the sheet on demand.
+
+    Args:
+        user_id: Telegram user ID.
+        spreadsheet_id: The Google Sheet ID.
+        month: Worksheet title in MM-YYYY format.
+
+    Returns:
+        The stats dictionary {'total': ..., 'limit': ..., 'left': ...}
+        or None if the sheet could not be read.
+    """
+    monthly_sheet = _prepare_worksheet(spreadsheet_id, month)
+    if monthly_sheet is None:
+        return None
+
+    sheet_total = read_user_total(monthly_sheet.worksheet, user_id)
+    if sheet_total is None:
+        _handle_cache.drop_spreadsheet(spreadsheet_id)
+        return None
+    return ledger.reconcile_month(user_id, month, sheet_total)
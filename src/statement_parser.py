@@ -0,0 +1,233 @@
+import csv
+import datetime
+import itertools
+import logging
+import re
+from collections import Counter
+from typing import Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+_SAMPLE_LINES = 60  # Lines read ahead to find the header, delimiter, date format and sign convention
+_HEADER_SEARCH_ROWS = 20  # Bank exports often start with a few lines of account details
+_MAX_DESCRIPTION_LENGTH = 200
+
+# Header names, tried as exact matches in order and then as substrings
+_DATE_COLUMNS = ("date", "booking date", "transaction date", "posting date", "posted", "timestamp", "datum", "fecha")
+_AMOUNT_COLUMNS = ("amount", "sum", "value", "betrag", "importe", "total")
+_DEBIT_COLUMNS = ("debit", "withdrawal", "paid out", "money out", "outflow", "soll")
+_CREDIT_COLUMNS = ("credit", "deposit", "paid in", "money in", "inflow", "haben")
+_DESCRIPTION_COLUMNS = (
+    "description", "details", "payee", "merchant", "counterparty", "name", "memo", "narrative", "purpose",
+    "reference", "text", "note", "notes", "verwendungszweck", "concepto",
+)
+_CATEGORY_COLUMNS = ("category", "kategorie", "categoria")
+
+# Day-first formats come before month-first ones: 03/04/2024 is read as 3 April unless
+# the sample has a date that only parses month-first
+_DATE_FORMATS = (
+    "%Y-%m-%d", "%d.%m.%Y", "%d/%m/%Y", "%m/%d/%Y", "%d-%m-%Y", "%Y/%m/%d", "%Y.%m.%d",
+    "%d.%m.%y", "%d/%m/%y", "%m/%d/%y", "%d %b %Y", "%d-%b-%Y", "%d %B %Y", "%b %d, %Y", "%b %d %Y",
+)
+
+_DELIMITERS = (",", ";", "\t", "|")
+_AMOUNT_JUNK_RE = re.compile(r"[^\d,.]")
+
+
+def parse_amount(text: str) -> float | None:
+    """
+    Parses an amount as written in bank exports: "-12.50", "1,234.56", "1.234,56 €", "(12.50)".
+
+    A single separator followed by exactly three digits is read as a thousands
+    separator, any other single separator as the decimal point.
+    """
+    text = (text or "").strip()
+    if not text:
+        return None
+    negative = text.startswith("-") or text.endswith("-") or (text.startswith("(") and text.endswith(")"))
+    digits = _AMOUNT_JUNK_RE.sub("", text)
+    if not digits or not any(c.isdigit() for c in digits):
+        return None
+    if "," in digits and "." in digits:
+        # The separator that comes last is the decimal one
+        thousands = "," if digits.rfind(",") < digits.rfind(".") else "."
+        digits = digits.replace(thousands, "").replace(",", ".")
+    else:
+        separator = "," if "," in digits else "." if "." in digits else None
+        if separator:
+            head, _, tail = digits.rpartition(separator)
+            if digits.count(separator) > 1 or len(tail) == 3:
+                digits = digits.replace(separator, "")
+            else:
+                digits = f"{head.replace(separator, '')}.{tail}"
+    try:
+        value = float(digits)
+    except ValueError:
+        return None
+    return -value if negative else value
+
+def _parse_date(text: str, date_format: str) -> datetime.datetime | None:
+    text = text.strip()
+    if date_format == "%Y-%m-%d":
+        try:
+            return datetime.datetime.fromisoformat(text.replace("Z", "+00:00")).replace(tzinfo=None)
+        except ValueError:
+            pass
+    for candidate in (text, text.split(" ")[0], text.split("T")[0]):
+        try:
+            return datetime.datetime.strptime(candidate, date_format)
+        except ValueError:
+            continue
+    return None
+
+def _detect_date_format(samples: list[str]) -> str:
+    """The first format that parses every sample date, else the one that parses the most."""
+    samples = [sample for sample in samples if sample.strip()]
+    best, best_parsed = _DATE_FORMATS[0], -1
+    for date_format in _DATE_FORMATS:
+        parsed = sum(1 for sample in samples if _parse_date(sample, date_format) is not None)
+        if parsed == len(samples):
+            return date_format
+        if parsed > best_parsed:
+            best, best_parsed = date_format, parsed
+    return best
+
+def _detect_delimiter(sample: list[str]) -> str:
+    """
+    The delimiter that splits the most sample lines into the same number of fields.
+
+    Decimal commas ("-23,40") fool csv.Sniffer on semicolon-separated statements;
+    the column count, which only the real delimiter keeps steady, does not.
+    """
+    best, best_score = ",", (0, 0)
+    for delimiter in _DELIMITERS:
+        counts = Counter(len(row) for row in csv.reader(sample, delimiter=delimiter) if len(row) > 1)
+        if counts:
+            fields, rows = counts.most_common(1)[0]
+            if (rows, fields) > best_score:
+                best, best_score = delimiter, (rows, fields)
+    return best
+
+def _find_columns(header: list[str], names: tuple, substrings: bool = True) -> list[int]:
+    """Indexes of the header cells matching names: exact matches in name order, then substrings."""
+    cells = [cell.strip().strip('"').casefold() for cell in header]
+    found = [cells.index(name) for name in names if name in cells]
+    if substrings:
+        for index, cell in enumerate(cells):
+            if index not in found and any(name in cell for name in names):
+                found.append(index)
+    return found
+
+
+class StatementReader:
+    """
+    Streams the expenses of a CSV export or bank statement, one row at a time.
+
+    Only the first lines are read ahead, to find the header row (account details
+    above it are skipped), the delimiter, the date format and how amounts are
+    signed; after that each row is parsed as it is read, so memory does not grow
+    with the file. Recognized columns: a date, an amount (or separate debit and
+    credit columns), descriptions (payee, memo, ...) and an optional category.
+
+    In a statement with signed amounts only negative amounts are expenses;
+    positive ones are income and skipped, as are credit-only rows. A file whose
+    amounts are all positive is read as a list of expenses.
+
+    Iterating yields expense dicts with "timestamp", "amount" (positive),
+    "description", "category" (the file's label or None) and "line" (1-based line
+    number). Counters tell how many rows were read, skipped as income, or skipped
+    as unreadable.
+    """
+
+    def __init__(self, lines: Iterable[str]):
+        self._lines = iter(lines)
+        self.rows = 0
+        self.income = 0
+        self.invalid = 0
+
+    def _layout(self, sample: list[str]) -> tuple:
+        delimiter = _detect_delimiter(sample)
+        rows = list(csv.reader(sample, delimiter=delimiter))
+        for header_index, header in enumerate(rows[:_HEADER_SEARCH_ROWS]):
+            date_columns = _find_columns(header, _DATE_COLUMNS)
+            # "Amount" beats "Debit"/"Credit", which beat "Debit amount" read as an amount
+            amount_columns = _find_columns(header, _AMOUNT_COLUMNS, substrings=False)
+            debit_columns = _find_columns(header, _DEBIT_COLUMNS)
+            if not amount_columns and not debit_columns:
+                amount_columns = _find_columns(header, _AMOUNT_COLUMNS)
+            amount_columns = [index for index in amount_columns if index not in date_columns[:1]]
+            if date_columns and (amount_columns or debit_columns):
+                break
+        else:
+            raise ValueError("No header row with a date and an amount column found")
+
+        columns = {
+            "date": date_columns[0],
+            "amount": amount_columns[0] if amount_columns else None,
+            "debit": None if amount_columns else debit_columns[0],
+            "credit": next(iter(_find_columns(header, _CREDIT_COLUMNS)), None),
+            "description": [i for i in _find_columns(header, _DESCRIPTION_COLUMNS) if i != date_columns[0]][:2],
+            "category": next(iter(_find_columns(header, _CATEGORY_COLUMNS)), None),
+        }
+        body = rows[header_index + 1:]
+        date_format = _detect_date_format([row[columns["date"]] for row in body if len(row) > columns["date"]])
+        signed = columns["amount"] is not None and any(
+            (parse_amount(row[columns["amount"]]) or 0) < 0 for row in body if len(row) > columns["amount"]
+        )
+        logger.info(f"Statement layout: delimiter {delimiter!r}, header on line {header_index + 1}, "
+                    f"columns {columns}, dates {date_format}, signed amounts {signed}")
+        return delimiter, header_index, columns, date_format, signed
+
+    def _expense(self, row: list[str], line: int, columns: dict, date_format: str, signed: bool) -> dict | None:
+        def cell(index):
+            return row[index].strip() if index is not None and index < len(row) else ""
+
+        if columns["amount"] is not None:
+            amount = parse_amount(cell(columns["amount"]))
+            if amount is not None and signed:
+                if amount >= 0:
+                    self.income += 1
+                    return None
+                amount = -amount
+        else:
+            amount = parse_amount(cell(columns["debit"]))
+            if not amount and parse_amount(cell(columns["credit"])):
+                self.income += 1
+                return None
+        timestamp = _parse_date(cell(columns["date"]), date_format)
+        if amount is None or timestamp is None or amount == 0:
+            self.invalid += 1
+            return None
+
+        parts = []
+        for index in columns["description"]:
+            value = cell(index)
+            if value and value not in parts:
+                parts.append(value)
+        description = " ".join(parts)[:_MAX_DESCRIPTION_LENGTH] or None
+        return {
+            "timestamp": timestamp,
+            "amount": abs(amount),
+            "description": description,
+            "category": cell(columns["category"]) or None,
+            "line": line,
+        }
+
+    def __iter__(self) -> Iterator[dict]:
+        sample = list(itertools.islice(self._lines, _SAMPLE_LINES))
+        if not sample:
+            return
+        delimiter, header_index, columns, date_format, signed = self._layout(sample)
+        reader = csv.reader(itertools.chain(sample, self._lines), delimiter=delimiter)
+        for row_index, row in enumerate(reader):
+            if row_index <= header_index:
+                continue
+            if not any(value.strip() for value in row):
+                continue
+            self.rows += 1
+            expense = self._expense(row, reader.line_num, columns, date_format, signed)
+            if expense is not None:
+                yield expense
+
+    def stats(self) -> dict:
+        return {"rows": self.rows, "income": self.income, "invalid": self.invalid}
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+from collections import deque
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from .config import CONCURRENT_UPDATES, UPDATE_QUEUE_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+def update_owner(update: object) -> int | None:
+    """The user (or, failing that, chat) an update belongs to; None for updates without one."""
+    if not isinstance(update, Update):
+        return None
+    if update.effective_user is not None:
+        return update.effective_user.id
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    return None
+
+
+class ShardedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Processes updates on `workers` independent queues, sharded by user.
+
+    Every update of a user lands on the same shard, whose single worker handles
+    them one at a time in arrival order, so a user's expenses and /setsheet
+    commands never interleave or overtake each other. Different users are spread
+    over the shards and processed in parallel. A full shard queue (`queue_size`
+    updates) makes new updates for it wait. In webhook mode that wait holds the
+    request open, and WebhookServer answers 503 once too many are pending, so
+    Telegram redelivers later. In polling mode there is no such push back:
+    PTB's update fetcher starts a task per update without waiting for it, so
+    under sustained overload those tasks pile up in memory, waiting for the
+    base semaphore or a queue slot. Updates without a user (e.g. channel posts)
+    run immediately.
+
+    stats() reports queue depths and how long updates waited for their worker.
+    """
+
+    __slots__ = ("_workers", "_queue_size", "_queues", "_tasks", "_waits", "_counters")
+
+    def __init__(self, workers: int = CONCURRENT_UPDATES, queue_size: int = UPDATE_QUEUE_SIZE):
+        # The base semaphore caps updates that are queued or running across all shards
+        super().__init__(max_concurrent_updates=workers * (queue_size + 1))
+        self._workers = workers
+        self._queue_size = queue_size
+        self._queues: list[asyncio.Queue | None] = [None] * workers
+        self._tasks: list[asyncio.Task | None] = [None] * workers
+        self._waits: deque[float] = deque(maxlen=4096)  # Recent queue wait times for percentiles
+        self._counters = {
+            "processed": 0, "unowned": 0, "backpressured": 0, "peak_depth": 0, "wait_seconds": 0.0, "max_wait": 0.0
+        }
+
+    def _shard(self, owner: int) -> asyncio.Queue:
+        index = owner % self._workers
+        queue = self._queues[index]
+        if queue is None:
+            queue = self._queues[index] = asyncio.Queue(maxsize=self._queue_size)
+            self._tasks[index] = asyncio.create_task(self._work(queue), name=f"update-worker-{index}")
+        return queue
+
+    async def _work(self, queue: asyncio.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            coroutine, done, enqueued_at = await queue.get()
+            wait = loop.time() - enqueued_at
+            self._waits.append(wait)
+            self._counters["wait_seconds"] += wait
+            self._counters["max_wait"] = max(self._counters["max_wait"], wait)
+            try:
+                await coroutine
+            except Exception as e:
+                # Application.process_update reports handler errors itself; this is a safety net
+                logger.error(f"Update processing failed: {e}", exc_info=True)
+            finally:
+                self._counters["processed"] += 1
+                queue.task_done()
+                if not done.done():
+                    done.set_result(None)
+
+    async def do_process_update(self, update: object, coroutine) -> None:
+        owner = update_owner(update)
+        if owner is None:
+            self._counters["unowned"] += 1
+            await coroutine
+            return
+
+        queue = self._shard(owner)
+        if queue.full():
+            self._counters["backpressured"] += 1
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        try:
+            await queue.put((coroutine, done, loop.time()))
+        except asyncio.CancelledError:
+            coroutine.close()
+            raise
+        self._counters["peak_depth"] = max(self._counters["peak_depth"], queue.qsize())
+        await done
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        """Stops the workers; updates still queued are dropped."""
+        for task in self._tasks:
+            if task is not None:
+                task.cancel()
+        await asyncio.gather(*(task for task in self._tasks if task is not None), return_exceptions=True)
+        for queue in self._queues:
+            while queue is not None and not queue.empty():
+                coroutine, done, _ = queue.get_nowait()
+                coroutine.close()
+                done.cancel()
+        self._queues = [None] * self._workers
+        self._tasks = [None] * self._workers
+
+    def stats(self) -> dict:
+        """Returns processed counts, current and peak queue depths, and queue wait times in seconds."""
+        depths = [queue.qsize() for queue in self._queues if queue is not None]
+        waits = sorted(self._waits)
+        return {
+            **self._counters,
+            "wait_seconds": round(self._counters["wait_seconds"], 3),
+            "max_wait": round(self._counters["max_wait"], 3),
+            "queued": sum(depths),
+            "deepest_queue": max(depths, default=0),
+            "active_shards": len(depths),
+            "wait_p50": round(waits[len(waits) // 2], 4) if waits else 0.0,
+            "wait_p95": round(waits[int(len(waits) * 0.95)], 4) if waits else 0.0
+        }
@@ -0,0 +1,93 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from .config import USER_CACHE_MAX_ENTRIES, USER_CACHE_TTL, USER_CACHE_NEGATIVE_TTL
+
+logger = logging.getLogger(__name__)
+
+# Columns of User copied into a cached profile
+PROFILE_FIELDS = ("first_name", "spreadsheet_id", "monthly_limit", "timezone")
+
+# Invalidation channel other worker processes publish profile changes on
+PROFILE_CACHE = "user_profile"
+
+
+def profile_from_user(user) -> dict:
+    """Snapshot of a User row as a plain dict, safe to share after the session closes."""
+    return {field: getattr(user, field) for field in PROFILE_FIELDS}
+
+
+class UserProfileCache:
+    """
+    Write-through LRU of user profiles keyed by Telegram user ID.
+
+    A cached None records that the user is not registered (negative caching); those
+    entries expire after negative_ttl seconds, and negative_ttl=0 disables them.
+    Profiles expire after ttl seconds so edits made outside this process are picked
+    up eventually. Safe to use from the event loop and from worker threads.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = USER_CACHE_MAX_ENTRIES,
+        ttl: float = USER_CACHE_TTL,
+        negative_ttl: float = USER_CACHE_NEGATIVE_TTL
+    ):
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._negative_ttl = negative_ttl
+        self._entries: OrderedDict[int, tuple[dict | None, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "negative_hits": 0, "misses": 0, "evictions": 0, "expired": 0, "invalidations": 0}
+
+    def lookup(self, user_id: int) -> tuple[bool, dict | None]:
+        """
+        Returns (found, profile). found is False on a miss; a found profile of None
+        means the user is known not to be registered.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                profile, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(user_id)
+                    self._counters["hits" if profile is not None else "negative_hits"] += 1
+                    return True, profile
+                del self._entries[user_id]
+                self._counters["expired"] += 1
+            self._counters["misses"] += 1
+            return False, None
+
+    def put(self, user_id: int, profile: dict | None) -> None:
+        """Stores a profile, or None for an unregistered user (if negative caching is on)."""
+        ttl = self._ttl if profile is not None else self._negative_ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._entries[user_id] = (profile, time.monotonic() + ttl)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self._counters["invalidations"] += 1
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters, the hit rate and the number of cached users."""
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["negative_hits"] + self._counters["misses"]
+            hit_rate = (self._counters["hits"] + self._counters["negative_hits"]) / lookups if lookups else 0.0
+            return {**self._counters, "hit_rate": round(hit_rate, 4), "entries": len(self._entries)}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserProfileCache()
@@ -0,0 +1,146 @@
+import asyncio
+import hmac
+import logging
+import socket
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+from telegram import Update
+from telegram.ext import Application
+
+from .config import (
+    WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_SECRET_TOKEN,
+    WEBHOOK_MAX_CONNECTIONS, WEBHOOK_MAX_PENDING, WEBHOOK_ADMIT_TIMEOUT, MULTI_WORKER
+)
+from .metrics import register_stats
+
+logger = logging.getLogger(__name__)
+
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """
+    ASGI front end that feeds Telegram webhook deliveries to the application.
+
+    A POSTed update is acknowledged as soon as it is accepted and then processed in
+    the background through the application's update processor (concurrent, ordered
+    per user). At most `max_pending` updates are accepted but unfinished; beyond
+    that a delivery waits up to `admit_timeout` seconds for room and is then
+    answered 503, so Telegram redelivers it later instead of the bot queueing
+    without bound.
+    """
+
+    def __init__(
+        self,
+        application: Application,
+        path: str = WEBHOOK_PATH,
+        secret_token: str = WEBHOOK_SECRET_TOKEN,
+        max_pending: int = WEBHOOK_MAX_PENDING,
+        admit_timeout: float = WEBHOOK_ADMIT_TIMEOUT
+    ):
+        self._application = application
+        self._secret_token = secret_token
+        self._admit_timeout = admit_timeout
+        self._slots = asyncio.Semaphore(max_pending)
+        self._pending = 0
+        self._counters = {"accepted": 0, "forbidden": 0, "malformed": 0, "overloaded": 0}
+        self.app = Starlette(routes=[
+            Route(f"/{path.strip('/')}", self._receive, methods=["POST"]),
+            Route("/healthz", self._health, methods=["GET"]),
+        ])
+
+    async def _receive(self, request: Request) -> Response:
+        if self._secret_token and not hmac.compare_digest(
+            request.headers.get(SECRET_TOKEN_HEADER, ""), self._secret_token
+        ):
+            self._counters["forbidden"] += 1
+            return Response(status_code=403)
+
+        try:
+            update = Update.de_json(await request.json(), self._application.bot)
+        except Exception as e:
+            self._counters["malformed"] += 1
+            logger.warning(f"Ignoring malformed webhook payload: {e}")
+            return Response(status_code=400)
+
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self._admit_timeout)
+        except asyncio.TimeoutError:
+            self._counters["overloaded"] += 1
+            logger.warning(f"Webhook overloaded ({self._pending} updates pending), asking Telegram to redeliver")
+            return Response(status_code=503)
+
+        self._pending += 1
+        self._counters["accepted"] += 1
+        self._application.create_task(self._process(update), update=update)
+        return Response()
+
+    async def _process(self, update: Update) -> None:
+        try:
+            await self._application.update_processor.process_update(
+                update, self._application.process_update(update)
+            )
+        finally:
+            self._pending -= 1
+            self._slots.release()
+
+    async def _health(self, request: Request) -> Response:
+        processor = self._application.update_processor
+        updates = processor.stats() if hasattr(processor, "stats") else {}
+        return JSONResponse({"status": "ok", **self.stats(), "updates": updates})
+
+    def stats(self) -> dict:
+        return {**self._counters, "pending": self._pending}
+
+
+def _shared_socket(host: str, port: int) -> socket.socket:
+    """A listening socket that other worker processes can bind to the same port (SO_REUSEPORT)."""
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.setblocking(False)
+    return sock
+
+
+async def serve_webhook(application: Application) -> None:
+    """
+    Runs the application behind the webhook server until the process is interrupted.
+
+    Registers WEBHOOK_URL with Telegram when it is set; otherwise the webhook is
+    expected to be configured elsewhere (e.g. behind a load balancer). In
+    multi-worker mode every worker listens on WEBHOOK_PORT and the kernel spreads
+    incoming connections over them.
+    """
+    server = WebhookServer(application)
+    register_stats("webhook", server.stats)
+    webserver = uvicorn.Server(uvicorn.Config(
+        server.app, host=WEBHOOK_LISTEN, port=WEBHOOK_PORT, log_level="warning", access_log=False
+    ))
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    try:
+        if WEBHOOK_URL:
+            await application.bot.set_webhook(
+                url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH.strip('/')}",
+                secret_token=WEBHOOK_SECRET_TOKEN or None,
+                max_connections=WEBHOOK_MAX_CONNECTIONS,
+                allowed_updates=Update.ALL_TYPES
+            )
+        await application.start()
+        logger.info(f"Serving webhook on {WEBHOOK_LISTEN}:{WEBHOOK_PORT}/{WEBHOOK_PATH.strip('/')}")
+        await webserver.serve(sockets=[_shared_socket(WEBHOOK_LISTEN, WEBHOOK_PORT)] if MULTI_WORKER else None)
+    finally:
+        if application.running:
+            await application.stop()
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+        logger.info(f"Webhook stats: {server.stats()}")
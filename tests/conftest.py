@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# src.config reads the environment on import, so it is set before any test imports src
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _ROOT)
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='tests-'), 'test.db')}"
+os.environ["METRICS_PORT"] = "0"
+os.environ["LLM_CACHE_DISK_PATH"] = ""
@@ -0,0 +1,38 @@
+"""Debounced expense sync against the fake gspread backend."""
+import asyncio
+import datetime
+
+from benchmarks.fake_gspread import FakeBackend, use_backend
+from src import expense_sync, ledger
+from src.database import Expense, User, get_db_session, init_db
+
+
+def _expense(day: int) -> dict:
+    return {"timestamp": datetime.datetime(2024, 3, day, 12, 0), "amount": 2.0, "category": "Food"}
+
+
+def test_notified_expense_behind_a_full_batch_is_synced_before_the_waiter_resolves(monkeypatch):
+    init_db()
+    session = get_db_session()
+    try:
+        session.add(User(id=201, first_name="backlog", spreadsheet_id="sheet-201"))
+        session.commit()
+    finally:
+        session.close()
+    monkeypatch.setattr(expense_sync, "EXPENSE_SYNC_BATCH_SIZE", 2)
+
+    async def scenario():
+        # An older backlog fills more than one batch; the new expense sorts last
+        await ledger.add_expenses(201, [_expense(day) for day in range(1, 6)])
+        await ledger.add_expenses(201, [_expense(20)])
+        syncer = expense_sync.ExpenseSyncer(debounce=0, max_delay=0, interval=3600)
+        return await syncer.notify(201, "sheet-201")
+
+    with use_backend(FakeBackend(latency=0)):
+        assert asyncio.run(scenario()) is True
+
+    session = get_db_session()
+    try:
+        assert session.query(Expense).filter(Expense.user_id == 201, Expense.synced_at.is_(None)).count() == 0
+    finally:
+        session.close()
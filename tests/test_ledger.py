@@ -0,0 +1,42 @@
+"""Running monthly totals in the ledger under concurrent updates."""
+import asyncio
+import datetime
+
+from src import ledger
+from src.database import MonthlyLedger, get_db_session, init_db
+
+
+def _expense(amount: float, day: int = 3) -> dict:
+    return {"timestamp": datetime.datetime(2024, 2, day, 12, 0), "amount": amount, "category": "Food"}
+
+
+def _total(user_id: int, month: str = "02-2024") -> float:
+    session = get_db_session()
+    try:
+        return session.get(MonthlyLedger, (user_id, month)).total
+    finally:
+        session.close()
+
+
+def test_concurrent_first_expenses_of_a_month_all_count():
+    init_db()
+
+    async def add_all():
+        return await asyncio.gather(*(ledger.add_expenses(101, [_expense(1.5)]) for _ in range(20)))
+
+    results = asyncio.run(add_all())
+
+    assert all(result is not None for result in results)
+    assert _total(101) == 30.0
+
+
+def test_reconcile_replaces_total_with_sheet_plus_pending():
+    init_db()
+    asyncio.run(ledger.add_expenses(102, [_expense(10.0), _expense(5.0, day=4)]))
+
+    # Nothing is synced yet, so both expenses are pending on top of the sheet's total
+    stats = ledger.reconcile_month(102, "02-2024", sheet_total=100.0)
+
+    assert stats["total"] == "115.00"
+    assert _total(102) == 115.0
+    assert not ledger.needs_reconcile(102, "02-2024")
@@ -0,0 +1,24 @@
+"""LLM response cache with the SQLite disk tier."""
+import asyncio
+import threading
+
+from src.llm_cache import LLMResponseCache
+
+
+def test_disk_tier_runs_off_the_event_loop(tmp_path):
+    async def scenario():
+        loop_thread = threading.get_ident()
+        cache = LLMResponseCache(disk_path=str(tmp_path / "cache.db"))
+        disk_threads = []
+        get_disk, put_disk = cache._get_disk, cache._put_disk
+        cache._get_disk = lambda *args: disk_threads.append(threading.get_ident()) or get_disk(*args)
+        cache._put_disk = lambda *args: disk_threads.append(threading.get_ident()) or put_disk(*args)
+
+        await cache.put("key", [{"amount": 5}])
+        cache._entries.clear()  # Force the next read to the disk tier
+        assert await cache.get("key") == [{"amount": 5}]
+        assert await cache.get("missing") is None
+        assert len(disk_threads) == 3 and loop_thread not in disk_threads
+        assert cache.stats()["disk_hits"] == 1
+        assert cache.stats()["misses"] == 1
+    asyncio.run(scenario())
@@ -0,0 +1,14 @@
+"""Decoding of LLM answers."""
+from src.llm_parser import _decode_llm_json
+
+
+def test_decode_strips_code_fences():
+    # Models and proxies that ignore response_format still wrap the JSON in a fence
+    assert _decode_llm_json('```json\n[{"amount": 5}]\n```') == [{"amount": 5}]
+    assert _decode_llm_json('```\n{"results": []}\n```') == {"results": []}
+
+
+def test_decode_plain_and_invalid_json():
+    assert _decode_llm_json(' [{"amount": 5}] ') == [{"amount": 5}]
+    assert _decode_llm_json("not json") is None
+    assert _decode_llm_json("") is None
@@ -0,0 +1,41 @@
+"""Daily reminder run paging through users in chunks."""
+import asyncio
+import datetime
+
+from src.database import User, get_db_session, init_db
+from src.reminders import ReminderDispatcher
+
+
+class _Bot:
+    def __init__(self, failing: set[int]):
+        self.failing = failing
+        self.sent: list[int] = []
+
+    async def send_message(self, chat_id: int, text: str) -> None:
+        self.sent.append(chat_id)
+        if chat_id in self.failing:
+            raise RuntimeError("network down")
+
+
+def test_run_pages_through_users_once_each():
+    init_db()
+    user_ids = list(range(301, 308))
+    session = get_db_session()
+    try:
+        session.add_all(User(id=user_id, first_name=f"user{user_id}", timezone="Asia/Tokyo") for user_id in user_ids)
+        session.commit()
+    finally:
+        session.close()
+    # 20:30 in Tokyo, inside the send window
+    now = datetime.datetime(2024, 5, 1, 11, 30, tzinfo=datetime.timezone.utc)
+    dispatcher = ReminderDispatcher(at="20:00", chunk_size=2, rate=0, max_retries=0)
+    bot = _Bot(failing={303})
+
+    outcomes = asyncio.run(dispatcher.run(bot, now=now))
+
+    # The failed user stays unmarked but is not asked again within the same run
+    assert sorted(bot.sent) == user_ids
+    assert outcomes == {"sent": 6, "failed": 1}
+    bot.sent.clear()
+    assert asyncio.run(dispatcher.run(bot, now=now)) == {"failed": 1}
+    assert bot.sent == [303]
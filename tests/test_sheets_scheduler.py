@@ -0,0 +1,37 @@
+"""Quota pacing of SheetsScheduler, against the fake gspread backend's 429s."""
+import threading
+import time
+
+from benchmarks.fake_gspread import FakeBackend
+from src.sheets_scheduler import SheetsScheduler, _TokenBucket
+
+
+def test_retry_after_pause_holds_with_unlimited_rate():
+    bucket = _TokenBucket(rate=0, capacity=1)
+    now = time.monotonic()
+    bucket.blocked_until = now + 2.0
+
+    assert bucket.wait_time(now) == 2.0
+    assert bucket.wait_time(now + 2.0) == 0.0
+
+
+def test_throttled_call_pauses_other_threads_with_unlimited_rate():
+    backend = FakeBackend(latency=0, quota=2, quota_window=0.5)
+    scheduler = SheetsScheduler(rate=0, spreadsheet_rate=0, backoff_base=0.01)
+    scheduler.call("sheet", backend.api_call, "get")
+    scheduler.call("sheet", backend.api_call, "get")
+
+    # The third call in the window gets a 429 with Retry-After and pauses the scheduler
+    throttled = threading.Thread(target=scheduler.call, args=("sheet", backend.api_call, "get"))
+    throttled.start()
+    deadline = time.monotonic() + 5
+    while scheduler.stats()["throttled"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.005)
+
+    started = time.monotonic()
+    scheduler.call("sheet", backend.api_call, "get")
+    throttled.join()
+
+    # Without the pause this call would have hit the API while it was still throttling
+    assert backend.throttled == 1
+    assert time.monotonic() - started >= 0.2
@@ -0,0 +1,80 @@
+"""
+API call counts of write_expenses_to_sheet against the fake gspread backend.
+
+Every Sheets call counts against a per-minute quota, so these pin exactly which
+calls a write makes: a new month is created with its headers and stats block, an
+existing month's layout is verified once with a single batched read, and after
+that a write is the row append and nothing else.
+"""
+import datetime
+
+import pytest
+
+from benchmarks.fake_gspread import FakeBackend, FakeSpreadsheet, use_backend
+from src import sheets_writer
+from src.config import DEFAULT_MONTHLY_LIMIT
+from src.database import init_db
+from src.sheet_stats import STATS_WRITE_RANGE, build_stats_data
+
+SPREADSHEET_ID = "sheet-1"
+MONTH = "01-2024"
+
+
+def _expense(n: int) -> dict:
+    return {
+        "timestamp": datetime.datetime(2024, 1, 3, 12, 0), "user_id": 1, "amount": 5.0 + n,
+        "category": "Food", "description": f"lunch {n}", "expense_id": f"expense-{n}",
+    }
+
+
+@pytest.fixture
+def backend():
+    init_db()
+    backend = FakeBackend(latency=0)
+    with use_backend(backend):
+        yield backend
+
+
+def _calls_of(backend: FakeBackend, expenses: list, **kwargs) -> dict:
+    before = dict(backend.calls)
+    assert sheets_writer.write_expenses_to_sheet(expenses, SPREADSHEET_ID, **kwargs)
+    return {name: count - before.get(name, 0) for name, count in backend.calls.items() if count != before.get(name, 0)}
+
+
+def test_first_write_creates_month_with_headers_and_stats(backend):
+    calls = _calls_of(backend, [_expense(0)])
+
+    assert calls == {"open_by_key": 1, "worksheet": 1, "add_worksheet": 1, "append_rows": 1, "update": 1}
+    worksheet = backend.spreadsheets[SPREADSHEET_ID].worksheets[MONTH]
+    assert worksheet.rows[0] == sheets_writer.HEADERS
+    assert worksheet.blocks[STATS_WRITE_RANGE] == build_stats_data(DEFAULT_MONTHLY_LIMIT)
+
+
+def test_first_write_to_existing_month_verifies_layout_once(backend):
+    spreadsheet = backend.spreadsheets[SPREADSHEET_ID] = FakeSpreadsheet(backend, SPREADSHEET_ID)
+    worksheet = spreadsheet.worksheets[MONTH] = spreadsheet.add_worksheet(MONTH, 100, 10)
+    worksheet.rows = [list(sheets_writer.HEADERS)]
+    worksheet.blocks[STATS_WRITE_RANGE] = build_stats_data(DEFAULT_MONTHLY_LIMIT)
+    backend.calls.clear()
+
+    assert _calls_of(backend, [_expense(0)]) == {
+        "open_by_key": 1, "worksheet": 1, "values_batch_get": 1, "append_rows": 1
+    }
+    assert _calls_of(backend, [_expense(1)]) == {"append_rows": 1}
+
+
+def test_steady_state_write_is_a_single_append(backend):
+    _calls_of(backend, [_expense(0)])
+
+    for n in range(1, 4):
+        assert _calls_of(backend, [_expense(n), _expense(n + 10)]) == {"append_rows": 1}
+    worksheet = backend.spreadsheets[SPREADSHEET_ID].worksheets[MONTH]
+    assert len(worksheet.rows) == 1 + 1 + 3 * 2
+
+
+def test_retry_reads_expense_ids_and_skips_written_rows(backend):
+    _calls_of(backend, [_expense(0)])
+
+    assert _calls_of(backend, [_expense(0), _expense(1)], skip_existing=True) == {"get": 1, "append_rows": 1}
+    worksheet = backend.spreadsheets[SPREADSHEET_ID].worksheets[MONTH]
+    assert [row[5] for row in worksheet.rows[1:]] == ["expense-0", "expense-1"]